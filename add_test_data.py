@@ -7,8 +7,12 @@ import sys
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from src.web import app, db
-from src.dp import Comment, User, Like
+from src.web import create_app, db
+from src.dp import Comment, User, Like, adjust_page_totals, bump_change_markers, init_db
+
+app = create_app()
+# Схема и тестовый пользователь
+init_db(app)
 
 with app.app_context():
     # Получаем тестового пользователя
@@ -25,12 +29,18 @@ with app.app_context():
         "Ответы очень удобно скрывать и раскрывать"
     ]
     
+    added = 0
     for i, text in enumerate(comments_text):
         # Проверяем нет ли уже такого комментария
         if not Comment.query.filter_by(text=text).first():
             comment = Comment(text=text, page="comments", user_id=user.id)
             db.session.add(comment)
-    
+            added += 1
+
+    # Счетчик основных комментариев страницы и версия для ETag/кэша списков
+    if added:
+        adjust_page_totals({'comments': added})
+        bump_change_markers('page:comments')
     db.session.commit()
     
     # Получаем первый комментарий и добавляем ответ
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Замер маршрутов сайта: задержки (p50/p95/p99), пропускная способность и число
+SQL-запросов на один HTTP-запрос.
+
+Каждый режим запускается в отдельном процессе на временной SQLite-базе с одинаковым
+набором данных (генератор src/bulk.py с постоянным зерном):
+  client - запросы по одному через тестовый клиент Flask;
+  server - настоящий многопоточный HTTP-сервер (werkzeug, threaded) и несколько
+           клиентских потоков.
+Маршруты записи (лайк, ответ) идут после маршрутов чтения.
+
+Результат пишется в JSON. Режим compare сравнивает его с сохраненной базовой линией
+и завершается с кодом 1, если метрика ухудшилась сильнее порога.
+
+Запуск:
+  python bench_endpoints.py run [--mode both] [--requests 200] [--output bench.json]
+  python bench_endpoints.py compare baseline.json bench.json [--threshold 0.25]
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# (имя, метод, путь, нужна ли авторизация, данные формы); в пути подставляются
+# {cursor}, {ids}, {hot} (ветка с наибольшим числом ответов) и {top} (новый комментарий)
+ENDPOINTS = [
+    ('index', 'GET', '/', False, None),
+    ('comments_page', 'GET', '/comments', False, None),
+    ('comments_page_auth', 'GET', '/comments', True, None),
+    ('comments_more', 'GET', '/comments/more?cursor={cursor}', True, None),
+    ('api_comments', 'GET', '/api/comments/comments', False, None),
+    ('api_comments_cursor', 'GET', '/api/comments/comments?cursor={cursor}', True, None),
+    ('summary', 'GET', '/api/comments/comments/summary?ids={ids}', True, None),
+    ('replies', 'GET', '/api/comment/{hot}/replies', True, None),
+    ('thread', 'GET', '/api/comment/{hot}/thread', True, None),
+    ('search', 'GET', '/api/search?q=python', True, None),
+    ('like', 'POST', '/api/comment/{top}/like', True, None),
+    ('add_reply', 'POST', '/add_reply/{top}', True, {'text': 'Ответ из замера', 'page': 'comments'}),
+]
+
+# Метрики для сравнения: чем меньше, тем лучше / чем больше, тем лучше
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'statements', 'errors')
+HIGHER_IS_BETTER = ('rps',)
+
+
+def percentile(values, q):
+    """Перцентиль по рангу (values отсортированы)"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(latencies, errors, statements, duration):
+    latencies = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'rps': round(len(latencies) / duration, 1) if duration else None,
+        'statements': round(statements / len(latencies), 2) if latencies else None,
+    }
+
+
+def load_app(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    # Замеряется сам маршрут: один пользователь шлет сотни записей подряд
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    sys.path.insert(0, PROJECT_ROOT)
+    from src.web import create_app
+    return create_app()
+
+
+def seed(app, users, threads):
+    """Схема и синтетические данные; параметры путей маршрутов"""
+    from flask_migrate import upgrade
+    from sqlalchemy import func
+    from src.bulk import import_records, synthetic_records
+    from src.dp import db, Comment
+
+    with app.app_context():
+        upgrade()
+        import_records(synthetic_records(users, threads, seed=42))
+        hot = db.session.query(Comment.id).filter(Comment.parent_id.is_(None)) \
+            .order_by(Comment.replies_count.desc(), Comment.id).first()[0]
+        top = db.session.query(func.max(Comment.id)).filter(Comment.parent_id.is_(None)).scalar()
+        ids = [i for (i,) in db.session.query(Comment.id).filter(Comment.parent_id.is_(None))
+               .order_by(Comment.created_at.desc(), Comment.id.desc()).limit(20)]
+
+    cursor = app.test_client().get('/api/comments/comments').headers.get('X-Next-Cursor', '')
+    return {'cursor': cursor, 'ids': ','.join(map(str, ids)), 'hot': hot, 'top': top}
+
+
+class StatementCounter:
+    def __init__(self, app):
+        from sqlalchemy import event
+        from src.dp import db
+
+        self.count = 0
+        self._lock = threading.Lock()
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def take(self):
+        with self._lock:
+            count, self.count = self.count, 0
+            return count
+
+
+def run_client(app, params, args):
+    counter = StatementCounter(app)
+    anonymous = app.test_client()
+    user = app.test_client()
+    with user.session_transaction() as session:
+        session['user_id'] = 1
+
+    results = {}
+    for name, method, path, auth, data in ENDPOINTS:
+        client = user if auth else anonymous
+        url = path.format(**params)
+        for _ in range(args.warmup):
+            client.open(url, method=method, data=data)
+        counter.take()
+
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            request_started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            # Тело читается целиком: потоковый ответ формируется только при чтении
+            response.get_data()
+            status = response.status_code
+            latencies.append(time.perf_counter() - request_started)
+            errors += status >= 400
+        results[name] = summarize(latencies, errors, counter.take(), time.perf_counter() - started)
+    return results
+
+
+def run_server(app, params, args):
+    from urllib.parse import urlencode
+    from werkzeug.serving import make_server
+
+    counter = StatementCounter(app)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    cookie_name = app.config.get('SESSION_COOKIE_NAME', 'session')
+    session_cookie = app.session_interface.get_signing_serializer(app).dumps({'user_id': 1})
+
+    def request(method, url, auth, data):
+        headers = {'Cookie': f'{cookie_name}={session_cookie}'} if auth else {}
+        body = None
+        if data:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        try:
+            connection.request(method, url, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    results = {}
+    try:
+        for name, method, path, auth, data in ENDPOINTS:
+            url = path.format(**params)
+            for _ in range(args.warmup):
+                request(method, url, auth, data)
+            counter.take()
+
+            latencies, errors = [], []
+            lock = threading.Lock()
+            per_thread = max(1, args.requests // args.concurrency)
+
+            def worker():
+                local, failed = [], 0
+                for _ in range(per_thread):
+                    request_started = time.perf_counter()
+                    try:
+                        failed += request(method, url, auth, data) >= 400
+                    except OSError:
+                        failed += 1
+                    local.append(time.perf_counter() - request_started)
+                with lock:
+                    latencies.extend(local)
+                    errors.append(failed)
+
+            threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results[name] = summarize(latencies, sum(errors), counter.take(), time.perf_counter() - started)
+    finally:
+        server.shutdown()
+    return results
+
+
+def run_mode(args):
+    """Один режим в текущем процессе: своя временная база, печатает JSON"""
+    with tempfile.TemporaryDirectory() as tmp:
+        app = load_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        params = seed(app, args.users, args.threads)
+        runner = run_client if args.mode == 'client' else run_server
+        return runner(app, params, args)
+
+
+def run(args):
+    modes = ['client', 'server'] if args.mode == 'both' else [args.mode]
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'users': args.users,
+            'threads': args.threads,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+        },
+        'results': {},
+    }
+    common = ['--users', str(args.users), '--threads', str(args.threads), '--requests', str(args.requests),
+              '--warmup', str(args.warmup), '--concurrency', str(args.concurrency)]
+    for mode in modes:
+        print(f"[INFO] Режим {mode}...", file=sys.stderr)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), 'run', '--child', '--mode', mode, *common],
+            capture_output=True, text=True, check=True
+        ).stdout
+        report['results'][mode] = json.loads(output.strip().splitlines()[-1])
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            out.write(text + '\n')
+        print(f"[INFO] Результат записан в {args.output}", file=sys.stderr)
+    print_table(report)
+    return 0
+
+
+def print_table(report):
+    for mode, endpoints in report['results'].items():
+        print(f"\n{mode}:")
+        print(f"  {'маршрут':<22}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}{'запр/с':>9}{'SQL':>7}{'ошибки':>8}")
+        for name, m in endpoints.items():
+            print(f"  {name:<22}{m['p50_ms']:>9}{m['p95_ms']:>9}{m['p99_ms']:>9}"
+                  f"{m['rps']:>9}{m['statements']:>7}{m['errors']:>8}")
+
+
+def compare(args):
+    """Сравнение с базовой линией: код 1 при ухудшении сверх порога"""
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)['results']
+
+    regressions = []
+    for mode, endpoints in baseline.items():
+        for name, before in endpoints.items():
+            after = current.get(mode, {}).get(name)
+            if after is None:
+                print(f"[WARNING] {mode}/{name}: нет в текущем замере")
+                continue
+            for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+                old, new = before.get(metric), after.get(metric)
+                if old is None or new is None:
+                    continue
+                if metric == 'statements':
+                    # Число запросов детерминировано: любое увеличение - регрессия
+                    worse = new > old + 0.01
+                elif metric == 'errors':
+                    worse = new > old
+                elif metric in LOWER_IS_BETTER:
+                    worse = new > old * (1 + args.threshold) and new - old > args.min_delta_ms
+                else:
+                    worse = new < old * (1 - args.threshold)
+                if worse:
+                    regressions.append(f"{mode}/{name} {metric}: {old} -> {new}")
+
+    for line in regressions:
+        print(f"[ERROR] Регрессия {line}")
+    if regressions:
+        return 1
+    print(f"[INFO] Регрессий нет (порог {args.threshold:.0%}, не меньше {args.min_delta_ms} мс)")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Замер задержек и числа SQL-запросов маршрутов')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Выполнить замер')
+    run_parser.add_argument('--mode', choices=['both', 'client', 'server'], default='both')
+    run_parser.add_argument('--requests', type=int, default=200, help='Запросов на маршрут')
+    run_parser.add_argument('--warmup', type=int, default=10, help='Прогревочных запросов на маршрут')
+    run_parser.add_argument('--concurrency', type=int, default=4, help='Клиентских потоков в режиме server')
+    run_parser.add_argument('--users', type=int, default=200, help='Пользователей в наборе данных')
+    run_parser.add_argument('--threads', type=int, default=2000, help='Веток в наборе данных')
+    run_parser.add_argument('--output', help='Файл для JSON-результата')
+    run_parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+
+    compare_parser = commands.add_parser('compare', help='Сравнить с базовой линией')
+    compare_parser.add_argument('baseline', help='JSON базовой линии')
+    compare_parser.add_argument('current', help='JSON текущего замера')
+    compare_parser.add_argument('--threshold', type=float, default=0.25,
+                                help='Допустимое ухудшение задержек и пропускной способности (доля)')
+    compare_parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                                help='Разница задержек меньше этой не считается регрессией')
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        sys.exit(compare(args))
+    if args.child:
+        print(json.dumps(run_mode(args)))
+        sys.exit(0)
+    sys.exit(run(args))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Замер большой ветки /api/comment/<id>/thread: пик памяти на запрос, время до первого
+байта, полное время и размер ответа без сжатия, с gzip и brotli.
+
+Режимы сравниваются в отдельных процессах на одинаковой временной SQLite-базе
+(одна ветка из --nodes комментариев, генератор src/bulk.py с постоянным зерном):
+  buffered  - ветка собирается в памяти и кодируется целиком (STREAM_JSON=0);
+  streaming - строки читаются порциями и сразу кодируются в ответ (STREAM_JSON=1).
+Пик памяти - по tracemalloc (объекты Python за время одного запроса), время - медиана
+по --repeat запросам без tracemalloc.
+
+Запуск:
+  python bench_responses.py [--nodes 5000] [--repeat 10] [--output responses.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+MODES = {'buffered': '0', 'streaming': '1'}
+ENCODINGS = ('identity', 'gzip', 'br')
+
+
+def seed(app, nodes):
+    """Одна ветка из nodes комментариев; возвращает id ее корня"""
+    from flask_migrate import upgrade
+    from src.bulk import import_records, synthetic_records
+    from src.dp import db, Comment
+
+    with app.app_context():
+        upgrade()
+        # Очень тяжелый хвост: число ответов упирается в max_replies
+        import_records(synthetic_records(100, 1, seed=42, reply_alpha=0.01, max_replies=nodes - 1))
+        return db.session.query(Comment.id).filter(Comment.parent_id.is_(None)).scalar()
+
+
+def fetch(client, url, encoding):
+    """(байт в ответе, время до первой порции, полное время); тело не накапливается"""
+    started = time.perf_counter()
+    response = client.get(url, headers={'Accept-Encoding': encoding}, buffered=False)
+    first_chunk, size = None, 0
+    try:
+        for chunk in response.response:
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - started
+            size += len(chunk)
+    finally:
+        response.close()
+    return size, first_chunk, time.perf_counter() - started
+
+
+def run_mode(args):
+    """Один режим в текущем процессе: своя временная база, печатает JSON"""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ['STREAM_JSON'] = MODES[args.mode]
+        os.environ['THREAD_MAX_NODES'] = str(args.nodes)
+        sys.path.insert(0, PROJECT_ROOT)
+        from src.web import create_app
+
+        app = create_app()
+        root_id = seed(app, args.nodes)
+        client = app.test_client()
+        url = f'/api/comment/{root_id}/thread'
+
+        results = {}
+        for encoding in ENCODINGS:
+            # Прогрев: шаблоны, пул соединений, кэш пользователей
+            fetch(client, url, encoding)
+
+            tracemalloc.start()
+            size, _, _ = fetch(client, url, encoding)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            timings = [fetch(client, url, encoding) for _ in range(args.repeat)]
+            results[encoding] = {
+                'bytes': size,
+                'peak_kb': round(peak / 1024, 1),
+                'ttfb_ms': round(statistics.median(t[1] for t in timings) * 1000, 2),
+                'total_ms': round(statistics.median(t[2] for t in timings) * 1000, 2),
+            }
+        return results
+
+
+def run(args):
+    report = {'meta': {'nodes': args.nodes, 'repeat': args.repeat}, 'results': {}}
+    for mode in MODES:
+        print(f"[INFO] Режим {mode}...", file=sys.stderr)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', mode,
+             '--nodes', str(args.nodes), '--repeat', str(args.repeat)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        report['results'][mode] = json.loads(output.strip().splitlines()[-1])
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            out.write(json.dumps(report, ensure_ascii=False, indent=2) + '\n')
+        print(f"[INFO] Результат записан в {args.output}", file=sys.stderr)
+
+    print(f"\nВетка из {args.nodes} комментариев:")
+    print(f"  {'режим':<11}{'сжатие':<10}{'байт':>10}{'пик КБ':>10}{'TTFB мс':>10}{'всего мс':>10}")
+    for mode, encodings in report['results'].items():
+        for encoding, m in encodings.items():
+            print(f"  {mode:<11}{encoding:<10}{m['bytes']:>10}{m['peak_kb']:>10}{m['ttfb_ms']:>10}{m['total_ms']:>10}")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Замер памяти и размера ответа большой ветки')
+    parser.add_argument('--nodes', type=int, default=5000, help='Комментариев в ветке')
+    parser.add_argument('--repeat', type=int, default=10, help='Запросов для замера времени')
+    parser.add_argument('--output', help='Файл для JSON-результата')
+    parser.add_argument('--child', choices=list(MODES), help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.child:
+        args.mode = args.child
+        print(json.dumps(run_mode(args)))
+    else:
+        sys.exit(run(args))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Замер времени запуска: от импорта приложения до первого ответа.
+
+Режим app (по умолчанию): каждый прогон - новый процесс Python, который импортирует
+src.web, вызывает create_app() и выполняет первый запрос через тестовый клиент.
+Показывает отдельно импорт, create_app и первый ответ, с прогревом шаблонов и без.
+
+Режим server: запускает serve.py и опрашивает адрес до первого ответа 200.
+
+Запуск: python bench_startup.py [--mode app|server] [--runs 5] [--path /]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Код, выполняемый в отдельном процессе для режима app
+APP_PROBE = '''
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+from src.web import create_app, warm_templates
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+if {warm!r}:
+    warm_templates(app)
+t3 = time.perf_counter()
+status = app.test_client().get({path!r}).status_code
+t4 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "create_app": t2 - t1, "warm": t3 - t2,
+                  "first_response": t4 - t3, "total": t4 - t0, "status": status}}))
+'''
+
+
+def run_app_probe(path, warm):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', APP_PROBE.format(root=PROJECT_ROOT, path=path, warm=warm)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    # Вместе с запуском интерпретатора
+    result['process'] = time.perf_counter() - started
+    return result
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_server_probe(path, workers, threads, timeout=60):
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_ROOT, 'serve.py'), '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5) as response:
+                    return {'first_response': time.perf_counter() - started, 'status': response.status}
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError('сервер не ответил за отведенное время')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summarize(results):
+    keys = [key for key in results[0] if key != 'status']
+    return {key: round(statistics.median(r[key] for r in results) * 1000, 1) for key in keys}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Время от импорта до первого ответа')
+    parser.add_argument('--mode', choices=['app', 'server'], default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/', help='Адрес первого запроса')
+    parser.add_argument('--workers', type=int, default=2, help='Для режима server')
+    parser.add_argument('--threads', type=int, default=4, help='Для режима server')
+    args = parser.parse_args()
+
+    if args.mode == 'app':
+        for warm in (False, True):
+            results = [run_app_probe(args.path, warm) for _ in range(args.runs)]
+            label = 'с прогревом шаблонов' if warm else 'без прогрева'
+            print(f"[INFO] {label} (медиана, мс): {json.dumps(summarize(results), ensure_ascii=False)}")
+    else:
+        results = [run_server_probe(args.path, args.workers, args.threads) for _ in range(args.runs)]
+        print(f"[INFO] serve.py до первого ответа (медиана, мс): {json.dumps(summarize(results))}")
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Сборка статических файлов: минификация CSS/JS, хэш содержимого в имени,
+сжатые копии .gz/.br и манифест для url_for (см. src/assets.py).
+Для изображений из static/images/ строятся уменьшенные копии нескольких
+ширин в форматах AVIF/WebP и исходном формате (манифест images.json).
+
+Запуск: python build_assets.py
+Результат: static/build/
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:  # .br копии будут пропущены
+    brotli = None
+
+try:
+    from PIL import Image, ImageSequence, features
+except ImportError:  # производные изображения будут пропущены
+    Image = None
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(PROJECT_ROOT, 'static')
+BUILD_DIR = os.path.join(STATIC_DIR, 'build')
+MANIFEST_NAME = 'manifest.json'
+IMAGES_MANIFEST_NAME = 'images.json'
+
+# Каталоги внутри static/, которые собираются
+SOURCE_DIRS = ('css', 'js')
+
+# Изображения: каталог-источник, кэш производных (сохраняется между сборками) и ширины
+IMAGES_DIR = 'images'
+IMAGES_BUILD_DIR = os.path.join(BUILD_DIR, 'images')
+IMAGE_WIDTHS = (64, 128, 200, 400, 640, 960, 1280)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+
+def minify_css(source):
+    """Удаляет комментарии и лишние пробелы в CSS"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    # Пробел перед ':' не трогаем - в селекторах он значим ("a :hover" != "a:hover")
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    source = source.replace(';}', '}')
+    return source.strip()
+
+
+def minify_js(source):
+    """Консервативная минификация JS: отступы, пустые строки и строки-комментарии.
+
+    Переводы строк сохраняются, чтобы не зависеть от автоматической вставки точек с запятой.
+    """
+    lines = []
+    for line in source.splitlines():
+        line = line.strip()
+        if line and not line.startswith('//'):
+            lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+def write_compressed(path, data):
+    """Пишет файл и его сжатые копии"""
+    with open(path, 'wb') as f:
+        f.write(data)
+    with open(path + '.gz', 'wb') as f:
+        # mtime=0 - одинаковый результат при повторной сборке
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def image_formats(source_format, animated):
+    """Форматы производных: современные форматы и исходный как запасной (последний)"""
+    formats = []
+    if not animated and features.check('avif'):
+        formats.append('avif')
+    if features.check('webp'):
+        formats.append('webp')
+    formats.append('gif' if source_format == 'GIF' else 'png' if source_format == 'PNG' else 'jpeg')
+    return formats
+
+
+def resize_image(image, width):
+    """Уменьшенная копия (все кадры для анимации) с сохранением пропорций"""
+    height = round(image.height * width / image.width)
+    frames = [frame.convert('RGBA').resize((width, height), Image.LANCZOS)
+              for frame in ImageSequence.Iterator(image)]
+    return frames, height
+
+
+def save_image(frames, path, fmt, source):
+    options = {}
+    if len(frames) > 1:
+        options.update(save_all=True, append_images=frames[1:],
+                       duration=source.info.get('duration', 100), loop=source.info.get('loop', 0))
+    if fmt == 'webp':
+        options.update(quality=80, method=6)
+    elif fmt == 'avif':
+        options.update(quality=60)
+    elif fmt == 'png':
+        options.update(optimize=True)
+    elif fmt == 'jpeg':
+        frames = [frame.convert('RGB') for frame in frames]
+        options.update(quality=82, optimize=True, progressive=True)
+    frames[0].save(path, format=fmt.upper(), **options)
+
+
+def build_images():
+    """Строит производные изображения; существующие файлы с тем же хэшем источника не пересоздаются"""
+    manifest = {}
+    source_root = os.path.join(STATIC_DIR, IMAGES_DIR)
+    for name in sorted(os.listdir(source_root)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            continue
+
+        source_path = os.path.join(source_root, name)
+        with open(source_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+
+        with Image.open(source_path) as image:
+            animated = getattr(image, 'n_frames', 1) > 1
+            formats = image_formats(image.format, animated)
+            widths = [w for w in IMAGE_WIDTHS if w < image.width] + [image.width]
+            entry = {
+                'width': image.width,
+                'height': image.height,
+                'digest': digest,
+                'fallback': formats[-1],
+                'variants': {}
+            }
+
+            generated = 0
+            for width in widths:
+                frames = None
+                built = {}
+                for fmt in formats:
+                    built_rel = f"{IMAGES_DIR}/{stem}.{digest}.{width}w.{'jpg' if fmt == 'jpeg' else fmt}"
+                    built_path = os.path.join(BUILD_DIR, built_rel)
+                    if not os.path.isfile(built_path):
+                        if frames is None:
+                            frames, _ = resize_image(image, width)
+                        os.makedirs(os.path.dirname(built_path), exist_ok=True)
+                        save_image(frames, built_path, fmt, image)
+                        generated += 1
+                    built[fmt] = (built_rel, os.path.getsize(built_path))
+
+                # Современный формат имеет смысл, только если он меньше запасного
+                # (анимированный WebP бывает тяжелее исходного GIF)
+                fallback_size = built[formats[-1]][1]
+                for fmt in formats:
+                    built_rel, size = built[fmt]
+                    if fmt == formats[-1] or size < fallback_size:
+                        entry['variants'].setdefault(fmt, []).append([width, built_rel])
+
+        manifest[f"{IMAGES_DIR}/{name}"] = entry
+        print(f"[INFO] {IMAGES_DIR}/{name}: {len(widths)} ширин x {len(formats)} форматов, создано {generated}")
+
+    # Удаляем производные от старых версий источников
+    digests = {entry['digest'] for entry in manifest.values()}
+    for name in os.listdir(IMAGES_BUILD_DIR) if os.path.isdir(IMAGES_BUILD_DIR) else []:
+        if name.rsplit('.', 3)[-3] not in digests:
+            os.remove(os.path.join(IMAGES_BUILD_DIR, name))
+
+    with open(os.path.join(BUILD_DIR, IMAGES_MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def clean_build_dir():
+    """Очищает каталог сборки, сохраняя кэш производных изображений"""
+    if not os.path.isdir(BUILD_DIR):
+        return
+    for name in os.listdir(BUILD_DIR):
+        path = os.path.join(BUILD_DIR, name)
+        if path == IMAGES_BUILD_DIR:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def build():
+    clean_build_dir()
+
+    manifest = {}
+    for source_dir in SOURCE_DIRS:
+        for root, _, files in os.walk(os.path.join(STATIC_DIR, source_dir)):
+            for name in sorted(files):
+                stem, ext = os.path.splitext(name)
+                if ext not in MINIFIERS:
+                    continue
+
+                source_path = os.path.join(root, name)
+                rel_path = os.path.relpath(source_path, STATIC_DIR).replace(os.sep, '/')
+                with open(source_path, encoding='utf-8') as f:
+                    data = MINIFIERS[ext](f.read()).encode('utf-8')
+
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                built_rel = f"{os.path.dirname(rel_path)}/{stem}.{digest}{ext}"
+                built_path = os.path.join(BUILD_DIR, built_rel)
+                os.makedirs(os.path.dirname(built_path), exist_ok=True)
+                write_compressed(built_path, data)
+
+                manifest[rel_path] = built_rel
+                print(f"[INFO] {rel_path} -> {built_rel} ({os.path.getsize(source_path)} -> {len(data)} байт)")
+
+    with open(os.path.join(BUILD_DIR, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+if __name__ == '__main__':
+    if brotli is None:
+        print("[WARNING] Модуль brotli не установлен, .br копии не создаются")
+    manifest = build()
+    print(f"[INFO] Собрано файлов: {len(manifest)}")
+
+    if Image is None:
+        print("[WARNING] Pillow не установлен, производные изображения не создаются")
+    else:
+        images = build_images()
+        print(f"[INFO] Обработано изображений: {len(images)}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Выгрузка и загрузка данных в NDJSON и генерация синтетических данных для нагрузочных
+проверок (формат описан в src/bulk.py).
+
+Запуск:
+  python bulk_data.py export dump.ndjson            # '-' - в stdout
+  python bulk_data.py import dump.ndjson            # '-' - из stdin
+  python bulk_data.py generate --users 10000 --threads 200000 --seed 1
+  python bulk_data.py generate --users 100 --threads 1000 --output synthetic.ndjson
+  общий параметр: [--batch-size 5000]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Добавляем корневую директорию в path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_migrate import upgrade
+from sqlalchemy.exc import IntegrityError
+
+from src.web import create_app, db
+from src.bulk import (export_records, import_records, next_ids, read_ndjson, synthetic_records,
+                      write_ndjson)
+
+app = create_app()
+
+
+def migrate_schema():
+    # Только схема: тестовый пользователь init_db занял бы id из выгрузки
+    with app.app_context():
+        upgrade()
+
+
+def open_output(path):
+    return sys.stdout if path == '-' else open(path, 'w', encoding='utf-8')
+
+
+def open_input(path):
+    return sys.stdin if path == '-' else open(path, encoding='utf-8')
+
+
+def report_progress(started):
+    def on_chunk(kind, count):
+        # Прогресс в stderr, чтобы не мешать выводу в stdout
+        print(f"[INFO] {kind}: {count} ({time.monotonic() - started:.1f} сек.)", file=sys.stderr)
+    return on_chunk
+
+
+def summary(counts, started):
+    total = ', '.join(f'{kind}: {count}' for kind, count in counts.items())
+    return f"{total} за {time.monotonic() - started:.1f} сек."
+
+
+if __name__ == '__main__':
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--batch-size', type=int, default=5000, help='Строк в одной порции')
+
+    parser = argparse.ArgumentParser(description='Выгрузка, загрузка и генерация данных')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', parents=[common], help='Выгрузить все данные в NDJSON')
+    export.add_argument('path', help="Файл ('-' - stdout)")
+
+    load = commands.add_parser('import', parents=[common], help='Загрузить NDJSON в БД')
+    load.add_argument('path', help="Файл ('-' - stdin)")
+
+    generate = commands.add_parser('generate', parents=[common], help='Синтетические данные')
+    generate.add_argument('--users', type=int, default=1000, help='Пользователей')
+    generate.add_argument('--threads', type=int, default=10000, help='Веток (комментариев верхнего уровня)')
+    generate.add_argument('--seed', type=int, default=0, help='Зерно генератора (одинаковое - одинаковые данные)')
+    generate.add_argument('--page', default='comments', help='Страница комментариев')
+    generate.add_argument('--reply-alpha', type=float, default=1.3, help='Хвост распределения ответов')
+    generate.add_argument('--like-alpha', type=float, default=1.1, help='Хвост распределения лайков')
+    generate.add_argument('--max-replies', type=int, default=500, help='Максимум ответов в ветке')
+    generate.add_argument('--output', help="Записать в NDJSON вместо БД ('-' - stdout)")
+
+    args = parser.parse_args()
+    started = time.monotonic()
+
+    if args.command == 'export':
+        with app.app_context(), open_output(args.path) as out:
+            counts = write_ndjson(export_records(args.batch_size), out)
+        print(f"[INFO] Выгружено: {summary(counts, started)}", file=sys.stderr)
+    elif args.command == 'import':
+        migrate_schema()
+        with app.app_context(), open_input(args.path) as source:
+            try:
+                counts = import_records(read_ndjson(source), args.batch_size, report_progress(started))
+            except ValueError as e:
+                print(f"[ERROR] {e}", file=sys.stderr)
+                sys.exit(1)
+            except IntegrityError as e:
+                db.session.rollback()
+                print(f"[ERROR] Конфликт с данными в БД (загружайте в пустую базу): {e.orig}", file=sys.stderr)
+                sys.exit(1)
+        print(f"[INFO] Загружено: {summary(counts, started)}", file=sys.stderr)
+    else:
+        if not args.output:
+            migrate_schema()
+        with app.app_context():
+            # В БД - с первых свободных id, в файл - с единицы
+            start_id = None if args.output else next_ids()
+            records = synthetic_records(
+                args.users, args.threads, seed=args.seed, page=args.page, reply_alpha=args.reply_alpha,
+                like_alpha=args.like_alpha, max_replies=args.max_replies, start_id=start_id
+            )
+            if args.output:
+                with open_output(args.output) as out:
+                    counts = write_ndjson(records, out)
+            else:
+                counts = import_records(records, args.batch_size, report_progress(started))
+        print(f"[INFO] Сгенерировано: {summary(counts, started)}", file=sys.stderr)
@@ -8,14 +8,17 @@ import sys
 # Добавляем корневую директорию в path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from src.web import app, db
+from src.web import create_app, db
+from src.dp import init_db
+
+app = create_app()
 
 if __name__ == '__main__':
+    print("[INFO] Применяю миграции БД...")
+    init_db(app)
+    print("[INFO] Схема БД в актуальном состоянии!")
+
     with app.app_context():
-        print("[INFO] Создаю таблицы в БД...")
-        db.create_all()
-        print("[INFO] Таблицы успешно созданы!")
-        
         # Показываем информацию о таблицах
         inspector = db.inspect(db.engine)
         tables = inspector.get_table_names()
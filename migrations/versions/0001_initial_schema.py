@@ -0,0 +1,76 @@
+"""initial schema
+
+Базовая схема в том виде, в каком ее создавал db.create_all().
+Таблицы создаются только если их еще нет, поэтому ревизия применяется
+и к новой базе, и к уже существующей site.db / Postgres.
+
+Revision ID: 0001_initial_schema
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'user' not in tables:
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('nickname', sa.String(length=100), nullable=False),
+            sa.Column('avatar', sa.String(length=200), nullable=False),
+            sa.Column('vc_id', sa.String(length=100), nullable=True),
+            sa.Column('tg_id', sa.String(length=100), nullable=True),
+            sa.Column('google_id', sa.String(length=100), nullable=True),
+            sa.Column('yandex_id', sa.String(length=100), nullable=True),
+            sa.Column('email', sa.String(length=120), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email')
+        )
+    elif 'google_id' not in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('user')}:
+        # В старых базах колонка google_id появилась позже остальных
+        op.add_column('user', sa.Column('google_id', sa.String(length=100), nullable=True))
+
+    if 'comment' not in tables:
+        op.create_table(
+            'comment',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('text', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('page', sa.String(length=50), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('parent_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['parent_id'], ['comment.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'like' not in tables:
+        op.create_table(
+            'like',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('comment_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['comment_id'], ['comment.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('comment_id', 'user_id', name='unique_like')
+        )
+
+
+def downgrade():
+    op.drop_table('like')
+    op.drop_table('comment')
+    op.drop_table('user')
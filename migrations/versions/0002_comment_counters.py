@@ -0,0 +1,44 @@
+"""comment likes_count / replies_count counters
+
+Добавляет денормализованные счетчики, если их еще нет (раньше их добавлял
+repair_counters.py), и заполняет их по фактическим данным.
+
+Revision ID: 0002_comment_counters
+Revises: 0001_initial_schema
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_comment_counters'
+down_revision = '0001_initial_schema'
+branch_labels = None
+depends_on = None
+
+COUNTER_COLUMNS = ('likes_count', 'replies_count')
+
+
+def upgrade():
+    existing = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('comment')}
+    missing = [name for name in COUNTER_COLUMNS if name not in existing]
+    if not missing:
+        return
+
+    with op.batch_alter_table('comment') as batch_op:
+        for name in missing:
+            batch_op.add_column(sa.Column(name, sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        'UPDATE comment SET '
+        'likes_count = (SELECT COUNT(*) FROM "like" WHERE "like".comment_id = comment.id), '
+        'replies_count = (SELECT COUNT(*) FROM comment AS reply WHERE reply.parent_id = comment.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('comment') as batch_op:
+        for name in COUNTER_COLUMNS:
+            batch_op.drop_column(name)
@@ -0,0 +1,62 @@
+"""indexes for comment, like and user lookups
+
+Составные индексы повторяют форму запросов приложения:
+- верхнеуровневые комментарии страницы: page + parent_id IS NULL, сортировка (created_at, id);
+- все комментарии страницы (/api/comments/<page>): page, сортировка (created_at, id);
+- ответы на комментарий: parent_id, сортировка (created_at, id);
+- поиск пользователя в OAuth callback по yandex_id / google_id.
+
+Поиск лайков по comment_id уже обслуживает уникальный индекс unique_like
+(comment_id, user_id) - отдельный индекс по comment_id был бы его префиксом.
+Для выборок по пользователю добавлены индексы like.user_id и comment.user_id.
+
+На Postgres индексы строятся через CREATE INDEX CONCURRENTLY, чтобы не
+блокировать запись в рабочей базе.
+
+Revision ID: 0003_lookup_indexes
+Revises: 0002_comment_counters
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_lookup_indexes'
+down_revision = '0002_comment_counters'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_comment_page_parent_created', 'comment', ['page', 'parent_id', 'created_at', 'id']),
+    ('ix_comment_page_created', 'comment', ['page', 'created_at', 'id']),
+    ('ix_comment_parent_created', 'comment', ['parent_id', 'created_at', 'id']),
+    ('ix_comment_user_id', 'comment', ['user_id']),
+    ('ix_like_user_id', 'like', ['user_id']),
+    ('ix_user_yandex_id', 'user', ['yandex_id']),
+    ('ix_user_google_id', 'user', ['google_id']),
+]
+
+
+def _existing_indexes(bind, table):
+    return {index['name'] for index in sa.inspect(bind).get_indexes(table)}
+
+
+def upgrade():
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    for name, table, columns in INDEXES:
+        if name in _existing_indexes(bind, table):
+            continue
+        if is_postgres:
+            with op.get_context().autocommit_block():
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+        else:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
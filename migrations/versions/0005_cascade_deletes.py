@@ -0,0 +1,52 @@
+"""ON DELETE CASCADE for replies and likes
+
+Внешние ключи comment.parent_id и like.comment_id пересоздаются с ON DELETE CASCADE,
+чтобы удаление комментария на уровне БД удаляло ответы (на любой глубине) и лайки.
+В старых базах ключи безымянные: в Postgres берется имя из схемы, в SQLite
+таблица пересоздается в batch-режиме с соглашением об именах.
+
+Revision ID: 0005_cascade_deletes
+Revises: 0004_change_marker
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_cascade_deletes'
+down_revision = '0004_change_marker'
+branch_labels = None
+depends_on = None
+
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+# (таблица, колонка, таблица-владелец)
+CASCADES = [
+    ('comment', 'parent_id', 'comment'),
+    ('like', 'comment_id', 'comment'),
+]
+
+
+def _replace_foreign_key(table, column, referred, ondelete):
+    name = f'fk_{table}_{column}_{referred}'
+    existing = [
+        fk['name'] or name
+        for fk in sa.inspect(op.get_bind()).get_foreign_keys(table)
+        if fk['constrained_columns'] == [column]
+    ]
+    with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+        for fk_name in existing:
+            batch_op.drop_constraint(fk_name, type_='foreignkey')
+        batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    for table, column, referred in CASCADES:
+        _replace_foreign_key(table, column, referred, 'CASCADE')
+
+
+def downgrade():
+    for table, column, referred in CASCADES:
+        _replace_foreign_key(table, column, referred, None)
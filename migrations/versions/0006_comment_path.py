@@ -0,0 +1,60 @@
+"""materialized path for comment threads
+
+Колонка comment.path (см. PATH_SEGMENT в src/dp.py) с индексом и заполнение
+существующих строк: сначала комментарии верхнего уровня, затем уровень за уровнем
+ответы, чей родитель уже получил путь. Ответы без родителя (удаленного при выключенных
+внешних ключах) получают путь как комментарии верхнего уровня.
+
+Revision ID: 0006_comment_path
+Revises: 0005_cascade_deletes
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_comment_path'
+down_revision = '0005_cascade_deletes'
+branch_labels = None
+depends_on = None
+
+PATH_SEGMENT = 10
+
+
+def _segment_sql(dialect):
+    """SQL-выражение: id, дополненный нулями до PATH_SEGMENT цифр"""
+    if dialect == 'postgresql':
+        return f"lpad(CAST(comment.id AS TEXT), {PATH_SEGMENT}, '0')"
+    return f"substr('{'0' * PATH_SEGMENT}' || comment.id, -{PATH_SEGMENT}, {PATH_SEGMENT})"
+
+
+def upgrade():
+    path_type = sa.String(length=250).with_variant(sa.String(length=250, collation='C'), 'postgresql')
+    with op.batch_alter_table('comment') as batch_op:
+        batch_op.add_column(sa.Column('path', path_type, nullable=True))
+        batch_op.create_index('ix_comment_path', ['path'])
+
+    bind = op.get_bind()
+    segment = _segment_sql(bind.dialect.name)
+    bind.execute(sa.text(f"UPDATE comment SET path = {segment} WHERE parent_id IS NULL"))
+
+    # Уровень за уровнем: ответы, у родителя которых путь уже есть
+    while True:
+        updated = bind.execute(sa.text(
+            f"UPDATE comment SET path = ("
+            f"  SELECT parent.path FROM comment AS parent WHERE parent.id = comment.parent_id"
+            f") || {segment} "
+            f"WHERE path IS NULL AND parent_id IN (SELECT id FROM comment WHERE path IS NOT NULL)"
+        )).rowcount
+        if not updated:
+            break
+
+    bind.execute(sa.text(f"UPDATE comment SET path = {segment} WHERE path IS NULL"))
+
+
+def downgrade():
+    with op.batch_alter_table('comment') as batch_op:
+        batch_op.drop_index('ix_comment_path')
+        batch_op.drop_column('path')
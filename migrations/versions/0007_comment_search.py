@@ -0,0 +1,88 @@
+"""full-text search index for comments
+
+SQLite: внешнее FTS5-содержимое comment_fts (текст берется из comment по rowid)
+и триггеры, обновляющие индекс при вставке, изменении и удалении комментария.
+Postgres: вычисляемая колонка comment.search_vector (tsvector, конфигурация russian)
+с GIN-индексом - обновляется самой БД.
+
+Пересоздание таблицы comment в batch-режиме SQLite удаляет триггеры: такая миграция
+должна создать их заново.
+
+Revision ID: 0007_comment_search
+Revises: 0006_comment_path
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_comment_search'
+down_revision = '0006_comment_path'
+branch_labels = None
+depends_on = None
+
+SQLITE_UPGRADE = [
+    """
+    CREATE VIRTUAL TABLE comment_fts USING fts5(
+        text, content='comment', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER comment_fts_insert AFTER INSERT ON comment BEGIN
+        INSERT INTO comment_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER comment_fts_delete AFTER DELETE ON comment BEGIN
+        INSERT INTO comment_fts(comment_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER comment_fts_update AFTER UPDATE OF text ON comment BEGIN
+        INSERT INTO comment_fts(comment_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO comment_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    # Индекс для уже существующих комментариев
+    "INSERT INTO comment_fts(comment_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS comment_fts_update',
+    'DROP TRIGGER IF EXISTS comment_fts_delete',
+    'DROP TRIGGER IF EXISTS comment_fts_insert',
+    'DROP TABLE IF EXISTS comment_fts',
+]
+
+POSTGRES_UPGRADE = [
+    """
+    ALTER TABLE comment ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('russian', coalesce(text, ''))) STORED
+    """,
+    'CREATE INDEX ix_comment_search_vector ON comment USING gin (search_vector)',
+]
+
+POSTGRES_DOWNGRADE = [
+    'DROP INDEX IF EXISTS ix_comment_search_vector',
+    'ALTER TABLE comment DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def _run(statements):
+    for statement in statements:
+        op.execute(statement)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        _run(POSTGRES_UPGRADE)
+    else:
+        _run(SQLITE_UPGRADE)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        _run(POSTGRES_DOWNGRADE)
+    else:
+        _run(SQLITE_DOWNGRADE)
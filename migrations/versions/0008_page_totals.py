@@ -0,0 +1,43 @@
+"""change_marker.total: number of top-level comments per page
+
+Денормализованный счетчик основных комментариев страницы в строке 'page:<page>'
+(для заголовка /comments без COUNT по всей странице). Заполняется по фактическим данным;
+для страниц без строки change_marker строка создается с версией 0.
+
+Revision ID: 0008_page_totals
+Revises: 0007_comment_search
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_page_totals'
+down_revision = '0007_comment_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('change_marker') as batch_op:
+        batch_op.add_column(sa.Column('total', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        "UPDATE change_marker SET total = (SELECT COUNT(*) FROM comment "
+        "WHERE comment.parent_id IS NULL AND 'page:' || comment.page = change_marker.scope) "
+        "WHERE scope LIKE 'page:%'"
+    )
+    op.execute(
+        "INSERT INTO change_marker (scope, version, updated_at, total) "
+        "SELECT 'page:' || page, 0, CURRENT_TIMESTAMP, COUNT(*) FROM comment "
+        "WHERE parent_id IS NULL AND page IS NOT NULL "
+        "AND 'page:' || page NOT IN (SELECT scope FROM change_marker) "
+        "GROUP BY page"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('change_marker') as batch_op:
+        batch_op.drop_column('total')
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Массовая модерация комментариев: удаление всех комментариев пользователя, страницы
+или старше даты вместе с ответами и лайками.
+
+Удаление идет порциями (каждая - короткая транзакция записи), поэтому сайт продолжает
+работать во время чистки. Без --yes только показывает, сколько комментариев подходит.
+
+Запуск:
+  python moderate.py by-user 42 [--yes]
+  python moderate.py by-page comments [--yes]
+  python moderate.py older-than 2024-01-01 [--page comments] [--yes]
+  общие параметры: [--batch-size 500] [--pause 0.05]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Добавляем корневую директорию в path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.web import create_app
+from src.dp import Comment
+from src.moderation import count_matching, delete_matching
+
+app = create_app()
+
+
+def build_criteria(args):
+    if args.command == 'by-user':
+        return [Comment.user_id == args.user_id]
+    if args.command == 'by-page':
+        return [Comment.page == args.page]
+    criteria = [Comment.created_at < args.date]
+    if args.page:
+        criteria.append(Comment.page == args.page)
+    return criteria
+
+
+def parse_date(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'ожидается дата в формате ГГГГ-ММ-ДД: {value}')
+
+
+if __name__ == '__main__':
+    # Общие параметры принимаются после команды
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--batch-size', type=int, default=500, help='Комментариев в одной транзакции')
+    common.add_argument('--pause', type=float, default=0.05, help='Пауза между порциями, сек.')
+    common.add_argument('--yes', action='store_true', help='Удалить (без флага - только подсчет)')
+
+    parser = argparse.ArgumentParser(description='Массовое удаление комментариев')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    by_user = commands.add_parser('by-user', parents=[common], help='Все комментарии пользователя')
+    by_user.add_argument('user_id', type=int)
+
+    by_page = commands.add_parser('by-page', parents=[common], help='Все комментарии страницы')
+    by_page.add_argument('page')
+
+    older_than = commands.add_parser('older-than', parents=[common], help='Комментарии старше даты')
+    older_than.add_argument('date', type=parse_date)
+    older_than.add_argument('--page', help='Только на этой странице')
+
+    args = parser.parse_args()
+
+    with app.app_context():
+        criteria = build_criteria(args)
+        matching = count_matching(criteria)
+        print(f"[INFO] Подходит комментариев: {matching} (ответы на них удаляются вместе с ними)")
+        if not args.yes:
+            print("[INFO] Ничего не удалено: для удаления добавьте --yes")
+            sys.exit(0)
+
+        total = 0
+        for deleted in delete_matching(criteria, batch_size=args.batch_size, pause=args.pause):
+            total += deleted
+            print(f"[INFO] Удалено: {total}")
+        print(f"[INFO] Готово, удалено комментариев с ответами: {total}")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Скрипт для пересчета денормализованных счетчиков комментариев
+(likes_count и replies_count) и числа основных комментариев страниц
+(change_marker.total) после рассинхронизации.
+
+Запуск: python repair_counters.py [--batch-size 5000]
+"""
+import argparse
+import os
+import sys
+
+# Добавляем корневую директорию в path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import aliased
+
+from src.web import create_app, db
+from src.dp import ChangeMarker, Comment, Like, adjust_page_totals, bump_change_markers
+
+app = create_app()
+
+
+def repair_counters(batch_size):
+    """Пересчитывает счетчики диапазонами id, каждая порция - отдельная короткая транзакция.
+
+    Вместе с исправленными строками увеличиваются версии их страниц и веток, чтобы
+    ETag и кэш списков в работающих процессах сайта перестали отдавать старые счетчики.
+    """
+    reply = aliased(Comment)
+    likes_count = select(func.count(Like.id)).where(Like.comment_id == Comment.id).scalar_subquery()
+    replies_count = select(func.count(reply.id)).where(reply.parent_id == Comment.id).scalar_subquery()
+
+    max_id = db.session.query(func.max(Comment.id)).scalar() or 0
+    repaired = 0
+    for start in range(0, max_id + 1, batch_size):
+        stmt = (
+            update(Comment)
+            .where(
+                Comment.id >= start,
+                Comment.id < start + batch_size,
+                # Переписываем только строки, где счетчики разошлись с фактом
+                or_(Comment.likes_count != likes_count, Comment.replies_count != replies_count)
+            )
+            .values(likes_count=likes_count, replies_count=replies_count)
+            .returning(Comment.id, Comment.page, Comment.parent_id)
+            .execution_options(synchronize_session=False)
+        )
+        rows = db.session.execute(stmt).all()
+        if rows:
+            scopes = {f'page:{row.page}' for row in rows}
+            scopes.update(f'thread:{row.parent_id}' for row in rows if row.parent_id is not None)
+            bump_change_markers(*scopes)
+        repaired += len(rows)
+        db.session.commit()
+    return repaired
+
+
+def repair_page_totals():
+    """Сверяет change_marker.total страниц с фактом одним GROUP BY; возвращает число исправленных страниц"""
+    actual = dict(db.session.execute(
+        select(Comment.page, func.count(Comment.id))
+        .where(Comment.parent_id.is_(None), Comment.page.isnot(None))
+        .group_by(Comment.page)
+    ).all())
+    stored = {
+        scope[len('page:'):]: total for scope, total in db.session.execute(
+            select(ChangeMarker.scope, ChangeMarker.total).where(ChangeMarker.scope.like('page:%'))
+        ).all()
+    }
+    deltas = {
+        page: actual.get(page, 0) - stored.get(page, 0)
+        for page in set(actual) | set(stored)
+        if actual.get(page, 0) != stored.get(page, 0)
+    }
+    adjust_page_totals(deltas)
+    bump_change_markers(*(f'page:{page}' for page in deltas))
+    db.session.commit()
+    return len(deltas)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Пересчет счетчиков лайков и ответов')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Размер порции по id комментария')
+    args = parser.parse_args()
+
+    with app.app_context():
+        print("[INFO] Пересчитываю счетчики комментариев...")
+        repaired = repair_counters(args.batch_size)
+        print(f"[INFO] Исправлено комментариев: {repaired}")
+        print("[INFO] Пересчитываю число комментариев страниц...")
+        print(f"[INFO] Исправлено страниц: {repair_page_totals()}")
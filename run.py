@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-Точка входа для запуска Flask приложения
+Точка входа для запуска Flask приложения (сервер разработки).
+Для продакшена используйте serve.py.
 """
 
 import os
@@ -9,9 +10,14 @@ import sys
 # Добавляем src в путь Python
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.web import app
+from src.web import create_app, print_config
+from src.dp import init_db
 
 if __name__ == '__main__':
+    app = create_app()
+    print_config(app)
+    init_db(app)
+
     print(f"[INFO] База данных: {app.config['SQLALCHEMY_DATABASE_URI']}")
     print("[INFO] Запуск Flask приложения...")
 
@@ -19,4 +25,4 @@ if __name__ == '__main__':
         host=os.getenv('FLASK_HOST', '0.0.0.0'),
         port=int(os.getenv('FLASK_PORT', 5000)),
         debug=os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
-    )
\ No newline at end of file
+    )
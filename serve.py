@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Запуск приложения в продакшене: несколько рабочих процессов с потоками (gunicorn, gthread).
+
+Схема БД приводится к последней миграции один раз в главном процессе, до запуска
+рабочих. Шаблоны компилируются до fork (с кэшем байткода на диске), а каждый
+рабочий процесс открывает соединения пула до того, как начнет принимать запросы.
+
+Потоки SSE (/api/comments/<page>/stream) держат поток gthread до SSE_MAX_DURATION,
+поэтому потоков по умолчанию больше, чем нужно обычным запросам: предел подписчиков
+процесса - --threads минус SSE_RESERVED_THREADS (sse_subscriber_limit в src/web.py).
+
+Запуск: python serve.py [--workers 4] [--threads 32] [--bind 0.0.0.0:5000]
+"""
+import argparse
+import os
+import sys
+
+# Добавляем корневую директорию в path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gunicorn.app.base import BaseApplication
+
+from src.web import create_app, db, warm_pool, warm_templates
+from src.dp import init_db
+
+
+class Server(BaseApplication):
+    """gunicorn с уже созданным приложением (аналог preload_app)"""
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def default_workers():
+    return min((os.cpu_count() or 1) * 2 + 1, 8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Запуск приложения в продакшене')
+    parser.add_argument('--bind', default=f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', 5000)}")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS', default_workers())),
+                        help='Количество рабочих процессов')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 32)),
+                        help='Количество потоков в каждом процессе (часть из них занимают потоки SSE)')
+    parser.add_argument('--timeout', type=int, default=int(os.getenv('WEB_TIMEOUT', 30)))
+    parser.add_argument('--skip-migrations', action='store_true',
+                        help='Не применять миграции (если их применяет отдельный шаг выкладки)')
+    args = parser.parse_args()
+
+    app = create_app({'WEB_THREADS': args.threads})
+    sse_limit = app.config['SSE_MAX_SUBSCRIBERS']
+    if not sse_limit:
+        print(f"[WARNING] Потоков ({args.threads}) не больше запаса SSE_RESERVED_THREADS "
+              f"({app.config['SSE_RESERVED_THREADS']}): обновления в реальном времени отключены (503)")
+    if not args.skip_migrations:
+        init_db(app)
+    print(f"[INFO] Скомпилировано шаблонов: {warm_templates(app)}")
+
+    # Соединения главного процесса не должны достаться рабочим процессам после fork
+    with app.app_context():
+        db.engine.dispose()
+
+    def post_fork(server, worker):
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+    def post_worker_init(worker):
+        print(f"[INFO] Рабочий процесс {worker.pid}: открыто соединений {warm_pool(app, args.threads)}")
+
+    print(f"[INFO] Запуск на {args.bind}: процессов {args.workers}, потоков {args.threads}, "
+          f"потоков SSE не больше {sse_limit}")
+    Server(app, {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'accesslog': '-',
+    }).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,3 @@
-from .web import app, db, User, Comment
+from .web import create_app, db, User, Comment
 
-__all__ = ['app', 'db', 'User', 'Comment']
\ No newline at end of file
+__all__ = ['create_app', 'db', 'User', 'Comment']
@@ -0,0 +1,130 @@
+"""
+Отдача собранных статических файлов (см. build_assets.py).
+
+Сборка кладет в static/build/ минифицированные копии CSS/JS с хэшем содержимого
+в имени, их .gz/.br версии и manifest.json вида {"css/styles.css": "css/styles.<hash>.css"}.
+Если манифест есть, url_for('static', filename=...) в шаблонах возвращает адрес
+собранного файла, который отдается с Cache-Control: immutable.
+Без сборки (разработка) все работает как обычная статика Flask.
+
+Для изображений сборка пишет images.json с уменьшенными копиями; в шаблонах
+доступны responsive_image() (тег <picture> с srcset/sizes) и image_url().
+"""
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_file, url_for
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+
+BUILD_DIR = 'build'
+MANIFEST_NAME = 'manifest.json'
+IMAGES_MANIFEST_NAME = 'images.json'
+
+# MIME-типы производных изображений для <source type="...">
+IMAGE_MIMETYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'jpeg': 'image/jpeg',
+}
+
+# Сжатые копии в порядке предпочтения: (Content-Encoding, расширение файла)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Файл с хэшем в имени не меняется никогда - кэшируем на год
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def load_manifest(build_dir, name=MANIFEST_NAME):
+    """Манифест сборки или пустой словарь, если сборки нет"""
+    try:
+        with open(os.path.join(build_dir, name), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_assets(app):
+    """Подключает собранные ассеты к приложению"""
+    build_dir = os.path.join(app.static_folder, BUILD_DIR)
+    manifest = load_manifest(build_dir)
+
+    images = load_manifest(build_dir, IMAGES_MANIFEST_NAME)
+
+    # Версия сборки меняет адреса в HTML - она участвует в ETag страниц
+    app.config['ASSETS_VERSION'] = hashlib.sha1(
+        json.dumps([manifest, images], sort_keys=True).encode()
+    ).hexdigest()[:12]
+
+    def asset_url_for(endpoint, **values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+            return url_for('assets', **values)
+        return url_for(endpoint, **values)
+
+    def srcset(variants):
+        return ', '.join(f"{url_for('assets', filename=rel)} {width}w" for width, rel in variants)
+
+    def image_url(filename, width=None, fmt=None):
+        """Адрес одной копии: наименьшая не уже width в формате fmt (по умолчанию - запасном)"""
+        entry = images.get(filename)
+        if not entry:
+            return url_for('static', filename=filename)
+        variants = entry['variants'].get(fmt) or entry['variants'][entry['fallback']]
+        suitable = [v for v in variants if width is None or v[0] >= width]
+        width_rel = suitable[0] if suitable else variants[-1]
+        return url_for('assets', filename=width_rel[1])
+
+    def responsive_image(filename, alt='', sizes='100vw', **attrs):
+        """<picture> с AVIF/WebP-источниками и запасным <img> с srcset, sizes, width и height"""
+        entry = images.get(filename)
+        attrs.setdefault('loading', 'lazy')
+        attrs.setdefault('decoding', 'async')
+        if entry:
+            attrs.setdefault('width', entry['width'])
+            attrs.setdefault('height', entry['height'])
+        img_attrs = ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items())
+
+        if not entry:
+            return Markup(f'<img src="{escape(url_for("static", filename=filename))}" alt="{escape(alt)}"{img_attrs}>')
+
+        fallback = entry['fallback']
+        sources = ''.join(
+            f'<source type="{IMAGE_MIMETYPES[fmt]}" srcset="{escape(srcset(variants))}" sizes="{escape(sizes)}">'
+            for fmt, variants in entry['variants'].items() if fmt != fallback
+        )
+        variants = entry['variants'][fallback]
+        return Markup(
+            f'<picture>{sources}'
+            f'<img src="{escape(url_for("assets", filename=variants[-1][1]))}" '
+            f'srcset="{escape(srcset(variants))}" sizes="{escape(sizes)}" alt="{escape(alt)}"{img_attrs}>'
+            f'</picture>'
+        )
+
+    def serve_asset(filename):
+        path = safe_join(build_dir, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for name, suffix in ENCODINGS:
+            if request.accept_encodings[name] and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, name
+                break
+
+        response = send_file(path, mimetype=mimetype, conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+    app.jinja_env.globals.update(responsive_image=responsive_image, image_url=image_url)
+    if manifest:
+        app.jinja_env.globals['url_for'] = asset_url_for
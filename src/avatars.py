@@ -0,0 +1,167 @@
+"""
+Локальный прокси и дисковый кэш аватаров пользователей.
+
+Аватары из Яндекса/Google скачиваются один раз (с таймаутом), приводятся
+к квадрату фиксированного размера и хранятся в каталоге кэша. Объем каталога
+ограничен: при превышении удаляются файлы, к которым дольше всего не обращались.
+Если аватар получить не удалось, отдается аватар по умолчанию.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+
+import requests
+from PIL import Image, ImageDraw, ImageOps
+
+from .instrumentation import timed_phase
+
+logger = logging.getLogger(__name__)
+
+AVATAR_FORMAT = 'WEBP'
+AVATAR_EXTENSION = '.webp'
+AVATAR_MIMETYPE = 'image/webp'
+
+# Не скачиваем картинки больше этого размера
+MAX_DOWNLOAD_BYTES = 5 * 1024 * 1024
+
+# После неудачной загрузки не пытаемся снова какое-то время
+FAILURE_TTL = 300
+
+# Цвета градиента аватара по умолчанию (как в CSS .avatar-default)
+DEFAULT_GRADIENT = ((0x4a, 0x90, 0xe2), (0x8a, 0x2b, 0xe2))
+
+
+def avatar_version(avatar):
+    """Короткий хэш адреса аватара: меняется вместе с аватаром, используется в URL"""
+    return hashlib.sha1((avatar or '').encode()).hexdigest()[:10]
+
+
+def is_remote(avatar):
+    return bool(avatar) and avatar.startswith(('http://', 'https://'))
+
+
+class AvatarCache:
+    """Дисковый кэш нормализованных аватаров с LRU-вытеснением по объему"""
+
+    def __init__(self, cache_dir, max_bytes=50 * 1024 * 1024, size=96, timeout=5, session=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = size
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self._failures = {}  # url -> время, до которого не повторяем загрузку
+        # Объем каталога считается при первой записи: создание кэша не трогает диск
+        self._bytes = None
+
+    def path_for(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(f'{url}:{self.size}'.encode()).hexdigest() + AVATAR_EXTENSION)
+
+    def get(self, url):
+        """Путь к файлу аватара или None, если его не удалось получить"""
+        path = self.path_for(url)
+        if self._touch(path):
+            return path
+
+        if self._failures.get(url, 0) > time.monotonic():
+            return None
+
+        # Один и тот же аватар скачивает только один поток
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(path, threading.Lock())
+        with fetch_lock:
+            try:
+                if self._touch(path):
+                    return path
+                data = self._normalize(self._download(url))
+                self._store(path, data)
+                return path
+            except (requests.RequestException, OSError, ValueError) as e:
+                logger.warning("Не удалось загрузить аватар %s: %s", url, e)
+                self._failures[url] = time.monotonic() + FAILURE_TTL
+                return None
+            finally:
+                with self._lock:
+                    self._fetch_locks.pop(path, None)
+
+    def default(self):
+        """Аватар по умолчанию (генерируется один раз)"""
+        path = os.path.join(self.cache_dir, f'default-{self.size}{AVATAR_EXTENSION}')
+        if not self._touch(path):
+            image = Image.new('RGB', (self.size, self.size))
+            draw = ImageDraw.Draw(image)
+            (r1, g1, b1), (r2, g2, b2) = DEFAULT_GRADIENT
+            for i in range(self.size * 2):
+                t = i / (self.size * 2)
+                color = (round(r1 + (r2 - r1) * t), round(g1 + (g2 - g1) * t), round(b1 + (b2 - b1) * t))
+                draw.line([(i, 0), (0, i)], fill=color)
+            buffer = io.BytesIO()
+            image.save(buffer, format=AVATAR_FORMAT, quality=85)
+            self._store(path, buffer.getvalue())
+        return path
+
+    def _download(self, url):
+        with timed_phase('http'), self.session.get(url, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            chunks, total = [], 0
+            for chunk in response.iter_content(64 * 1024):
+                total += len(chunk)
+                if total > MAX_DOWNLOAD_BYTES:
+                    raise ValueError('avatar is too large')
+                chunks.append(chunk)
+            return b''.join(chunks)
+
+    def _normalize(self, data):
+        """Квадрат size x size по центру исходной картинки"""
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            image = ImageOps.fit(image, (self.size, self.size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format=AVATAR_FORMAT, quality=85)
+            return buffer.getvalue()
+
+    def _store(self, path, data):
+        # Пишем во временный файл и переименовываем - читатели не видят недописанный файл
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.is_file())
+            else:
+                self._bytes += len(data)
+        self._evict()
+
+    def _touch(self, path):
+        """Отмечает обращение к файлу (mtime - время последнего использования)"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _evict(self):
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            entries = sorted(
+                (entry for entry in os.scandir(self.cache_dir) if entry.is_file()),
+                key=lambda entry: entry.stat().st_mtime
+            )
+            self._bytes = sum(entry.stat().st_size for entry in entries)
+            for entry in entries:
+                if self._bytes <= self.max_bytes:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    self._bytes -= size
+                except FileNotFoundError:
+                    pass
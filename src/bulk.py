@@ -0,0 +1,268 @@
+"""
+Потоковый экспорт и импорт данных (NDJSON) и генератор синтетических данных.
+
+Формат: одна JSON-запись на строку, поле "type" - 'user', 'comment' или 'like',
+остальные поля - колонки таблицы (даты в ISO 8601). Запись идет после тех, на которые
+ссылается: пользователь раньше своих комментариев, родитель раньше ответа, комментарий
+раньше лайков.
+
+Экспорт читает таблицы порциями (yield_per), импорт пишет порциями: executemany,
+а в Postgres - COPY. Генератор отдает записи того же формата по одной, поэтому
+и миллион комментариев проходит в постоянной памяти.
+"""
+import csv
+import io
+import json
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, text
+
+from .dp import db, User, Comment, Like, MAX_DEPTH, adjust_page_totals, bump_change_markers, path_segment
+
+MODELS = {'user': User, 'comment': Comment, 'like': Like}
+# Порядок таблиц при экспорте и импорте: внешние ключи ссылаются на предыдущие
+TABLE_ORDER = ('user', 'comment', 'like')
+
+
+def _columns(model):
+    return [column for column in model.__table__.columns]
+
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_records(batch_size=5000):
+    """Все записи для NDJSON: таблицы читаются порциями по batch_size строк"""
+    for kind in TABLE_ORDER:
+        model = MODELS[kind]
+        columns = _columns(model)
+        stmt = select(*columns).order_by(model.id).execution_options(yield_per=batch_size)
+        for row in db.session.execute(stmt):
+            record = {'type': kind}
+            record.update((column.name, _encode(value)) for column, value in zip(columns, row))
+            yield record
+
+
+def write_ndjson(records, out):
+    """Пишет записи в файл; возвращает {тип: количество}"""
+    counts = dict.fromkeys(TABLE_ORDER, 0)
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write('\n')
+        counts[record['type']] += 1
+    return counts
+
+
+def read_ndjson(lines):
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f'строка {number}: {e}')
+        if record.get('type') not in MODELS:
+            raise ValueError(f"строка {number}: неизвестный тип {record.get('type')!r}")
+        yield record
+
+
+def _decode_row(model, record):
+    row = {}
+    for column in _columns(model):
+        if column.name not in record:
+            continue
+        value = record[column.name]
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        row[column.name] = value
+    return row
+
+
+def _insert_chunk(model, rows):
+    """Порция строк одной таблицы: COPY в Postgres, executemany в остальных БД"""
+    session_bind = db.session.get_bind()
+    if session_bind.dialect.name != 'postgresql':
+        db.session.execute(model.__table__.insert(), rows)
+        return
+
+    names = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[name] is None else _encode(row[name]) for name in names])
+    buffer.seek(0)
+    columns = ', '.join(f'"{name}"' for name in names)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        f'COPY "{model.__tablename__}" ({columns}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')', buffer
+    )
+
+
+def _comment_scopes(rows):
+    """Области change_marker, которые меняет вставка строк комментариев"""
+    scopes = {f"page:{row.get('page') or 'comments'}" for row in rows}
+    scopes.update(f"thread:{row['parent_id']}" for row in rows if row.get('parent_id') is not None)
+    return scopes
+
+
+def _page_deltas(rows):
+    """{страница: число основных комментариев среди строк}"""
+    deltas = {}
+    for row in rows:
+        if row.get('parent_id') is None:
+            page = row.get('page') or 'comments'
+            deltas[page] = deltas.get(page, 0) + 1
+    return deltas
+
+
+def import_records(records, batch_size=5000, on_chunk=None):
+    """Вставляет записи порциями по batch_size строк, каждая порция - отдельная транзакция.
+
+    Записи копятся по таблицам; перед записью порции таблицы записываются накопленные
+    строки таблиц, на которые она ссылается (лайки - после комментариев и т.д.).
+    Версии страниц и веток с новыми комментариями и счетчики основных комментариев
+    страниц меняются в той же транзакции, что и вставка, - ETag и кэш списков во всех
+    процессах видят импорт сразу.
+    Возвращает {тип: количество}.
+    """
+    counts = dict.fromkeys(TABLE_ORDER, 0)
+    pending = {kind: [] for kind in TABLE_ORDER}
+
+    def flush(upto):
+        for kind in TABLE_ORDER[:TABLE_ORDER.index(upto) + 1]:
+            rows = pending[kind]
+            if not rows:
+                continue
+            _insert_chunk(MODELS[kind], rows)
+            if kind == 'comment':
+                bump_change_markers(*_comment_scopes(rows))
+                adjust_page_totals(_page_deltas(rows))
+            counts[kind] += len(rows)
+            if on_chunk:
+                on_chunk(kind, counts[kind])
+            pending[kind] = []
+        db.session.commit()
+
+    for record in records:
+        kind = record['type']
+        row = _decode_row(MODELS[kind], record)
+        rows = pending[kind]
+        # executemany и COPY требуют одинакового набора колонок в порции
+        if rows and (len(rows) >= batch_size or rows[0].keys() != row.keys()):
+            flush(kind)
+            rows = pending[kind]
+        rows.append(row)
+    flush(TABLE_ORDER[-1])
+
+    finish_import()
+    return counts
+
+
+def finish_import():
+    """После вставки с явными id: пути веток без path и счетчики последовательностей"""
+    backfill_paths()
+    if db.session.get_bind().dialect.name == 'postgresql':
+        for model in MODELS.values():
+            table = model.__tablename__
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM \"{table}\"), 0) + 1, false)"
+            ))
+    db.session.commit()
+
+
+def backfill_paths():
+    """Заполняет path у комментариев без него (вставленных мимо ORM), уровень за уровнем"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        segment = f"lpad(CAST(comment.id AS TEXT), {len(path_segment(0))}, '0')"
+    else:
+        width = len(path_segment(0))
+        segment = f"substr('{'0' * width}' || comment.id, -{width}, {width})"
+
+    db.session.execute(text(f"UPDATE comment SET path = {segment} WHERE path IS NULL AND parent_id IS NULL"))
+    while db.session.execute(text(
+        f"UPDATE comment SET path = ("
+        f"  SELECT parent.path FROM comment AS parent WHERE parent.id = comment.parent_id"
+        f") || {segment} "
+        f"WHERE path IS NULL AND parent_id IN (SELECT id FROM comment WHERE path IS NOT NULL)"
+    )).rowcount:
+        pass
+    db.session.commit()
+
+
+# Словарь для текста синтетических комментариев
+WORDS = (
+    'отличный пост спасибо автору интересно согласен нет думаю что это проект работает '
+    'быстро медленно сайт комментарий ответ вопрос код python flask база данных запрос '
+    'страница дизайн удобно красиво идея можно было бы лучше хуже очень немного совсем '
+    'кстати например всегда иногда никогда сервер кэш индекс поиск лайк тема'
+).split()
+
+
+def _skewed(rng, alpha, cap):
+    """Целое с тяжелым хвостом (Парето): чаще всего 0-2, изредка сотни"""
+    return min(int(rng.paretovariate(alpha)) - 1, cap)
+
+
+def synthetic_records(users, threads, seed=0, page='comments', reply_alpha=1.3, like_alpha=1.1,
+                      max_replies=500, max_likes=None, start_id=None, start=None):
+    """Синтетические записи: users пользователей и threads веток.
+
+    Число ответов в ветке и лайков на комментарий распределено по Парето (параметры
+    reply_alpha, like_alpha: меньше - тяжелее хвост). Ответы бывают вложенными.
+    В памяти держится только текущая ветка (не больше max_replies ответов).
+    """
+    rng = random.Random(seed)
+    start_id = start_id or {'user': 1, 'comment': 1, 'like': 1}
+    start = start or datetime(2024, 1, 1)
+    max_likes = min(max_likes or users, users)
+
+    user_ids = range(start_id['user'], start_id['user'] + users)
+    for user_id in user_ids:
+        yield {
+            'type': 'user', 'id': user_id, 'nickname': f'user{user_id}', 'avatar': 'default-avatar.png',
+            'email': f'user{user_id}@example.com', 'created_at': start.isoformat(),
+        }
+
+    comment_id, like_id = start_id['comment'], start_id['like']
+    created = start
+    pending_likes = []
+    for _ in range(threads):
+        # Ветка целиком: сначала структура (родитель, глубина), затем записи с готовыми счетчиками
+        nodes = [{'id': comment_id, 'parent': None, 'depth': 0, 'path': path_segment(comment_id), 'replies': 0}]
+        comment_id += 1
+        for _ in range(_skewed(rng, reply_alpha, max_replies)):
+            parent = nodes[0] if rng.random() < 0.6 else rng.choice(nodes)
+            if parent['depth'] >= MAX_DEPTH:
+                parent = nodes[0]
+            parent['replies'] += 1
+            nodes.append({'id': comment_id, 'parent': parent['id'], 'depth': parent['depth'] + 1,
+                          'path': parent['path'] + path_segment(comment_id), 'replies': 0})
+            comment_id += 1
+
+        for node in nodes:
+            created += timedelta(seconds=rng.randint(1, 120))
+            # Лайки только у комментариев верхнего уровня (на ответы лайки отключены)
+            liked_by = rng.sample(user_ids, _skewed(rng, like_alpha, max_likes)) if node['parent'] is None else []
+            yield {
+                'type': 'comment', 'id': node['id'], 'page': page, 'parent_id': node['parent'],
+                'user_id': rng.choice(user_ids), 'created_at': created.isoformat(), 'path': node['path'],
+                'text': ' '.join(rng.choices(WORDS, k=rng.randint(3, 40))).capitalize(),
+                'likes_count': len(liked_by), 'replies_count': node['replies'],
+            }
+            for user_id in liked_by:
+                pending_likes.append({'type': 'like', 'id': like_id, 'comment_id': node['id'],
+                                      'user_id': user_id, 'created_at': created.isoformat()})
+                like_id += 1
+
+        # Лайки ссылаются на уже выданные комментарии; отдаем их после ветки
+        yield from pending_likes
+        pending_likes.clear()
+
+
+def next_ids():
+    """Первые свободные id таблиц - генерация поверх существующих данных"""
+    return {kind: (db.session.scalar(select(func.max(model.id))) or 0) + 1 for kind, model in MODELS.items()}
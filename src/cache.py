@@ -0,0 +1,141 @@
+"""
+Кэш для JSON-ответов со списками комментариев.
+
+Ключи данных включают номер версии области (страница или ветка ответов) из таблицы
+change_marker: запись увеличивает его в той же транзакции, что и сами данные. Старые
+ключи не удаляются - устаревшие записи просто перестают читаться и со временем
+вытесняются по LRU/TTL. Версия хранится в БД, поэтому изменения из любого процесса
+(другие рабочие процессы, moderate.py, bulk_data.py, repair_counters.py) видны сразу.
+
+Хранилище подключаемое: по умолчанию данные живут в памяти процесса
+(MemoryCacheBackend), для общего кэша между процессами достаточно
+реализовать CacheBackend поверх общего хранилища (например, Redis).
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheBackend:
+    """Интерфейс хранилища кэша"""
+
+    def get(self, key):
+        """Значение по ключу или None, если ключа нет или он просрочен"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Сохраняет значение; ttl в секундах, None - без ограничения по времени"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def stats(self):
+        """Служебные счетчики хранилища"""
+        return {}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Хранилище в памяти процесса с LRU-вытеснением, TTL и ограничением по объему"""
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            # Значение больше всего кэша - не кэшируем
+            return
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'evictions': self._evictions
+            }
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._data))
+            self._remove(key)
+            self._evictions += 1
+
+    @staticmethod
+    def _sizeof(value):
+        # Оценка занимаемой памяти по размеру сериализованного значения
+        try:
+            return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return 1
+
+
+class VersionedCache:
+    """Read-through кэш с версиями областей.
+
+    Область (scope) - например, 'page:comments' или 'thread:42'; версию области
+    передает вызывающий (ChangeMarker.version). Запись, меняющая данные области,
+    увеличивает версию, после чего все ключи прежней версии становятся недостижимыми.
+    """
+
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, scope, version, key, loader):
+        """Значение из кэша или результат loader(), сохраненный под версией version"""
+        full_key = f'{scope}:v{version}:{key}'
+        value = self.backend.get(full_key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+        value = loader()
+        self.backend.set(full_key, value, self.ttl)
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses}
+        stats.update(self.backend.stats())
+        return stats
@@ -0,0 +1,168 @@
+"""
+Динамическое сжатие ответов (WSGI middleware): brotli или gzip по Accept-Encoding.
+
+- сжимаются только текстовые типы (HTML, JSON, CSS, JS, SVG, XML) с кодом 200;
+- ответы с известной длиной меньше min_size и уже сжатые (Content-Encoding,
+  например собранная статика) отдаются как есть, поток SSE не сжимается;
+- ответ с известной длиной сжимается целиком и уходит с новым Content-Length,
+  потоковый (без длины) - по частям: каждая часть приложения сжимается и
+  сбрасывается клиенту сразу (sync flush), поэтому поток не задерживается.
+
+ETag сжатого ответа становится слабым (W/"..."): байты отличаются от несжатого
+варианта, а If-None-Match сравнивается слабым сравнением.
+Модуль brotli необязателен: без него используется только gzip.
+"""
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/plain', 'text/css', 'text/javascript', 'text/xml',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+
+
+class CompressionMiddleware:
+    """Сжимает ответы WSGI-приложения; применяется как app.wsgi_app = CompressionMiddleware(app.wsgi_app)"""
+
+    def __init__(self, app, min_size=1024, gzip_level=6, brotli_quality=5):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def negotiate(self, accept_encoding):
+        """Кодировка из Accept-Encoding (brotli предпочтительнее при равном q) или None"""
+        if not accept_encoding:
+            return None
+        accept = parse_accept_header(accept_encoding)
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accept[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def __call__(self, environ, start_response):
+        encoding = self.negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return self._write
+
+        # Flask/Werkzeug вызывают start_response до выдачи тела, заголовки уже известны
+        app_iter = self.app(environ, capture)
+        status, headers, exc_info = captured
+        headers = Headers(headers)
+
+        if not self._should_compress(status, headers):
+            if status.startswith('304') and 'ETag' in headers:
+                # 304 подтверждает сохраненный клиентом сжатый вариант - ETag как у него
+                headers['ETag'] = _weak(headers['ETag'])
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return app_iter
+
+        headers['Content-Encoding'] = encoding
+        if 'ETag' in headers:
+            headers['ETag'] = _weak(headers['ETag'])
+
+        if 'Content-Length' in headers:
+            # Тело уже целиком в памяти: сжимаем одним вызовом, длина известна
+            try:
+                body = b''.join(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            compressor = self._compressor(encoding)
+            data = compressor.compress(body) + compressor.finish()
+            headers['Content-Length'] = str(len(data))
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return [data]
+
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return self._stream(app_iter, encoding)
+
+    def _should_compress(self, status, headers):
+        if not status.startswith('200') or 'Content-Encoding' in headers:
+            return False
+        mimetype = (headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        if mimetype not in COMPRESSIBLE_TYPES:
+            return False
+        # Ответ зависит от Accept-Encoding - кэши должны это учитывать
+        _add_vary(headers, 'Accept-Encoding')
+        if 'no-transform' in (headers.get('Cache-Control') or ''):
+            return False
+        length = headers.get('Content-Length')
+        return length is None or int(length) >= self.min_size
+
+    def _stream(self, app_iter, encoding):
+        compressor = self._compressor(encoding)
+        try:
+            for chunk in app_iter:
+                data = compressor.compress(chunk) + compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    def _compressor(self, encoding):
+        if encoding == 'br':
+            return _BrotliCompressor(self.brotli_quality)
+        return _GzipCompressor(self.gzip_level)
+
+    @staticmethod
+    def _write(data):
+        raise RuntimeError('CompressionMiddleware не поддерживает write() из start_response')
+
+
+class _GzipCompressor:
+    def __init__(self, level):
+        # wbits=31 - формат gzip (заголовок и контрольная сумма)
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def _weak(etag):
+    return etag if etag.startswith('W/') else f'W/{etag}'
+
+
+def _add_vary(headers, value):
+    vary = [v.strip() for v in (headers.get('Vary') or '').split(',') if v.strip()]
+    if value.lower() not in (v.lower() for v in vary) and '*' not in vary:
+        vary.append(value)
+        headers['Vary'] = ', '.join(vary)
@@ -0,0 +1,135 @@
+"""
+Настройки движка БД для SQLite и Postgres из переменных окружения.
+
+SQLite: WAL, busy_timeout и прочие PRAGMA выполняются при каждом новом соединении;
+транзакции открываются явно, чтобы запись могла начинаться с BEGIN IMMEDIATE
+(см. begin_write) - иначе читающая транзакция, которая затем пишет, получает
+"database is locked" без ожидания.
+
+Postgres: размер пула, pool_pre_ping и pool_recycle против устаревших соединений,
+таймауты подключения и запросов.
+"""
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session
+
+# Опция выполнения, с которой соединение открывает транзакцию записи (BEGIN IMMEDIATE)
+WRITE_BEGIN_OPTION = 'sqlite_begin_immediate'
+
+
+def _env_int(env, name, default):
+    value = env.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_bool(env, name, default):
+    value = env.get(name)
+    return value.lower() in ('1', 'true', 'yes', 'on') if value not in (None, '') else default
+
+
+def database_url(url):
+    """Приводит postgres:// (Heroku, docker) к postgresql://, который понимает SQLAlchemy"""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def sqlite_pragmas(env=os.environ):
+    """PRAGMA для каждого нового соединения SQLite (порядок важен: journal_mode первым)"""
+    return {
+        'journal_mode': env.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        # NORMAL в режиме WAL не теряет целостность, но не делает fsync на каждый commit
+        'synchronous': env.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': _env_int(env, 'SQLITE_BUSY_TIMEOUT', 5000),
+        # Отрицательное значение - размер в КиБ
+        'cache_size': _env_int(env, 'SQLITE_CACHE_SIZE', -20000),
+        'temp_store': env.get('SQLITE_TEMP_STORE', 'MEMORY'),
+        'mmap_size': _env_int(env, 'SQLITE_MMAP_SIZE', 128 * 1024 * 1024),
+        # Внешние ключи и ON DELETE CASCADE (миграция 0005) действуют и в SQLite; миграции
+        # выключают их на время пересоздания таблиц (migrations/env.py)
+        'foreign_keys': 'ON' if _env_bool(env, 'SQLITE_FOREIGN_KEYS', True) else 'OFF',
+    }
+
+
+def tuning_enabled(env=os.environ):
+    """DB_ENGINE_TUNING=0 отключает настройки (параметры драйвера по умолчанию, для сравнения)"""
+    return _env_bool(env, 'DB_ENGINE_TUNING', True)
+
+
+def engine_options(url, env=os.environ):
+    """SQLALCHEMY_ENGINE_OPTIONS для адреса БД"""
+    if not tuning_enabled(env):
+        return {}
+    backend = make_url(url).get_backend_name()
+
+    if backend == 'sqlite':
+        return {
+            'connect_args': {
+                # Таймаут драйвера в секундах совпадает с busy_timeout
+                'timeout': _env_int(env, 'SQLITE_BUSY_TIMEOUT', 5000) / 1000,
+            },
+        }
+
+    options = {
+        'pool_pre_ping': _env_bool(env, 'DB_POOL_PRE_PING', True),
+        'pool_recycle': _env_int(env, 'DB_POOL_RECYCLE', 1800),
+    }
+    if backend == 'postgresql':
+        options.update(
+            pool_size=_env_int(env, 'DB_POOL_SIZE', 10),
+            max_overflow=_env_int(env, 'DB_MAX_OVERFLOW', 20),
+            pool_timeout=_env_int(env, 'DB_POOL_TIMEOUT', 30),
+            # Недавно использованное соединение - вероятнее всего живое
+            pool_use_lifo=True,
+        )
+        connect_args = {
+            'connect_timeout': _env_int(env, 'DB_CONNECT_TIMEOUT', 10),
+            'application_name': env.get('DB_APPLICATION_NAME', 'web'),
+            'keepalives': 1,
+            'keepalives_idle': _env_int(env, 'DB_KEEPALIVES_IDLE', 60),
+        }
+        statement_timeout = _env_int(env, 'DB_STATEMENT_TIMEOUT', 0)
+        if statement_timeout:
+            connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+        options['connect_args'] = connect_args
+    return options
+
+
+def configure_engine(engine, env=os.environ):
+    """Подключает PRAGMA и явное управление транзакциями к движку SQLite"""
+    if engine.dialect.name != 'sqlite' or not tuning_enabled(env):
+        return
+
+    pragmas = sqlite_pragmas(env)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        # BEGIN выполняет обработчик begin ниже, а не драйвер sqlite3
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        if connection.get_execution_options().get(WRITE_BEGIN_OPTION):
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        else:
+            connection.exec_driver_sql('BEGIN')
+
+
+def begin_write(session):
+    """Открывает транзакцию записи: на SQLite блокировка записи берется сразу (BEGIN IMMEDIATE)
+    и при конкуренции ожидает busy_timeout, а не падает при первой записи.
+
+    Вызывать до первого запроса обработчика; начатая читающая транзакция завершается.
+    На других СУБД ничего не меняет.
+    """
+    if isinstance(session, scoped_session):
+        session = session()
+    if session.in_transaction():
+        session.commit()
+    session.connection(execution_options={WRITE_BEGIN_OPTION: True})
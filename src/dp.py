@@ -1,8 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
+from sqlalchemy import event, func, literal, select, String
+from sqlalchemy.orm.attributes import set_committed_value
+
 db = SQLAlchemy()
 
+# Материализованный путь комментария: id всех предков и его самого, каждый дополнен
+# нулями до PATH_SEGMENT цифр ('0000000042' + '0000000105'). Сортировка по path дает
+# обход дерева в глубину, а вся ветка - это диапазон [path, path + '~').
+PATH_SEGMENT = 10
+MAX_DEPTH = 24  # глубина корня 0; path помещается в String(250)
+
 
 class User(db.Model):
     __tablename__ = 'user'
@@ -12,8 +21,8 @@ class User(db.Model):
     avatar = db.Column(db.String(200), default='default-avatar.png', nullable=False)
     vc_id = db.Column(db.String(100), nullable=True)
     tg_id = db.Column(db.String(100), nullable=True)
-    google_id = db.Column(db.String(100), nullable=True)
-    yandex_id = db.Column(db.String(100), nullable=True)
+    google_id = db.Column(db.String(100), nullable=True, index=True)
+    yandex_id = db.Column(db.String(100), nullable=True, index=True)
     email = db.Column(db.String(120), unique=True, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -28,31 +37,191 @@ class Comment(db.Model):
     text = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     page = db.Column(db.String(50), default='comments')  # для определения страницы
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=True)  # для ответов
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    # Для ответов; удаление комментария на уровне БД удаляет всю ветку (ON DELETE CASCADE)
+    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id', name='fk_comment_parent_id_comment',
+                                                    ondelete='CASCADE'), nullable=True)
+
+    # Материализованный путь (см. PATH_SEGMENT), заполняется после INSERT.
+    # В Postgres сравнение в порядке байтов (COLLATE "C"), чтобы диапазон совпадал с ветвью
+    path = db.Column(String(250).with_variant(String(250, collation='C'), 'postgresql'),
+                     nullable=True, index=True)
+
+    # Денормализованные счетчики, обновляются вместе с лайками и ответами
+    # (пересчет после рассинхронизации: python repair_counters.py)
+    likes_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    replies_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
-    # Отношения
-    likes = db.relationship('Like', backref='comment', lazy=True, cascade='all, delete-orphan')
-    replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]), lazy=True)
+    # Отношения: ответы и лайки удаляет сама БД, ORM их при удалении не загружает
+    likes = db.relationship('Like', backref='comment', lazy=True, cascade='all, delete-orphan',
+                            passive_deletes=True)
+    replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]), lazy=True,
+                              cascade='all, delete-orphan', passive_deletes=True)
+
+    # Индексы под курсорную пагинацию: фильтр + сортировка (created_at, id)
+    __table_args__ = (
+        db.Index('ix_comment_page_parent_created', 'page', 'parent_id', 'created_at', 'id'),
+        db.Index('ix_comment_page_created', 'page', 'created_at', 'id'),
+        db.Index('ix_comment_parent_created', 'parent_id', 'created_at', 'id'),
+    )
+
+
+    @property
+    def depth(self):
+        return path_depth(self.path)
+
+    @staticmethod
+    def subtree_range(path):
+        """Условия на path для ветки с корнем path (корень включен)"""
+        return Comment.path >= path, Comment.path < path + '~'
+
+
+def path_segment(comment_id):
+    return str(comment_id).zfill(PATH_SEGMENT)
+
+
+def path_depth(path):
+    """Глубина по материализованному пути: 0 у комментария верхнего уровня"""
+    return len(path) // PATH_SEGMENT - 1 if path else 0
+
+
+@event.listens_for(Comment, 'after_insert')
+def _assign_path(mapper, connection, target):
+    """Путь нового комментария: путь родителя + собственный id (один UPDATE)"""
+    segment = path_segment(target.id)
+    if target.parent_id is None:
+        path = literal(segment)
+    else:
+        parent_path = select(Comment.path).where(Comment.id == target.parent_id).scalar_subquery()
+        path = func.coalesce(parent_path, '') + segment
+    table = Comment.__table__
+    path = connection.execute(
+        table.update().where(table.c.id == target.id).values(path=path).returning(table.c.path)
+    ).scalar()
+    # Объект получает значение из БД, не становясь "грязным"
+    set_committed_value(target, 'path', path)
 
 
 class Like(db.Model):
     __tablename__ = 'like'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    comment_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    comment_id = db.Column(db.Integer, db.ForeignKey('comment.id', name='fk_like_comment_id_comment',
+                                                     ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Уникальность: один пользователь может лайкнуть комментарий только один раз
+    # (индекс unique_like обслуживает и поиск лайков по comment_id)
     __table_args__ = (db.UniqueConstraint('comment_id', 'user_id', name='unique_like'),)
 
 
+class ChangeMarker(db.Model):
+    """Версия области данных (страница или ветка ответов) для ETag и Last-Modified"""
+    __tablename__ = 'change_marker'
+
+    scope = db.Column(db.String(100), primary_key=True)  # 'page:<page>' или 'thread:<id>'
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Для 'page:<page>' - число основных комментариев страницы (денормализованный счетчик)
+    total = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+
+def _upsert_insert():
+    """insert() с поддержкой ON CONFLICT для диалекта текущей сессии"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def bump_change_markers(*scopes):
+    """Увеличивает версии областей в текущей транзакции (INSERT ... ON CONFLICT DO UPDATE).
+
+    Все области - одним executemany; порядок постоянный, чтобы параллельные транзакции
+    блокировали строки в одном порядке.
+    """
+    scopes = sorted(set(scopes))
+    if not scopes:
+        return
+    now = datetime.utcnow()
+    stmt = _upsert_insert()(ChangeMarker).values(version=1, updated_at=now).on_conflict_do_update(
+        index_elements=['scope'],
+        set_={'version': ChangeMarker.version + 1, 'updated_at': now}
+    )
+    db.session.execute(stmt, [{'scope': scope} for scope in scopes])
+
+
+def adjust_page_totals(deltas):
+    """Меняет счетчики основных комментариев страниц ({page: +-n}) в текущей транзакции"""
+    deltas = {page: delta for page, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    insert = _upsert_insert()
+    stmt = insert(ChangeMarker).values(version=0, updated_at=datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['scope'],
+        set_={'total': ChangeMarker.total + stmt.excluded.total}
+    )
+    db.session.execute(stmt, [
+        {'scope': f'page:{page}', 'total': delta} for page, delta in sorted(deltas.items())
+    ])
+
+
+def toggle_like(comment_id, user_id):
+    """Ставит или снимает лайк в текущей транзакции без предварительных SELECT.
+
+    DELETE ... RETURNING снимает существующий лайк; если удалять нечего,
+    INSERT ... SELECT ... WHERE EXISTS ... ON CONFLICT DO NOTHING ставит новый, только
+    если комментарий есть и это не ответ (без проверки вставка нарушила бы внешний ключ),
+    а параллельный двойной клик не нарушает unique_like. Счетчик меняется только на число
+    реально измененных строк и читается тем же UPDATE ... RETURNING.
+
+    Возвращает (liked, likes_count, page) или None, если комментария нет или это ответ:
+    тогда транзакцию нужно откатить.
+    """
+    no_sync = {'synchronize_session': False}
+    deleted = db.session.execute(
+        db.delete(Like)
+        .where(Like.comment_id == comment_id, Like.user_id == user_id)
+        .returning(Like.id),
+        execution_options=no_sync
+    ).first()
+
+    if deleted is not None:
+        liked, delta = False, -1
+    else:
+        likeable = select(Comment.id).where(Comment.id == comment_id, Comment.parent_id.is_(None)).exists()
+        values = select(literal(comment_id), literal(user_id), literal(datetime.utcnow())).where(likeable)
+        inserted = db.session.execute(
+            _upsert_insert()(Like)
+            .from_select(['comment_id', 'user_id', 'created_at'], values)
+            .on_conflict_do_nothing(index_elements=['comment_id', 'user_id'])
+            .returning(Like.id)
+        ).first()
+        # Конфликт: лайк уже поставлен параллельным запросом, счетчик он и увеличил
+        liked, delta = True, 1 if inserted is not None else 0
+
+    row = db.session.execute(
+        db.update(Comment)
+        .where(Comment.id == comment_id, Comment.parent_id.is_(None))
+        .values(likes_count=Comment.likes_count + delta)
+        .returning(Comment.likes_count, Comment.page),
+        execution_options=no_sync
+    ).first()
+    if row is None:
+        return None
+    return liked, row.likes_count, row.page
+
+
 def init_db(app):
     """Инициализация базы данных"""
+    from flask_migrate import upgrade
+
     with app.app_context():
-        # Создаем все таблицы, если они не существуют
-        db.create_all()
+        # Приводим схему к последней миграции (создает таблицы в новой базе)
+        upgrade()
 
         # Создаем тестового пользователя, если нет пользователей
         if User.query.count() == 0:
@@ -0,0 +1,131 @@
+"""
+Рассылка изменений комментариев подписчикам (Server-Sent Events) внутри процесса.
+
+Обработчики записи публикуют небольшие изменения ("добавлен комментарий", "новое
+число лайков"), а поток /api/comments/<page>/stream передает их открытым вкладкам.
+
+Каждое событие получает возрастающий id. Последние события страницы хранятся в
+истории, поэтому переподключившийся клиент (заголовок Last-Event-ID) получает
+пропущенное. Если пропущенного в истории уже нет или очередь подписчика
+переполнилась, клиент получает событие reset и сам перечитывает счетчики.
+
+Подписчики видят только события своего процесса: при нескольких рабочих процессах
+для общей рассылки нужна внешняя шина (например, Redis pub/sub) с тем же интерфейсом.
+"""
+import itertools
+import json
+import threading
+import time
+from collections import deque, namedtuple
+
+Event = namedtuple('Event', ['id', 'type', 'data'])
+
+
+def format_event(event):
+    """Событие в формате text/event-stream"""
+    return f'id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data, ensure_ascii=False)}\n\n'
+
+
+class Subscription:
+    """Очередь событий одного клиента ограниченного размера"""
+
+    def __init__(self, topic, max_queue):
+        self.topic = topic
+        self.max_queue = max_queue
+        self.overflowed = False
+        self._events = deque()
+        self._condition = threading.Condition()
+
+    def push(self, event):
+        with self._condition:
+            if len(self._events) >= self.max_queue:
+                # Медленный клиент: не копим события, а просим его перечитать состояние
+                self._events.clear()
+                self.overflowed = True
+            else:
+                self._events.append(event)
+            self._condition.notify()
+
+    def get(self, timeout):
+        """Следующее событие, 'reset' после переполнения или None по таймауту"""
+        with self._condition:
+            if not self._events and not self.overflowed:
+                self._condition.wait(timeout)
+            if self.overflowed:
+                self.overflowed = False
+                return 'reset'
+            return self._events.popleft() if self._events else None
+
+
+class Broadcaster:
+    """Pub/sub по темам (страницам комментариев) с историей для возобновления"""
+
+    def __init__(self, history=500, max_queue=100):
+        self.history = history
+        self.max_queue = max_queue
+        # id начинаются с текущего времени в мс: после перезапуска не пересекаются со старыми
+        self._first_id = int(time.time() * 1000)
+        self._ids = itertools.count(self._first_id)
+        self.last_id = self._first_id - 1
+        self._history = {}   # topic -> deque событий
+        self._evicted = {}   # topic -> id последнего вытесненного из истории события
+        self._subscribers = {}  # topic -> set подписок
+        self._lock = threading.Lock()
+
+    def publish(self, topic, type, data):
+        with self._lock:
+            event = Event(next(self._ids), type, data)
+            self.last_id = event.id
+            history = self._history.setdefault(topic, deque())
+            history.append(event)
+            if len(history) > self.history:
+                self._evicted[topic] = history.popleft().id
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            subscription.push(event)
+        return event
+
+    def subscribe(self, topic, last_event_id=None, limit=None):
+        """Подписка; при last_event_id в очередь сразу попадают пропущенные события.
+
+        Если подписчиков уже limit (по всем темам), возвращает None.
+        """
+        subscription = Subscription(topic, self.max_queue)
+        with self._lock:
+            if limit is not None and self._count() >= limit:
+                return None
+            self._subscribers.setdefault(topic, set()).add(subscription)
+            if last_event_id is not None:
+                missed = self._missed(topic, last_event_id)
+                if missed is None:
+                    subscription.overflowed = True
+                else:
+                    for event in missed:
+                        subscription.push(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _missed(self, topic, last_event_id):
+        """События после last_event_id или None, если их уже не восстановить"""
+        try:
+            last_event_id = int(last_event_id)
+        except (TypeError, ValueError):
+            return None
+        if last_event_id < self._first_id - 1 or last_event_id > self.last_id:
+            # id из другого процесса или от прошлого запуска
+            return None
+        if last_event_id < self._evicted.get(topic, -1):
+            return None
+        return [event for event in self._history.get(topic, ()) if event.id > last_event_id]
@@ -0,0 +1,51 @@
+"""
+Кэш пользователей (identity map): текущий пользователь запроса и авторы комментариев.
+
+Хранятся легкие снимки (id, nickname, avatar, email), а не объекты ORM - они не
+привязаны к сессии БД и безопасно переживают запрос. Недостающие пользователи
+догружаются одним запросом на всю пачку. Снимок живет TTL секунд; при изменении
+профиля (вход через OAuth) его нужно сбросить через invalidate().
+"""
+from collections import namedtuple
+
+from .cache import MemoryCacheBackend
+from .dp import db, User
+
+CachedUser = namedtuple('CachedUser', ['id', 'nickname', 'avatar', 'email'])
+
+
+class UserIdentityCache:
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.backend = MemoryCacheBackend(max_entries=max_entries)
+
+    @staticmethod
+    def _key(user_id):
+        return f'user:{user_id}'
+
+    def get(self, user_id):
+        """Снимок пользователя или None, если такого пользователя нет"""
+        if not user_id:
+            return None
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, user_ids):
+        """{id: CachedUser} для набора id: не больше одного запроса к БД"""
+        result, missing = {}, []
+        for user_id in set(filter(None, user_ids)):
+            user = self.backend.get(self._key(user_id))
+            if user is None:
+                missing.append(user_id)
+            else:
+                result[user_id] = user
+
+        if missing:
+            rows = db.session.query(User.id, User.nickname, User.avatar, User.email).filter(User.id.in_(missing))
+            for row in rows:
+                user = CachedUser(*row)
+                self.backend.set(self._key(user.id), user, self.ttl)
+                result[user.id] = user
+        return result
+
+    def invalidate(self, user_id):
+        self.backend.delete(self._key(user_id))
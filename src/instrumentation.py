@@ -0,0 +1,269 @@
+"""
+Инструментирование запросов: число и время SQL-запросов, время рендеринга шаблонов
+и внешних HTTP-запросов в рамках одного HTTP-запроса.
+
+- заголовок Server-Timing (db, tpl, http, total) - разбивка времени видна в DevTools;
+- запросы и SQL-запросы дольше порогов пишутся в лог строками key=value;
+- гистограммы по маршрутам в формате Prometheus отдаются на /metrics.
+
+Счетчики текущего запроса лежат в g, SQL-запросы вне запроса (скрипты, потоки SSE)
+попадают только в гистограмму времени SQL. Метрики хранятся в памяти процесса:
+при нескольких рабочих процессах gunicorn каждый отдает свои.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, abort, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+
+# Границы корзин гистограмм: секунды и число SQL-запросов
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+PHASES = ('db', 'tpl', 'http')
+
+# Текст SQL в логе медленных запросов обрезается; параметры не пишутся (там бывают персональные данные)
+MAX_LOGGED_STATEMENT = 500
+
+
+def configure_logging(level=None):
+    """Уровень и формат логов приложения (логгеры пакета src, в том числе app.logger).
+
+    Обработчик вешается на логгер 'src', а не на корневой: fileConfig из alembic.ini
+    при миграциях перенастраивает корневой логгер и не должен глушить логи приложения.
+    """
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    package_logger = logging.getLogger('src')
+    if not package_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        package_logger.addHandler(handler)
+        package_logger.propagate = False
+    package_logger.setLevel(level)
+
+
+def _format_fields(fields):
+    """Строка key=value для лога; значения с пробелами и кавычками - в кавычках"""
+    parts = []
+    for key, value in fields.items():
+        if isinstance(value, float):
+            value = f'{value:.1f}'
+        value = str(value)
+        if not value or any(c in value for c in ' "='):
+            value = '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' '))
+        parts.append(f'{key}={value}')
+    return ' '.join(parts)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Гистограмма Prometheus с метками; observe потокобезопасен"""
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}  # значения меток -> [счетчики корзин, сумма, количество]
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            snapshot = sorted((labels, list(counts), total, count)
+                              for labels, (counts, total, count) in self._series.items())
+
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, counts, total, count in snapshot:
+            pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(self.labelnames, labels)]
+            prefix = ','.join(pairs + [''])
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{float(bound)}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            selector = f'{{{",".join(pairs)}}}' if pairs else ''
+            lines.append(f'{self.name}_sum{selector} {total}')
+            lines.append(f'{self.name}_count{selector} {count}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def timed_phase(phase):
+    """Время блока добавляется к фазе текущего запроса (вне запроса ничего не делает)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = g.get('_timings') if has_request_context() else None
+        if timings is not None:
+            timings[phase] += time.perf_counter() - started
+
+
+class Instrumentation:
+    """Счетчики фаз запроса, Server-Timing, лог медленных запросов и /metrics"""
+
+    def __init__(self, slow_request_ms=500, slow_query_ms=100, server_timing=True,
+                 metrics=True, metrics_token=None):
+        self.slow_request = slow_request_ms / 1000
+        self.slow_query = slow_query_ms / 1000
+        self.server_timing = server_timing
+        self.metrics = metrics
+        self.metrics_token = metrics_token
+
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Время обработки HTTP-запроса',
+            DURATION_BUCKETS, ('endpoint', 'method', 'status')
+        )
+        self.request_phase = Histogram(
+            'http_request_phase_seconds', 'Время фаз HTTP-запроса (db, tpl, http)',
+            DURATION_BUCKETS, ('endpoint', 'phase')
+        )
+        self.request_queries = Histogram(
+            'http_request_db_queries', 'Число SQL-запросов на HTTP-запрос',
+            QUERY_COUNT_BUCKETS, ('endpoint',)
+        )
+        self.query_duration = Histogram(
+            'db_query_duration_seconds', 'Время выполнения SQL-запроса', DURATION_BUCKETS
+        )
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            slow_request_ms=float(os.getenv('SLOW_REQUEST_MS', 500)),
+            slow_query_ms=float(os.getenv('SLOW_QUERY_MS', 100)),
+            server_timing=os.getenv('SERVER_TIMING', '1') == '1',
+            metrics=os.getenv('METRICS_ENABLED', '1') == '1',
+            metrics_token=os.getenv('METRICS_TOKEN') or None,
+        )
+
+    def init_app(self, app, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+
+        # Начало - раньше остальных before_request (загрузка пользователя тоже считается),
+        # конец - после остальных after_request (они выполняются в обратном порядке)
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start_request)
+        app.after_request_funcs.setdefault(None, []).insert(0, self._finish_request)
+
+        if self.metrics:
+            app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    # SQL-запросы
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['_query_started'].pop()
+        self.query_duration.observe(elapsed)
+
+        in_request = has_request_context()
+        if in_request:
+            timings = g.get('_timings')
+            if timings is not None:
+                timings['db'] += elapsed
+                timings['queries'] += 1
+
+        if elapsed >= self.slow_query:
+            logger.warning('slow_query %s', _format_fields({
+                'duration_ms': elapsed * 1000,
+                'endpoint': _endpoint_label() if in_request else '-',
+                'statement': ' '.join(statement.split())[:MAX_LOGGED_STATEMENT],
+            }))
+
+    def _handle_error(self, context):
+        # Запрос упал - after_cursor_execute не будет, снимаем его отметку времени
+        connection = context.connection
+        started = connection.info.get('_query_started') if connection is not None else None
+        if started:
+            started.pop()
+
+    # Шаблоны
+
+    def _before_render(self, sender, template, context, **extra):
+        if '_timings' in g:
+            g._template_started.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        if '_timings' in g and g._template_started:
+            g._timings['tpl'] += time.perf_counter() - g._template_started.pop()
+
+    # HTTP-запрос целиком
+
+    def _start_request(self):
+        g._request_started = time.perf_counter()
+        g._timings = {'db': 0.0, 'tpl': 0.0, 'http': 0.0, 'queries': 0}
+        g._template_started = []
+
+    def _finish_request(self, response):
+        if '_timings' not in g:
+            return response
+        total = time.perf_counter() - g._request_started
+        timings = g._timings
+        endpoint = _endpoint_label()
+
+        self.request_duration.observe(total, endpoint, request.method, str(response.status_code))
+        self.request_queries.observe(timings['queries'], endpoint)
+        for phase in PHASES:
+            if timings[phase]:
+                self.request_phase.observe(timings[phase], endpoint, phase)
+
+        if self.server_timing:
+            parts = [f'db;dur={timings["db"] * 1000:.1f};desc="{timings["queries"]} queries"']
+            parts += [f'{phase};dur={timings[phase] * 1000:.1f}' for phase in PHASES[1:] if timings[phase]]
+            parts.append(f'total;dur={total * 1000:.1f}')
+            response.headers.add('Server-Timing', ', '.join(parts))
+
+        if total >= self.slow_request:
+            logger.warning('slow_request %s', _format_fields({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': total * 1000,
+                'db_ms': timings['db'] * 1000,
+                'queries': timings['queries'],
+                'tpl_ms': timings['tpl'] * 1000,
+                'http_ms': timings['http'] * 1000,
+            }))
+        return response
+
+    def render_metrics(self):
+        histograms = (self.request_duration, self.request_phase, self.request_queries, self.query_duration)
+        return '\n'.join(histogram.render() for histogram in histograms) + '\n'
+
+    def metrics_view(self):
+        if self.metrics_token and request.headers.get('Authorization') != f'Bearer {self.metrics_token}':
+            abort(401)
+        return Response(self.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def _endpoint_label():
+    """Шаблон маршрута, а не путь: у /api/comment/<id> одна метка на все id"""
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
@@ -0,0 +1,105 @@
+"""
+Удаление комментариев множествами: ветка целиком и массовая модерация.
+
+Ветка (комментарий и ответы на любой глубине) собирается рекурсивным CTE и удаляется
+двумя запросами - лайки и комментарии - без загрузки строк в ORM. Внешние ключи
+с ON DELETE CASCADE делают то же на уровне БД (в SQLite - при PRAGMA foreign_keys=ON,
+включено по умолчанию, см. src/db_config.py); лайки и ответы удаляются явно, чтобы
+удаление было полным и с SQLITE_FOREIGN_KEYS=0.
+
+Массовое удаление (по автору, странице, дате) идет порциями: каждая порция - отдельная
+короткая транзакция записи, чтобы не держать блокировку БД долго.
+"""
+import time
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import aliased
+
+from .db_config import begin_write
+from .dp import db, Comment, Like, adjust_page_totals, bump_change_markers
+
+
+def subtree_ids(root_ids):
+    """SELECT id всех комментариев веток с корнями root_ids (включая сами корни)"""
+    # nesting: CTE внутри подзапроса, иначе SQLite не сообщает число удаленных строк
+    tree = select(Comment.id).where(Comment.id.in_(root_ids)).cte('tree', recursive=True, nesting=True)
+    child = aliased(Comment)
+    tree = tree.union(select(child.id).where(child.parent_id == tree.c.id))
+    return select(tree.c.id)
+
+
+def delete_subtrees(root_ids):
+    """Удаляет ветки в текущей транзакции и пересчитывает replies_count у родителей корней
+    и счетчики основных комментариев страниц (change_marker.total).
+
+    Возвращает (число удаленных комментариев, {id родителя: новый replies_count}).
+    """
+    root_ids = list(root_ids)
+    if not root_ids:
+        return 0, {}
+    no_sync = {'synchronize_session': False}
+    roots = db.session.execute(select(Comment.page, Comment.parent_id).where(Comment.id.in_(root_ids))).all()
+    parent_ids = {row.parent_id for row in roots if row.parent_id is not None}
+    page_deltas = {}
+    for row in roots:
+        if row.parent_id is None:
+            page_deltas[row.page] = page_deltas.get(row.page, 0) - 1
+
+    tree = subtree_ids(root_ids)
+    # Размер ветки - до удаления: ответы, которые удалил каскад ON DELETE CASCADE,
+    # в rowcount DELETE не попадают
+    deleted = db.session.scalar(select(func.count()).select_from(tree.subquery()))
+    db.session.execute(db.delete(Like).where(Like.comment_id.in_(tree)), execution_options=no_sync)
+    db.session.execute(db.delete(Comment).where(Comment.id.in_(tree)), execution_options=no_sync)
+    adjust_page_totals(page_deltas)
+
+    replies_counts = {}
+    if parent_ids:
+        # Родитель, удаленный вместе с веткой, в UPDATE уже не попадет
+        reply = aliased(Comment)
+        replies_count = select(func.count(reply.id)).where(reply.parent_id == Comment.id).scalar_subquery()
+        rows = db.session.execute(
+            update(Comment)
+            .where(Comment.id.in_(parent_ids))
+            .values(replies_count=replies_count)
+            .returning(Comment.id, Comment.replies_count),
+            execution_options=no_sync
+        )
+        replies_counts = dict(rows.all())
+    return deleted, replies_counts
+
+
+def delete_matching(criteria, batch_size=500, pause=0.0):
+    """Удаляет комментарии, подходящие под условия, вместе с ветками - порциями.
+
+    Каждая порция - не больше batch_size корней в отдельной транзакции записи; между
+    порциями пауза pause секунд, чтобы дать пройти запросам сайта. Генератор отдает
+    число комментариев, удаленных каждой порцией.
+    """
+    while True:
+        begin_write(db.session)
+        roots = db.session.execute(
+            select(Comment.id, Comment.page, Comment.parent_id)
+            .where(*criteria)
+            .order_by(Comment.id)
+            .limit(batch_size)
+        ).all()
+        if not roots:
+            db.session.rollback()
+            return
+
+        deleted, _ = delete_subtrees([row.id for row in roots])
+        # Версии для ETag: страницы и ветки, из которых ушли комментарии
+        scopes = {f'page:{row.page}' for row in roots}
+        scopes.update(f'thread:{row.parent_id}' for row in roots if row.parent_id is not None)
+        bump_change_markers(*sorted(scopes))
+        db.session.commit()
+        yield deleted
+
+        if pause:
+            time.sleep(pause)
+
+
+def count_matching(criteria):
+    """Сколько комментариев (без учета ответов на них) подходит под условия"""
+    return db.session.scalar(select(func.count(Comment.id)).where(*criteria))
@@ -0,0 +1,153 @@
+"""
+HTTP-клиент для запросов к OAuth-провайдерам (обмен кода на токен, данные пользователя).
+
+У каждого провайдера свой пул keep-alive соединений, таймауты подключения и чтения,
+ограниченные повторы с экспоненциальной задержкой и предохранитель (circuit breaker):
+после нескольких сбоев подряд запросы к провайдеру сразу завершаются ошибкой,
+пока не пройдет пауза, и только затем пробуется один запрос.
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .instrumentation import timed_phase
+
+# Ответы, при которых запрос считается сбоем провайдера
+FAILURE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.RequestException):
+    """Провайдер недоступен: предохранитель разомкнут, запрос не выполнялся"""
+
+
+class CircuitBreaker:
+    """Предохранитель: closed -> open после failure_threshold сбоев подряд,
+    open -> half-open через reset_timeout секунд (пропускается один пробный запрос)."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """Можно ли выполнять запрос сейчас"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                # Неудачная проба снова размыкает предохранитель на reset_timeout
+                self.opened_at = time.monotonic()
+
+
+class OAuthClient:
+    """Клиент одного провайдера: общий Session с пулом соединений, таймауты, повторы и предохранитель"""
+
+    def __init__(self, name, connect_timeout=3, read_timeout=10, retries=2, backoff=0.3,
+                 pool_size=10, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._retries = retries
+        self._backoff = backoff
+        self._pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name):
+        """Настройки из OAUTH_* (общие) и OAUTH_<NAME>_* (для провайдера)"""
+        def setting(key, default, cast):
+            value = os.getenv(f'OAUTH_{name.upper()}_{key}', os.getenv(f'OAUTH_{key}'))
+            return cast(value) if value not in (None, '') else default
+
+        return cls(
+            name,
+            connect_timeout=setting('CONNECT_TIMEOUT', 3, float),
+            read_timeout=setting('READ_TIMEOUT', 10, float),
+            retries=setting('RETRIES', 2, int),
+            backoff=setting('BACKOFF', 0.3, float),
+            pool_size=setting('POOL_SIZE', 10, int),
+            failure_threshold=setting('BREAKER_THRESHOLD', 5, int),
+            reset_timeout=setting('BREAKER_RESET', 30, float),
+        )
+
+    @property
+    def session(self):
+        # Создается при первом запросе - уже в рабочем процессе, а не до fork
+        with self._lock:
+            if self._session is None:
+                retry = Retry(
+                    total=self._retries,
+                    # Повтор чтения и статуса только для GET: POST с кодом авторизации
+                    # повторяется лишь если запрос не ушел (ошибка подключения)
+                    allowed_methods=frozenset({'GET'}),
+                    status_forcelist=FAILURE_STATUSES,
+                    backoff_factor=self._backoff,
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+            return self._session
+
+    def request(self, method, url, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f'{self.name}: провайдер временно недоступен')
+
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            with timed_phase('http'):
+                response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+
+        if response.status_code in FAILURE_STATUSES:
+            self.breaker.record_failure()
+        else:
+            # 4xx (неверный код, истекший токен) - ошибка запроса, а не провайдера
+            self.breaker.record_success()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        return {'state': self.breaker.state, 'failures': self.breaker.failures}
@@ -0,0 +1,176 @@
+"""
+Ограничение частоты записей (комментарии, ответы, лайки) по пользователю и по IP.
+
+Лимит - "N/период" (например, '5/minute'): не больше N запросов за любое окно длиной
+в период, как корзина из N жетонов, которая равномерно наполняется за период.
+У маршрута может быть несколько лимитов (на пользователя и на IP); запрос принимается,
+только если укладывается во все, и тогда учитывается во всех сразу. Отклоненные
+запросы не учитываются, поэтому Retry-After точен.
+
+Отклоненный запрос получает 429 с заголовком Retry-After до обращения к БД, так что
+поток записей от одного скрипта не блокирует базу для остальных.
+
+Хранилище подключаемое: по умолчанию счетчики живут в памяти процесса
+(MemoryRateLimitBackend, скользящее окно из двух счетчиков) и у каждого рабочего
+процесса свои; для общего лимита реализуйте RateLimitBackend поверх общего хранилища.
+"""
+import math
+import os
+import threading
+import time
+
+from flask import g, request
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(spec):
+    """'5/minute', '100/hours', '10/30s' (секунд) -> (5, 60.0); пустая строка или 0 - без лимита (None)"""
+    spec = (spec or '').strip()
+    if not spec or spec == '0':
+        return None
+    count, _, period = spec.partition('/')
+    period = (period.strip() or 'second').rstrip('s')
+    seconds = PERIODS.get(period) or float(period)
+    if int(count) <= 0:
+        return None
+    return int(count), float(seconds)
+
+
+class RateLimitBackend:
+    """Интерфейс хранилища счетчиков"""
+
+    def hit(self, checks):
+        """Учитывает запрос во всех лимитах сразу, если он укладывается в каждый.
+
+        checks - список (ключ, число запросов, период в секундах). Возвращает 0, если
+        запрос принят, иначе через сколько секунд его можно повторить.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Скользящее окно в памяти процесса: счетчики текущего и предыдущего окна на ключ.
+
+    Оценка числа запросов за последний период - счетчик текущего окна плюс доля
+    предыдущего, пропорциональная непрошедшей части текущего.
+    """
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        # ключ -> [начало текущего окна, запросов в нем, запросов в предыдущем, период]
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._rejected = 0
+
+    def hit(self, checks):
+        now = self.clock()
+        with self._lock:
+            self._hits += 1
+            if len(self._windows) > self.max_keys or self._hits % 1000 == 0:
+                self._sweep(now)
+
+            windows, retry_after = [], 0
+            for key, count, period in checks:
+                window = self._current(key, period, now)
+                windows.append(window)
+                start, current, previous, _ = window
+                if previous * (1 - (now - start) / period) + current + 1 > count:
+                    retry_after = max(retry_after, _retry_after(window, count, now))
+
+            if retry_after:
+                self._rejected += 1
+                return retry_after
+            for window in windows:
+                window[1] += 1
+            return 0
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._windows), 'hits': self._hits, 'rejected': self._rejected}
+
+    def _current(self, key, period, now):
+        start = now - now % period
+        window = self._windows.get(key)
+        if window is None or window[3] != period:
+            window = self._windows[key] = [start, 0, 0, period]
+        elif window[0] != start:
+            # Прошло одно окно - текущее становится предыдущим, больше - оба пусты
+            previous = window[1] if start - window[0] == period else 0
+            window[:] = [start, 0, previous, period]
+        return window
+
+    def _sweep(self, now):
+        # Ключ без запросов дольше двух окон ничего не ограничивает
+        stale = [key for key, (start, _, _, period) in self._windows.items() if now - start >= 2 * period]
+        for key in stale:
+            del self._windows[key]
+
+
+def _retry_after(window, count, now):
+    """Целые секунды, через которые оценка окна опустится ниже лимита"""
+    start, current, previous, period = window
+    if current + 1 <= count and previous:
+        # Достаточно, чтобы уменьшилась доля предыдущего окна
+        wait = start + period * (1 - (count - 1 - current) / previous) - now
+    else:
+        # Нужно следующее окно, в котором текущее станет предыдущим
+        wait = start + period - now + period * max(0.0, 1 - (count - 1) / current)
+    return max(1, math.ceil(wait))
+
+
+class RateLimiter:
+    """Лимиты маршрутов записи: правила по имени, ключи - id пользователя и IP клиента"""
+
+    def __init__(self, backend=None, rules=None, enabled=True, trusted_proxies=0):
+        self.backend = backend or MemoryRateLimitBackend()
+        # имя -> {'user': (N, период) или None, 'ip': (N, период) или None}
+        self.rules = rules or {}
+        self.enabled = enabled
+        self.trusted_proxies = trusted_proxies
+
+    @classmethod
+    def from_env(cls, defaults):
+        """defaults: {имя: {'user': '5/minute', 'ip': '20/minute'}}; переопределяются
+        переменными RATE_LIMIT_<ИМЯ>_USER и RATE_LIMIT_<ИМЯ>_IP"""
+        rules = {
+            name: {scope: parse_limit(os.getenv(f'RATE_LIMIT_{name.upper()}_{scope.upper()}', spec))
+                   for scope, spec in scopes.items()}
+            for name, scopes in defaults.items()
+        }
+        return cls(
+            backend=MemoryRateLimitBackend(max_keys=int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))),
+            rules=rules,
+            enabled=os.getenv('RATE_LIMIT_ENABLED', '1') == '1',
+            trusted_proxies=int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', 0)),
+        )
+
+    def client_ip(self):
+        """IP клиента; за trusted_proxies обратными прокси - из X-Forwarded-For"""
+        if self.trusted_proxies:
+            forwarded = [a.strip() for a in request.headers.get('X-Forwarded-For', '').split(',') if a.strip()]
+            if len(forwarded) >= self.trusted_proxies:
+                return forwarded[-self.trusted_proxies]
+        return request.remote_addr or '-'
+
+    def check(self, name):
+        """0, если запрос текущего клиента по правилу name принят, иначе секунды до повтора"""
+        if not self.enabled:
+            return 0
+        rule = self.rules.get(name, {})
+        user = g.get('user')
+        identities = {'user': user.id if user is not None else None, 'ip': self.client_ip()}
+        checks = [
+            (f'{name}:{scope}:{identities[scope]}', limit[0], limit[1])
+            for scope, limit in rule.items()
+            if limit is not None and identities.get(scope) is not None
+        ]
+        return self.backend.hit(checks) if checks else 0
+
+    def stats(self):
+        return self.backend.stats()
@@ -0,0 +1,110 @@
+"""
+Полнотекстовый поиск по комментариям (индекс создает миграция 0007_comment_search).
+
+SQLite - FTS5 (comment_fts, ранжирование bm25), Postgres - tsvector с GIN-индексом
+(ранжирование ts_rank_cd). Запрос пользователя разбирается на слова, каждое ищется
+как префикс, все слова обязательны - синтаксис FTS из ввода не передается в БД.
+
+Результаты упорядочены по (score, id) по убыванию, курсор - последняя пара. Фрагмент
+текста с совпадениями приходит с маркерами, которые после экранирования текста
+заменяются на <mark>.
+"""
+import base64
+import binascii
+import re
+
+from markupsafe import escape
+from sqlalchemy import text
+
+from .dp import db
+
+MAX_QUERY_TERMS = 8
+SNIPPET_WORDS = 32
+
+# Маркеры совпадений внутри фрагмента: управляющие символы, которых нет в тексте
+MARK_START, MARK_END = '\x02', '\x03'
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_SEARCH = f"""
+    SELECT comment.id AS id,
+           -bm25(comment_fts) AS score,
+           snippet(comment_fts, 0, :mark_start, :mark_end, '…', {SNIPPET_WORDS}) AS snippet
+    FROM comment_fts JOIN comment ON comment.id = comment_fts.rowid
+    WHERE comment_fts MATCH :query {{filters}}
+    ORDER BY score DESC, comment.id DESC
+    LIMIT :limit
+"""
+
+POSTGRES_SEARCH = f"""
+    SELECT id, score, ts_headline('russian', text, query,
+               'StartSel=' || :mark_start || ', StopSel=' || :mark_end ||
+               ', MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}') AS snippet
+    FROM (
+        SELECT comment.id AS id, comment.text AS text, query,
+               ts_rank_cd(comment.search_vector, query) AS score
+        FROM comment, to_tsquery('russian', :query) AS query
+        WHERE comment.search_vector @@ query {{filters}}
+    ) AS matches
+    WHERE TRUE {{score_filter}}
+    ORDER BY score DESC, id DESC
+    LIMIT :limit
+"""
+
+
+def query_terms(q):
+    """Слова поискового запроса (не больше MAX_QUERY_TERMS)"""
+    return _TERM_RE.findall(q or '')[:MAX_QUERY_TERMS]
+
+
+def encode_cursor(score, comment_id):
+    raw = f"{score!r}|{comment_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(score, id) из encode_cursor; ValueError для испорченного курсора"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        score, comment_id = raw.rsplit('|', 1)
+        return float(score), int(comment_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+
+
+def highlight(snippet):
+    """Фрагмент с маркерами -> безопасный HTML с <mark>"""
+    html = str(escape(snippet))
+    return html.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search_comments(terms, page=None, cursor=None, limit=20):
+    """Страница результатов: ([(id, score, snippet_html)], курсор следующей страницы или None)"""
+    params = {'mark_start': MARK_START, 'mark_end': MARK_END, 'limit': limit + 1}
+    filters = []
+    if page:
+        filters.append('comment.page = :page')
+        params['page'] = page
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        params['query'] = ' & '.join(f'{term}:*' for term in terms)
+        score_filter = ''
+        if cursor:
+            score_filter = 'AND (score < :score OR (score = :score AND id < :after_id))'
+            params['score'], params['after_id'] = cursor
+        sql = POSTGRES_SEARCH.format(filters=''.join(f' AND {f}' for f in filters), score_filter=score_filter)
+    else:
+        # Каждое слово в кавычках: операторы FTS5 из ввода не интерпретируются
+        params['query'] = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        if cursor:
+            filters.append('(-bm25(comment_fts) < :score OR '
+                           '(-bm25(comment_fts) = :score AND comment.id < :after_id))')
+            params['score'], params['after_id'] = cursor
+        sql = SQLITE_SEARCH.format(filters=''.join(f' AND {f}' for f in filters))
+
+    rows = db.session.execute(text(sql), params).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].id)
+    return [(row.id, row.score, highlight(row.snippet)) for row in rows], next_cursor
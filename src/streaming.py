@@ -0,0 +1,61 @@
+"""
+Потоковая выдача JSON: ответ кодируется по мере чтения строк из БД (yield_per)
+и уходит частями (chunked), а не собирается целиком в памяти. Память ответа не
+зависит от числа строк, первые байты клиент получает сразу после первой порции.
+
+Заголовки отправляются до тела, поэтому все, что влияет на статус и заголовки
+(404, 400), проверяется до начала выдачи.
+"""
+import json
+
+# Части ответа склеиваются в порции примерно такого размера (байт)
+CHUNK_SIZE = 16 * 1024
+
+
+# Один кодировщик на все вызовы: json.dumps с параметрами создает новый на каждый
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def dumps(value):
+    """Компактный JSON одного значения"""
+    return _encoder.encode(value)
+
+
+def chunked(parts, chunk_size=CHUNK_SIZE):
+    """Склеивает мелкие строковые части в порции байтов не меньше chunk_size"""
+    buffer, size = [], 0
+    for part in parts:
+        data = part.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def json_tree(nodes, children_key='replies'):
+    """Вложенный JSON-объект из узлов в порядке обхода дерева в глубину.
+
+    nodes - пары (глубина, словарь узла), глубина корня 0, у каждого следующего узла
+    глубина не больше чем на единицу больше предыдущего. Дети узла пишутся в его поле
+    children_key по мере поступления: в памяти только путь от корня до текущего узла.
+    """
+    # Для каждого открытого узла на пути от корня: есть ли у него уже дети
+    open_nodes = []
+    for depth, node in nodes:
+        while len(open_nodes) > depth:
+            open_nodes.pop()
+            yield ']}'
+        prefix = ''
+        if open_nodes:
+            prefix = ',' if open_nodes[-1] else ''
+            open_nodes[-1] = True
+        # Поле детей дописывается последним, массив закрывается вместе с узлом
+        body = dumps(node)
+        yield f'{prefix}{body[:-1]}{"," if len(body) > 2 else ""}"{children_key}":['
+        open_nodes.append(False)
+    while open_nodes:
+        open_nodes.pop()
+        yield ']}'
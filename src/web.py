@@ -1,12 +1,20 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from flask import Blueprint, Flask, Response, current_app, render_template, request, redirect, url_for, session, flash, jsonify, abort, send_file, g, stream_with_context
+from flask_migrate import Migrate
+from sqlalchemy import and_, or_, exists, literal
+from datetime import datetime, timezone
 from functools import wraps
 import os
-import sys
+import base64
+import binascii
+import hashlib
+import time
 import requests
 from urllib.parse import urlencode, urlparse
 from dotenv import load_dotenv
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.local import LocalProxy
+
+from .db_config import begin_write, configure_engine, database_url, engine_options
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -14,167 +22,578 @@ load_dotenv()
 # Получаем путь к директории проекта
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-app = Flask(
-    __name__,
-    template_folder=os.path.join(project_root, 'templates'),
-    static_folder=os.path.join(project_root, 'static')
-)
 
-# Конфигурация
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', f'sqlite:///{os.path.join(project_root, "site.db")}')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Конфигурация Яндекс OAuth
-YANDEX_CLIENT_ID = os.getenv('YANDEX_CLIENT_ID')
-YANDEX_CLIENT_SECRET = os.getenv('YANDEX_CLIENT_SECRET')
-YANDEX_REDIRECT_URI = os.getenv('YANDEX_REDIRECT_URI', 'http://localhost:5000/auth/yandex/callback')
-YANDEX_OAUTH_AUTHORIZE_URL = 'https://oauth.yandex.com/authorize'
-YANDEX_OAUTH_TOKEN_URL = 'https://oauth.yandex.com/token'
-YANDEX_USER_INFO_URL = 'https://login.yandex.ru/info'
-
-# Конфигурация Google OAuth
-GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
-GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
-GOOGLE_REDIRECT_URI = os.getenv('GOOGLE_REDIRECT_URI', 'http://localhost:5000/auth/google/callback')
-GOOGLE_OAUTH_AUTHORIZE_URL = 'https://accounts.google.com/o/oauth2/v2/auth'
-GOOGLE_OAUTH_TOKEN_URL = 'https://oauth2.googleapis.com/token'
-GOOGLE_USER_INFO_URL = 'https://openidconnect.googleapis.com/v1/userinfo'
-
-# Дебаг вывод конфигурации
-print("[DEBUG] Google OAuth Configuration:")
-print(f"  - CLIENT_ID: {GOOGLE_CLIENT_ID[:30]}..." if GOOGLE_CLIENT_ID else "  - CLIENT_ID: Not set")
-print(f"  - CLIENT_SECRET: {GOOGLE_CLIENT_SECRET[:10]}..." if GOOGLE_CLIENT_SECRET else "  - CLIENT_SECRET: Not set")
-print(f"  - REDIRECT_URI: {GOOGLE_REDIRECT_URI}")
+def default_config():
+    """Настройки приложения из переменных окружения (create_app(config) их переопределяет)"""
+    return {
+        'SECRET_KEY': os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production'),
+        'SQLALCHEMY_DATABASE_URI': database_url(
+            os.getenv('DATABASE_URL', f'sqlite:///{os.path.join(project_root, "site.db")}')
+        ),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Кэш скомпилированных шаблонов Jinja между перезапусками
+        'JINJA_BYTECODE_CACHE_DIR': os.getenv('JINJA_BYTECODE_CACHE_DIR', os.path.join(project_root, 'cache', 'jinja')),
+
+        # Яндекс OAuth
+        'YANDEX_CLIENT_ID': os.getenv('YANDEX_CLIENT_ID'),
+        'YANDEX_CLIENT_SECRET': os.getenv('YANDEX_CLIENT_SECRET'),
+        'YANDEX_REDIRECT_URI': os.getenv('YANDEX_REDIRECT_URI', 'http://localhost:5000/auth/yandex/callback'),
+        'YANDEX_OAUTH_AUTHORIZE_URL': os.getenv('YANDEX_OAUTH_AUTHORIZE_URL', 'https://oauth.yandex.com/authorize'),
+        'YANDEX_OAUTH_TOKEN_URL': os.getenv('YANDEX_OAUTH_TOKEN_URL', 'https://oauth.yandex.com/token'),
+        'YANDEX_USER_INFO_URL': os.getenv('YANDEX_USER_INFO_URL', 'https://login.yandex.ru/info'),
+
+        # Google OAuth
+        'GOOGLE_CLIENT_ID': os.getenv('GOOGLE_CLIENT_ID'),
+        'GOOGLE_CLIENT_SECRET': os.getenv('GOOGLE_CLIENT_SECRET'),
+        'GOOGLE_REDIRECT_URI': os.getenv('GOOGLE_REDIRECT_URI', 'http://localhost:5000/auth/google/callback'),
+        'GOOGLE_OAUTH_AUTHORIZE_URL': os.getenv('GOOGLE_OAUTH_AUTHORIZE_URL', 'https://accounts.google.com/o/oauth2/v2/auth'),
+        'GOOGLE_OAUTH_TOKEN_URL': os.getenv('GOOGLE_OAUTH_TOKEN_URL', 'https://oauth2.googleapis.com/token'),
+        'GOOGLE_USER_INFO_URL': os.getenv('GOOGLE_USER_INFO_URL', 'https://openidconnect.googleapis.com/v1/userinfo'),
+
+        # Размер страницы для курсорной пагинации комментариев
+        'COMMENTS_PAGE_SIZE': int(os.getenv('COMMENTS_PAGE_SIZE', 20)),
+        'COMMENTS_MAX_PAGE_SIZE': int(os.getenv('COMMENTS_MAX_PAGE_SIZE', 100)),
+        # Сколько комментариев ветки отдает /api/comment/<id>/thread за один ответ
+        'THREAD_MAX_NODES': int(os.getenv('THREAD_MAX_NODES', 1000)),
+        # Ветка отдается потоком (src/streaming.py): строк из БД за раз; STREAM_JSON=0 - целиком
+        'STREAM_JSON': os.getenv('STREAM_JSON', '1') == '1',
+        'STREAM_BATCH_SIZE': int(os.getenv('STREAM_BATCH_SIZE', 500)),
+
+        'FRAGMENT_CACHE_TTL': int(os.getenv('FRAGMENT_CACHE_TTL', 3600)),
+        'SSE_HEARTBEAT': int(os.getenv('SSE_HEARTBEAT', 15)),
+        'SSE_MAX_DURATION': int(os.getenv('SSE_MAX_DURATION', 300)),
+        # Каждый поток SSE держит поток сервера: предел подписчиков считается от WEB_THREADS
+        # (потоков gthread в процессе) за вычетом запаса под обычные запросы
+        'WEB_THREADS': int(os.getenv('WEB_THREADS', 0)),
+        'SSE_RESERVED_THREADS': int(os.getenv('SSE_RESERVED_THREADS', 8)),
+        'SSE_MAX_SUBSCRIBERS': int(os.environ['SSE_MAX_SUBSCRIBERS']) if os.getenv('SSE_MAX_SUBSCRIBERS') else None,
+    }
+
+
+def sse_subscriber_limit(config):
+    """Сколько потоков SSE может держать процесс.
+
+    При известном числе потоков сервера (WEB_THREADS) - не больше, чем потоков за вычетом
+    SSE_RESERVED_THREADS: иначе открытые вкладки займут все потоки, и обычные запросы
+    встанут в очередь. SSE_MAX_SUBSCRIBERS может только уменьшить этот предел. Без
+    WEB_THREADS (сервер разработки, поток на запрос) - SSE_MAX_SUBSCRIBERS или 100.
+    """
+    limit = config['SSE_MAX_SUBSCRIBERS']
+    if config['WEB_THREADS']:
+        headroom = max(0, config['WEB_THREADS'] - config['SSE_RESERVED_THREADS'])
+        return headroom if limit is None else min(limit, headroom)
+    return 100 if limit is None else limit
+
+
+def print_config(app):
+    """Конфигурация OAuth в лог (уровень DEBUG); секреты не выводятся, только задан ли он"""
+    for provider in ('yandex', 'google'):
+        prefix = provider.upper()
+        app.logger.debug(
+            "oauth_config provider=%s client_id=%s client_secret=%s redirect_uri=%s", provider,
+            'set' if app.config[f'{prefix}_CLIENT_ID'] else 'not_set',
+            'set' if app.config[f'{prefix}_CLIENT_SECRET'] else 'not_set',
+            app.config[f'{prefix}_REDIRECT_URI']
+        )
+
 
 # Инициализация БД
-from .dp import db, User, Comment, Like
+from .dp import (
+    db, User, Comment, Like, ChangeMarker, MAX_DEPTH, adjust_page_totals, bump_change_markers, toggle_like
+)
+from .cache import VersionedCache, MemoryCacheBackend
+from .assets import init_assets, IMMUTABLE_CACHE_CONTROL
+from .avatars import AvatarCache, AVATAR_MIMETYPE, avatar_version, is_remote
+from .oauth_client import OAuthClient, CircuitOpenError
+from .identity import UserIdentityCache
+from .events import Broadcaster, format_event
+from .moderation import delete_subtrees
+from .search import decode_cursor, query_terms, search_comments
+from .instrumentation import Instrumentation, configure_logging, timed_phase
+from .streaming import chunked, dumps, json_tree
+from .compression import CompressionMiddleware
+from .ratelimit import RateLimiter
+
+# Маршруты сайта; регистрируются в приложении в create_app
+bp = Blueprint('main', __name__)
+
+# render_as_batch нужен SQLite для ALTER TABLE в миграциях
+migrate = Migrate(directory=os.path.join(project_root, 'migrations'), render_as_batch=True)
+
+
+class Services:
+    """Состояние приложения в памяти процесса: кэши, рассылка SSE, HTTP-клиенты, лимиты.
+
+    Создается в create_app для каждого приложения и хранится в app.extensions['site'];
+    маршруты обращаются к нему через прокси ниже (comments_cache, broadcaster, ...).
+    """
 
-db.init_app(app)
+    def __init__(self):
+        # Кэш JSON-списков комментариев и ответов
+        self.comments_cache = VersionedCache(
+            MemoryCacheBackend(
+                max_entries=int(os.getenv('COMMENTS_CACHE_MAX_ENTRIES', 10000)),
+                max_bytes=int(os.getenv('COMMENTS_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+            ),
+            ttl=int(os.getenv('COMMENTS_CACHE_TTL', 60))
+        )
 
-# Инициализация базы данных при запуске
-with app.app_context():
-    # Создаем все таблицы
-    db.create_all()
+        # HTML-фрагменты карточек комментариев (автор, дата, текст) для страницы /comments
+        self.fragment_cache = MemoryCacheBackend(
+            max_entries=int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 20000)),
+            max_bytes=int(os.getenv('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+        )
 
-    # Создаем тестового пользователя, если нет пользователей
-    if User.query.count() == 0:
-        print("[INFO] Создаем тестового пользователя...")
-        test_user = User(
-            nickname='TestUser',
-            email='test@example.com',
-            avatar='default-avatar.png'
+        # Снимки пользователей (текущий пользователь, авторы комментариев)
+        self.identity_cache = UserIdentityCache(ttl=int(os.getenv('USER_CACHE_TTL', 60)))
+
+        # Рассылка изменений комментариев открытым вкладкам (SSE)
+        self.broadcaster = Broadcaster(
+            history=int(os.getenv('SSE_HISTORY', 500)),
+            max_queue=int(os.getenv('SSE_MAX_QUEUE', 100))
         )
-        db.session.add(test_user)
-        db.session.commit()
-        print("[INFO] Тестовый пользователь создан")
+
+        # HTTP-клиенты OAuth-провайдеров: пул соединений, таймауты, повторы, предохранитель
+        self.yandex_oauth = OAuthClient.from_env('yandex')
+        self.google_oauth = OAuthClient.from_env('google')
+
+        # Дисковый кэш аватаров из Яндекса/Google (отдаются через /avatar/<user_id>)
+        self.avatar_cache = AvatarCache(
+            os.getenv('AVATAR_CACHE_DIR', os.path.join(project_root, 'cache', 'avatars')),
+            max_bytes=int(os.getenv('AVATAR_CACHE_MAX_BYTES', 50 * 1024 * 1024)),
+            size=int(os.getenv('AVATAR_SIZE', 96)),
+            timeout=float(os.getenv('AVATAR_FETCH_TIMEOUT', 5))
+        )
+
+        # Лимиты записей на пользователя и на IP (src/ratelimit.py)
+        self.rate_limiter = RateLimiter.from_env({
+            'comment': {'user': '5/minute', 'ip': '20/minute'},
+            'reply': {'user': '10/minute', 'ip': '30/minute'},
+            'like': {'user': '60/minute', 'ip': '120/minute'},
+        })
+
+        # Server-Timing, лог медленных запросов и /metrics (src/instrumentation.py)
+        self.instrumentation = Instrumentation.from_env()
+
+
+def _service(name):
+    """Прокси к объекту Services текущего приложения"""
+    return LocalProxy(lambda: getattr(current_app.extensions['site'], name))
+
+
+comments_cache = _service('comments_cache')
+fragment_cache = _service('fragment_cache')
+identity_cache = _service('identity_cache')
+broadcaster = _service('broadcaster')
+yandex_oauth = _service('yandex_oauth')
+google_oauth = _service('google_oauth')
+avatar_cache = _service('avatar_cache')
+rate_limiter = _service('rate_limiter')
+
+
+def create_app(config=None):
+    """Создает приложение: настройки, БД, миграции, собранная статика, маршруты.
+
+    config переопределяет настройки из окружения (default_config). Каждый вызов дает
+    новое приложение со своими кэшами и движком БД. К базе не обращается: схема
+    приводится к последней миграции отдельным шагом (init_db из src/dp.py или
+    python init_db.py) один раз до запуска рабочих процессов.
+    """
+    app = Flask(
+        __name__,
+        template_folder=os.path.join(project_root, 'templates'),
+        static_folder=os.path.join(project_root, 'static')
+    )
+    app.config.update(default_config())
+    if config:
+        app.config.update(config)
+    app.config['SSE_MAX_SUBSCRIBERS'] = sse_subscriber_limit(app.config)
+
+    configure_logging()
+
+    # Собранные статические файлы (build_assets.py)
+    init_assets(app)
+
+    # Условные GET-запросы: ETag/Last-Modified по версии области данных. Версии шаблонов
+    # и сборки статики входят в ETag, чтобы после выкладки HTML не считался неизменным.
+    app.config['TEMPLATES_VERSION'] = int(max(
+        (os.path.getmtime(os.path.join(root, name))
+         for root, _, files in os.walk(app.template_folder) for name in files),
+        default=0
+    ))
+
+    services = app.extensions['site'] = Services()
+
+    # Пул и PRAGMA по типу БД (src/db_config.py)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine)
+        # До маршрутов: хуки замера должны идти раньше остальных
+        services.instrumentation.init_app(app, db.engine)
+    migrate.init_app(app, db)
+
+    app.register_blueprint(bp)
+
+    bytecode_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if bytecode_dir:
+        os.makedirs(bytecode_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+
+    # Сжатие HTML и JSON на лету (brotli/gzip); за прокси, который сжимает сам, - COMPRESSION=0
+    if os.getenv('COMPRESSION', '1') == '1':
+        app.wsgi_app = CompressionMiddleware(
+            app.wsgi_app,
+            min_size=int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),
+            gzip_level=int(os.getenv('COMPRESSION_GZIP_LEVEL', 6)),
+            brotli_quality=int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+        )
+    return app
+
+
+def warm_templates(app):
+    """Компилирует все шаблоны заранее, чтобы первый запрос не платил за это"""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_pool(app, connections):
+    """Открывает соединения пула и проверяет их до приема запросов"""
+    with app.app_context():
+        pool_size = getattr(db.engine.pool, 'size', lambda: connections)()
+        opened = [db.engine.connect() for _ in range(min(connections, pool_size))]
+        for connection in opened:
+            connection.exec_driver_sql('SELECT 1')
+            connection.close()
+        return len(opened)
+
+
+@bp.app_template_global()
+def avatar_url(user_id, avatar):
+    """Адрес аватара через локальный прокси; v меняется вместе с аватаром, поэтому ответ кэшируется надолго.
+
+    В пределах запроса адрес запоминается: у длинной ветки много комментариев одних авторов.
+    """
+    urls = g.setdefault('avatar_urls', {})
+    url = urls.get((user_id, avatar))
+    if url is None:
+        url = urls[(user_id, avatar)] = url_for('main.avatar', user_id=user_id or 0, v=avatar_version(avatar))
+    return url
+
+
+def _change_marker(scope):
+    """Строка change_marker области или None; читается один раз за запрос (ETag, ключ кэша
+    и счетчик страницы берут ее из g - в том числе отсутствие строки)"""
+    markers = g.setdefault('change_markers', {})
+    if scope not in markers:
+        markers[scope] = db.session.get(ChangeMarker, scope)
+    return markers[scope]
+
+
+def _scope_marker(scope):
+    """(версия, время изменения) области из change_marker; (0, None), если она не менялась"""
+    marker = _change_marker(scope)
+    return (marker.version, marker.updated_at) if marker else (0, None)
+
+
+def _page_total(page):
+    """Число основных комментариев страницы - денормализованный счетчик change_marker.total
+    (строка уже прочитана для ETag, COUNT по странице не нужен)"""
+    marker = _change_marker(f'page:{page}')
+    return marker.total if marker else 0
+
+
+def _validators(scope):
+    """ETag и Last-Modified для области с учетом зрителя и параметров запроса"""
+    config = current_app.config
+    version, updated_at = _scope_marker(scope)
+    basis = (
+        f"{config['TEMPLATES_VERSION']}:{config['ASSETS_VERSION']}:{scope}:{version}:"
+        f"{session.get('user_id')}:{session.get('user_avatar')}:{request.query_string.decode()}"
+    )
+    return hashlib.sha1(basis.encode()).hexdigest(), updated_at
+
+
+def _not_modified(etag, last_modified):
+    """Совпадают ли валидаторы клиента с текущими (If-None-Match имеет приоритет)"""
+    if request.if_none_match:
+        # Слабое сравнение (RFC 7232): у сжатого ответа ETag слабый (src/compression.py)
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    return False
+
+
+def conditional(scope_for):
+    """Отвечает 304 до выполнения view, если данные области не менялись.
+
+    scope_for получает аргументы маршрута и возвращает область ('page:<page>', 'thread:<id>').
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag, last_modified = _validators(scope_for(**kwargs))
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+            # Ответ зависит от пользователя и должен перепроверяться при каждом обращении
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
+@bp.before_app_request
+def load_current_user():
+    """Текущий пользователь загружается один раз за запрос (из кэша пользователей)"""
+    if request.endpoint in ('static', 'assets'):
+        return
+    g.user = identity_cache.get(session.get('user_id'))
 
 
 # Декоратор для проверки авторизации
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if g.get('user') is None:
             flash('Для выполнения этого действия необходимо войти в систему', 'warning')
-            return redirect(url_for('social_login'))
+            return redirect(url_for('main.social_login'))
         return f(*args, **kwargs)
 
     return decorated_function
 
 
-@app.route('/')
-@app.route('/index.html')
+def _too_many_requests(retry_after):
+    message = f'Слишком много запросов, попробуйте через {retry_after} сек.'
+    if request.endpoint == 'main.add_comment' and not _wants_json():
+        # Обычная отправка формы без скрипта
+        return current_app.response_class(
+            f"<h1>429 - {message}</h1><p><a href='{url_for('main.comments')}'>К комментариям</a></p>",
+            status=429, mimetype='text/html'
+        )
+    response = jsonify({'success': False, 'error': message})
+    response.status_code = 429
+    return response
+
+
+def rate_limited(name):
+    """Декоратор маршрута записи: при превышении лимита - 429 с Retry-After, без обращения к БД"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            retry_after = rate_limiter.check(name)
+            if retry_after:
+                response = _too_many_requests(retry_after)
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
+@bp.route('/avatar/<int:user_id>')
+def avatar(user_id):
+    """Аватар пользователя из дискового кэша или аватар по умолчанию"""
+    user = db.session.get(User, user_id)
+    source = user.avatar if user else None
+    path = avatar_cache.get(source) if is_remote(source) else None
+    if path is None:
+        path = avatar_cache.default()
+
+    # Имя файла в кэше - хэш адреса источника, его и используем как ETag
+    response = send_file(path, mimetype=AVATAR_MIMETYPE, conditional=True,
+                         etag=os.path.splitext(os.path.basename(path))[0])
+    if request.args.get('v') == avatar_version(source):
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        # Адрес без актуальной версии может начать отдавать другой аватар
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+@bp.route('/')
+@bp.route('/index.html')
 def index():
     return render_template('index.html')
 
 
-@app.route('/comments')
+@bp.route('/comments')
+@conditional(lambda: 'page:comments')
 def comments():
-    # Получаем только основные комментарии (не ответы)
-    comments_list = Comment.query.filter_by(page='comments', parent_id=None).order_by(Comment.created_at.desc()).all()
-    return render_template('comments_page.html', comments=comments_list)
+    # Получаем только основные комментарии (не ответы), первую страницу
+    query = Comment.query.filter_by(page='comments', parent_id=None)
+    comments_list, next_cursor = _keyset_page(query)
+    return render_template(
+        'comments_page.html',
+        comments_total=_page_total('comments'),
+        next_cursor=next_cursor,
+        **_card_context(comments_list)
+    )
 
 
-@app.route('/social_login')
+# Следующая порция карточек комментариев для бесконечной прокрутки
+@bp.route('/comments/more')
+@conditional(lambda: 'page:comments')
+def comments_more():
+    query = Comment.query.filter_by(page='comments', parent_id=None)
+    comments_list, next_cursor = _keyset_page(query)
+    response = current_app.make_response(render_template('comment_cards.html', **_card_context(comments_list)))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+def _fragment_version(comment, author):
+    """Версия содержимого карточки: меняется вместе с текстом, профилем автора и шаблонами"""
+    basis = (
+        f"{current_app.config['TEMPLATES_VERSION']}:"
+        f"{author.nickname if author else ''}:{author.avatar if author else ''}:{comment.text}"
+    )
+    return hashlib.sha1(basis.encode()).hexdigest()[:16]
+
+
+def _card_context(comments_list):
+    """Переменные шаблона comment_cards.html.
+
+    Общие части карточек берутся из кэша фрагментов по ключу (id, версия содержимого,
+    зритель - автор или нет); промахи рендерятся макросами comment_fragments.html.
+    Лайки зрителя выбираются одним запросом, счетчики уже есть в комментариях.
+    """
+    authors = identity_cache.get_many([c.user_id for c in comments_list])
+    viewer_id = g.user.id if g.get('user') else None
+
+    fragments, macros = {}, None
+    for comment in comments_list:
+        author = authors.get(comment.user_id)
+        own = viewer_id is not None and viewer_id == comment.user_id
+        key = f'card:{comment.id}:{int(own)}:{_fragment_version(comment, author)}'
+        fragment = fragment_cache.get(key)
+        if fragment is None:
+            if macros is None:
+                macros = current_app.jinja_env.get_template('comment_fragments.html').module
+            with timed_phase('tpl'):
+                fragment = {
+                    'author_info': macros.author_info(comment, author, own),
+                    'body': macros.body(comment)
+                }
+            fragment_cache.set(key, fragment, current_app.config['FRAGMENT_CACHE_TTL'])
+        fragments[comment.id] = fragment
+
+    return {
+        'comments': comments_list,
+        'fragments': fragments,
+        'liked_ids': _liked_ids([c.id for c in comments_list])
+    }
+
+
+@bp.route('/social_login')
 def social_login():
     return render_template('social_login.html')
 
 
-@app.route('/consent')
+@bp.route('/consent')
 def consent():
     return render_template('consent.html')
 
 
-@app.route('/login')
+@bp.route('/login')
 def login():
     return render_template('login.html')
 
 
 # Маршрут для добавления комментария
-@app.route('/add_comment', methods=['POST'])
+@bp.route('/add_comment', methods=['POST'])
 @login_required
+@rate_limited('comment')
 def add_comment():
+    begin_write(db.session)
     text = request.form.get('text', '').strip()
     page = request.form.get('page', 'comments')
 
     if not text:
         flash('Комментарий не может быть пустым', 'error')
-        return redirect(url_for('comments'))
+        return redirect(url_for('main.comments'))
 
     # Создаем комментарий
     comment = Comment(
         text=text,
         page=page,
-        user_id=session['user_id']
+        user_id=g.user.id
     )
 
     try:
         db.session.add(comment)
+        db.session.flush()
+        _mark_changed(comment.page, comment.id)
+        adjust_page_totals({comment.page: 1})
         db.session.commit()
-        flash('Комментарий успешно добавлен!', 'success')
+        event_data = _comment_event_data(comment)
+        broadcaster.publish(comment.page, 'comment', event_data)
     except Exception as e:
         db.session.rollback()
+        current_app.logger.error(f"Error adding comment: {e}")
+        if _wants_json():
+            return jsonify({'success': False, 'error': 'Ошибка при добавлении комментария'}), 500
         flash('Ошибка при добавлении комментария', 'error')
-        app.logger.error(f"Error adding comment: {e}")
+        return redirect(url_for('main.comments'))
 
-    return redirect(url_for('comments'))
+    # Отправка формы через fetch: карточку вставляет скрипт страницы, без перезагрузки
+    if _wants_json():
+        return jsonify({'success': True, 'comment': event_data}), 201
+    flash('Комментарий успешно добавлен!', 'success')
+    return redirect(url_for('main.comments'))
 
 
 # Маршрут для удаления комментария
-@app.route('/delete_comment/<int:comment_id>', methods=['POST'])
+@bp.route('/delete_comment/<int:comment_id>', methods=['POST'])
 @login_required
 def delete_comment(comment_id):
+    # Транзакция записи с самого начала: чтение и удаление не разделяются чужой записью
+    begin_write(db.session)
     comment = Comment.query.get_or_404(comment_id)
 
     # Проверяем, что пользователь - владелец комментария или находится в режиме админа
     is_admin_mode = request.form.get('admin_mode', 'false').lower() == 'true'
     
-    if comment.user_id != session['user_id'] and not is_admin_mode:
+    if comment.user_id != g.user.id and not is_admin_mode:
         flash('Вы не можете удалить этот комментарий', 'error')
-        return redirect(url_for('comments'))
+        return redirect(url_for('main.comments'))
 
     try:
-        # Если это основной комментарий (у которого нет parent_id), удаляем и все его ответы
-        if comment.parent_id is None:
-            # Удаляем все ответы на этот комментарий
-            replies = Comment.query.filter_by(parent_id=comment_id).all()
-            for reply in replies:
-                db.session.delete(reply)
-        
-        # Удаляем сам комментарий
-        db.session.delete(comment)
+        # Комментарий и вся его ветка (ответы на любой глубине, лайки) - двумя запросами
+        page, parent_id = comment.page, comment.parent_id
+        _, replies_counts = delete_subtrees([comment_id])
+        parent_replies = replies_counts.get(parent_id)
+        _mark_changed(page, comment_id, parent_id)
         db.session.commit()
+        broadcaster.publish(page, 'delete', {
+            'id': comment_id,
+            'parent_id': parent_id,
+            'replies_count': parent_replies
+        })
         flash('Комментарий удален', 'success')
     except Exception as e:
         db.session.rollback()
         flash('Ошибка при удалении комментария', 'error')
-        app.logger.error(f"Error deleting comment: {e}")
+        current_app.logger.error(f"Error deleting comment: {e}")
 
-    return redirect(url_for('comments'))
+    return redirect(url_for('main.comments'))
 
 
 # Mock endpoints для социальной авторизации
-@app.route('/auth/vk')
+@bp.route('/auth/vk')
 def auth_vk():
     # Здесь будет реальная логика OAuth для VK
     user = User.query.filter_by(vc_id='demo_vk_user').first()
@@ -188,13 +607,14 @@ def auth_vk():
         db.session.add(user)
         db.session.commit()
 
-@app.route('/auth/yandex')
+@bp.route('/auth/yandex')
 def auth_yandex():
     """Перенаправляет на Яндекс для авторизации.
 
     Сохраняем в сессии целевой URL (если он безопасен), чтобы после
     успешной авторизации вернуться на предыдущую страницу.
     """
+    config = current_app.config
     # Определяем куда вернуться после авторизации: сначала параметр next,
     # затем Referer (если он с того же хоста).
     next_url = request.args.get('next')
@@ -213,42 +633,43 @@ def auth_yandex():
 
     params = {
         'response_type': 'code',
-        'client_id': YANDEX_CLIENT_ID,
-        'redirect_uri': YANDEX_REDIRECT_URI,
+        'client_id': config['YANDEX_CLIENT_ID'],
+        'redirect_uri': config['YANDEX_REDIRECT_URI'],
         'state': 'security_token',
         'login_hint': ''
     }
-    authorization_url = f"{YANDEX_OAUTH_AUTHORIZE_URL}?{urlencode(params)}"
+    authorization_url = f"{config['YANDEX_OAUTH_AUTHORIZE_URL']}?{urlencode(params)}"
     return redirect(authorization_url)
 
 
-@app.route('/auth/yandex/callback')
+@bp.route('/auth/yandex/callback')
 def auth_yandex_callback():
     """Обработчик callback от Яндекса"""
+    config = current_app.config
     code = request.args.get('code')
     state = request.args.get('state')
 
     if not code:
         flash('Ошибка авторизации: код не получен', 'error')
-        return redirect(url_for('social_login'))
+        return redirect(url_for('main.social_login'))
 
     try:
         # Получаем токен доступа
         token_data = {
             'grant_type': 'authorization_code',
             'code': code,
-            'client_id': YANDEX_CLIENT_ID,
-            'client_secret': YANDEX_CLIENT_SECRET,
+            'client_id': config['YANDEX_CLIENT_ID'],
+            'client_secret': config['YANDEX_CLIENT_SECRET'],
         }
         
-        token_response = requests.post(YANDEX_OAUTH_TOKEN_URL, data=token_data)
+        token_response = yandex_oauth.post(config['YANDEX_OAUTH_TOKEN_URL'], data=token_data)
         token_response.raise_for_status()
         token_json = token_response.json()
         access_token = token_json.get('access_token')
 
         if not access_token:
             flash('Ошибка получения токена доступа', 'error')
-            return redirect(url_for('social_login'))
+            return redirect(url_for('main.social_login'))
 
         # Получаем информацию о пользователе
         headers = {
@@ -256,7 +677,7 @@ def auth_yandex_callback():
             'Content-Type': 'application/json'
         }
         
-        user_response = requests.get(YANDEX_USER_INFO_URL, headers=headers)
+        user_response = yandex_oauth.get(config['YANDEX_USER_INFO_URL'], headers=headers)
         user_response.raise_for_status()
         user_info = user_response.json()
 
@@ -282,7 +703,7 @@ def auth_yandex_callback():
             )
             db.session.add(user)
             db.session.commit()
-            print(f"[INFO] Создан новый пользователь Яндекса: {nickname}")
+            current_app.logger.info("Создан новый пользователь Яндекса: user_id=%s", user.id)
         else:
             # Обновляем информацию пользователя
             user.nickname = nickname
@@ -290,7 +711,9 @@ def auth_yandex_callback():
             if avatar_url:
                 user.avatar = avatar_url
             db.session.commit()
-            print(f"[INFO] Обновлены данные пользователя Яндекса: {nickname}")
+            current_app.logger.info("Обновлены данные пользователя Яндекса: user_id=%s", user.id)
+        # Профиль мог измениться - сбрасываем снимок в кэше пользователей
+        identity_cache.invalidate(user.id)
 
         # Устанавливаем сессию
         session['user_id'] = user.id
@@ -306,12 +729,16 @@ def auth_yandex_callback():
             return redirect(next_url)
 
         # По умолчанию возвращаем на главную
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
+    except CircuitOpenError as e:
+        current_app.logger.warning("%s", e)
+        flash('Яндекс временно недоступен, попробуйте войти позже', 'error')
+        return redirect(url_for('main.social_login'))
     except requests.RequestException as e:
-        print(f"[ERROR] Ошибка при авторизации через Яндекс: {e}")
+        current_app.logger.error("Ошибка при авторизации через Яндекс: %s", e)
         flash('Ошибка при авторизации через Яндекс', 'error')
-        return redirect(url_for('social_login'))
+        return redirect(url_for('main.social_login'))
         db.session.commit()
 
     session['user_id'] = user.id
@@ -324,17 +751,18 @@ def auth_yandex_callback():
     if next_url and isinstance(next_url, str) and next_url.startswith('/'):
         return redirect(next_url)
 
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 
-@app.route('/auth/google')
+@bp.route('/auth/google')
 def auth_google():
     """Перенаправляет пользователя на страницу авторизации Google."""
+    config = current_app.config
     # Проверка конфигурации
-    if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
-        print("[ERROR] Google OAuth не настроен! Отсутствуют CLIENT_ID или CLIENT_SECRET")
+    if not config['GOOGLE_CLIENT_ID'] or not config['GOOGLE_CLIENT_SECRET']:
+        current_app.logger.error("Google OAuth не настроен: отсутствуют CLIENT_ID или CLIENT_SECRET")
         flash('Google авторизация не настроена на сервере', 'error')
-        return redirect(url_for('social_login'))
+        return redirect(url_for('main.social_login'))
     
     next_url = request.args.get('next')
     if not next_url:
@@ -351,71 +779,65 @@ def auth_google():
 
     params = {
         'response_type': 'code',
-        'client_id': GOOGLE_CLIENT_ID,
-        'redirect_uri': GOOGLE_REDIRECT_URI,
+        'client_id': config['GOOGLE_CLIENT_ID'],
+        'redirect_uri': config['GOOGLE_REDIRECT_URI'],
         'scope': 'openid email profile',
         'access_type': 'offline',
         'prompt': 'select_account'
     }
-    authorization_url = f"{GOOGLE_OAUTH_AUTHORIZE_URL}?{urlencode(params)}"
-    print(f"[DEBUG] Перенаправляем на Google: {authorization_url[:100]}...")
+    authorization_url = f"{config['GOOGLE_OAUTH_AUTHORIZE_URL']}?{urlencode(params)}"
     return redirect(authorization_url)
 
 
-@app.route('/auth/google/callback')
+@bp.route('/auth/google/callback')
 def auth_google_callback():
     """Обработчик callback от Google OAuth2."""
+    config = current_app.config
     code = request.args.get('code')
     error = request.args.get('error')
     
     # Обработка ошибок от Google
     if error:
         error_description = request.args.get('error_description', error)
-        print(f"[ERROR] Google OAuth ошибка: {error} - {error_description}")
+        current_app.logger.warning("Google OAuth ошибка: %s - %s", error, error_description)
         flash(f'Ошибка авторизации Google: {error_description}', 'error')
-        return redirect(url_for('social_login'))
+        return redirect(url_for('main.social_login'))
     
     if not code:
-        print("[ERROR] Google callback: код авторизации не получен")
+        current_app.logger.warning("Google callback: код авторизации не получен")
         flash('Ошибка авторизации: код не получен', 'error')
-        return redirect(url_for('social_login'))
+        return redirect(url_for('main.social_login'))
 
     try:
-        print(f"[DEBUG] Получен код авторизации, обмениваем на токен...")
         token_data = {
             'grant_type': 'authorization_code',
             'code': code,
-            'client_id': GOOGLE_CLIENT_ID,
-            'client_secret': GOOGLE_CLIENT_SECRET,
-            'redirect_uri': GOOGLE_REDIRECT_URI,
+            'client_id': config['GOOGLE_CLIENT_ID'],
+            'client_secret': config['GOOGLE_CLIENT_SECRET'],
+            'redirect_uri': config['GOOGLE_REDIRECT_URI'],
         }
 
-        print(f"[DEBUG] Отправляем запрос к {GOOGLE_OAUTH_TOKEN_URL}")
-        token_response = requests.post(GOOGLE_OAUTH_TOKEN_URL, data=token_data)
-        
-        print(f"[DEBUG] Статус ответа: {token_response.status_code}")
-        print(f"[DEBUG] Содержание ответа: {token_response.text[:200]}")
+        token_response = google_oauth.post(config['GOOGLE_OAUTH_TOKEN_URL'], data=token_data)
+        # Тело ответа не логируем: в нем токены
+        current_app.logger.debug("Google token: status=%s", token_response.status_code)
         
         token_response.raise_for_status()
         token_json = token_response.json()
         access_token = token_json.get('access_token')
 
         if not access_token:
-            print("[ERROR] Access token не получен из ответа Google")
+            current_app.logger.error("Access token не получен из ответа Google")
             flash('Ошибка получения токена доступа', 'error')
-            return redirect(url_for('social_login'))
+            return redirect(url_for('main.social_login'))
 
-        print(f"[DEBUG] Получен access token, запрашиваем информацию пользователя...")
         headers = {
             'Authorization': f'Bearer {access_token}',
             'Accept': 'application/json'
         }
 
-        user_response = requests.get(GOOGLE_USER_INFO_URL, headers=headers)
+        user_response = google_oauth.get(config['GOOGLE_USER_INFO_URL'], headers=headers)
         user_response.raise_for_status()
         user_info = user_response.json()
-        
-        print(f"[DEBUG] Информация пользователя: {user_info}")
 
         google_id = user_info.get('sub') or user_info.get('id')
         nickname = user_info.get('name') or user_info.get('given_name') or 'Google User'
@@ -438,7 +860,7 @@ def auth_google_callback():
             )
             db.session.add(user)
             db.session.commit()
-            print(f"[INFO] Создан новый пользователь Google: {nickname}")
+            current_app.logger.info("Создан новый пользователь Google: user_id=%s", user.id)
         else:
             user.nickname = nickname
             user.email = email or user.email
@@ -447,7 +869,8 @@ def auth_google_callback():
             if google_id and not getattr(user, 'google_id', None):
                 user.google_id = google_id
             db.session.commit()
-            print(f"[INFO] Обновлены данные пользователя Google: {nickname}")
+            current_app.logger.info("Обновлены данные пользователя Google: user_id=%s", user.id)
+        identity_cache.invalidate(user.id)
 
         session['user_id'] = user.id
         session['user_nickname'] = user.nickname
@@ -460,16 +883,20 @@ def auth_google_callback():
         if next_url and isinstance(next_url, str) and next_url.startswith('/'):
             return redirect(next_url)
 
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
+    except CircuitOpenError as e:
+        current_app.logger.warning("%s", e)
+        flash('Google временно недоступен, попробуйте войти позже', 'error')
+        return redirect(url_for('main.social_login'))
     except requests.RequestException as e:
-        print(f"[ERROR] Ошибка при авторизации через Google: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"[ERROR] Ответ сервера: {e.response.text}")
+        # Тело ответа провайдера не логируем: там могут быть токены
+        status = e.response.status_code if getattr(e, 'response', None) is not None else None
+        current_app.logger.error("Ошибка при авторизации через Google: %s (status=%s)", e, status)
         flash('Ошибка при авторизации через Google', 'error')
-        return redirect(url_for('social_login'))
+        return redirect(url_for('main.social_login'))
 
-@app.route('/auth/telegram')
+@bp.route('/auth/telegram')
 def auth_telegram():
     # Mock авторизация через Telegram
     user = User.query.filter_by(tg_id='demo_tg_user').first()
@@ -488,82 +915,327 @@ def auth_telegram():
     session['user_avatar'] = user.avatar
 
     flash('Вы успешно вошли через Telegram!', 'success')
-    return redirect(url_for('comments'))
+    return redirect(url_for('main.comments'))
 
 
 # Выход из системы
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
     flash('Вы успешно вышли из системы', 'info')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 
 # Переключение аккаунта: очищаем сессию и перенаправляем на страницу входа
-@app.route('/switch_account')
+@bp.route('/switch_account')
 def switch_account():
     session.clear()
-    return redirect(url_for('social_login'))
+    return redirect(url_for('main.social_login'))
+
+
+def _encode_cursor(comment):
+    """Непрозрачный курсор из ключа сортировки (created_at, id)"""
+    raw = f"{comment.created_at.isoformat()}|{comment.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Разбирает курсор из _encode_cursor, при ошибке отвечает 400"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, comment_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        abort(400)
+
+
+def _page_limit():
+    """Размер страницы из параметра limit, ограниченный сверху"""
+    config = current_app.config
+    limit = request.args.get('limit', config['COMMENTS_PAGE_SIZE'], type=int)
+    return max(1, min(limit, config['COMMENTS_MAX_PAGE_SIZE']))
+
+
+def _keyset_page(query, descending=True):
+    """Курсорная пагинация по (created_at, id).
+
+    Возвращает элементы страницы и курсор следующей страницы (или None).
+    Запрос может выбирать как сам Comment, так и строки, где Comment первый.
+    """
+    cursor = _decode_cursor(request.args.get('cursor'))
+    limit = _page_limit()
+
+    if descending:
+        order_by = [Comment.created_at.desc(), Comment.id.desc()]
+        if cursor:
+            query = query.filter(or_(
+                Comment.created_at < cursor[0],
+                and_(Comment.created_at == cursor[0], Comment.id < cursor[1])
+            ))
+    else:
+        order_by = [Comment.created_at.asc(), Comment.id.asc()]
+        if cursor:
+            query = query.filter(or_(
+                Comment.created_at > cursor[0],
+                and_(Comment.created_at == cursor[0], Comment.id > cursor[1])
+            ))
+
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    items = query.order_by(*order_by).limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = _encode_cursor(last if isinstance(last, Comment) else last[0])
+    return items, next_cursor
+
+
+def _paginated_json(items, next_cursor):
+    """JSON-список с курсором следующей страницы в заголовке X-Next-Cursor"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+def _comment_rows(*criteria):
+    """Комментарии вместе с автором и числом лайков одним запросом"""
+    return (
+        db.session.query(Comment, User, Comment.likes_count)
+        .outerjoin(User, User.id == Comment.user_id)
+        .filter(*criteria)
+    )
+
+
+def _liked_ids(comment_ids):
+    """Множество id комментариев, которые лайкнул текущий пользователь"""
+    if g.get('user') is None or not comment_ids:
+        return set()
+    rows = db.session.query(Like.comment_id).filter(
+        Like.user_id == g.user.id,
+        Like.comment_id.in_(comment_ids)
+    )
+    return {comment_id for (comment_id,) in rows}
+
+
+def _serialize_comments(rows):
+    """Преобразует строки из _comment_rows в общие для всех зрителей словари.
+
+    Поля, зависящие от зрителя (can_delete, user_liked), добавляет _with_viewer_fields,
+    поэтому результат можно хранить в общем кэше.
+    """
+    return [{
+        'id': comment.id,
+        'user_id': comment.user_id,
+        'text': comment.text,
+        'created_at': comment.created_at.strftime('%d.%m.%Y %H:%M'),
+        'author': user.nickname if user else 'Аноним',
+        'avatar': avatar_url(comment.user_id, user.avatar if user else None),
+        'likes_count': likes_count
+    } for comment, user, likes_count in rows]
+
+
+def _with_viewer_fields(items, liked=None):
+    """Накладывает на общий список поля текущего пользователя.
+
+    liked - заранее выбранные лайки зрителя; без него выбираются для items одним запросом.
+    """
+    if liked is None:
+        liked = _liked_ids([item['id'] for item in items])
+    viewer_id = g.user.id if g.get('user') else None
+
+    result = []
+    for item in items:
+        item = dict(item)
+        author_id = item.pop('user_id')
+        item['can_delete'] = viewer_id is not None and author_id == viewer_id
+        item['user_liked'] = item['id'] in liked
+        result.append(item)
+    return result
+
+
+def _cached_listing(scope, criteria, descending=True):
+    """Страница списка комментариев через кэш: общая часть кэшируется, поля зрителя - нет.
+
+    Ключ включает версию области из БД - ту же, что и ETag (conditional): данные из
+    кэша всегда не старше версии, под которой они отдаются.
+    """
+    version, _ = _scope_marker(scope)
+    key = f"{request.args.get('cursor', '')}:{_page_limit()}"
+
+    def load():
+        rows, next_cursor = _keyset_page(_comment_rows(*criteria), descending=descending)
+        return {'items': _serialize_comments(rows), 'next_cursor': next_cursor}
+
+    payload = comments_cache.get_or_load(scope, version, key, load)
+    return _paginated_json(_with_viewer_fields(payload['items']), payload['next_cursor'])
+
+
+def _comment_scopes(page, comment_id, parent_id=None):
+    """Области данных (страница и ветки), в которых участвует комментарий"""
+    scopes = [f'page:{page}', f'thread:{comment_id}']
+    if parent_id is not None:
+        scopes.append(f'thread:{parent_id}')
+    return scopes
+
+
+def _mark_changed(page, comment_id, parent_id=None):
+    """Увеличивает версии областей для ETag и кэша списков; вызывается до commit, в той же транзакции"""
+    bump_change_markers(*_comment_scopes(page, comment_id, parent_id))
 
 
 # API для получения комментариев
-@app.route('/api/comments/<page>')
+@bp.route('/api/comments/<page>')
+@conditional(lambda page: f'page:{page}')
 def get_comments(page):
-    comments = Comment.query.filter_by(page=page).order_by(Comment.created_at.desc()).all()
-    comments_list = []
-
-    for comment in comments:
-        user = User.query.get(comment.user_id)
-        # Считаем лайки и проверяем, лайкнул ли текущий пользователь
-        likes_count = Like.query.filter_by(comment_id=comment.id).count()
-        user_liked = False
-        if 'user_id' in session:
-            user_liked = Like.query.filter_by(comment_id=comment.id, user_id=session['user_id']).first() is not None
-
-        comments_list.append({
-            'id': comment.id,
-            'text': comment.text,
-            'created_at': comment.created_at.strftime('%d.%m.%Y %H:%M'),
-            'author': user.nickname if user else 'Аноним',
-            'avatar': user.avatar if user else 'default-avatar.png',
-            'can_delete': 'user_id' in session and comment.user_id == session['user_id'],
-            'likes_count': likes_count,
-            'user_liked': user_liked
-        })
+    return _cached_listing(f'page:{page}', [Comment.page == page])
+
+
+def _wants_json():
+    """Запрос отправлен скриптом и ждет JSON, а не перенаправления"""
+    return request.accept_mimetypes.best == 'application/json'
+
+
+def _comment_event_data(comment, parent_replies=None):
+    """Комментарий для события SSE: общие для всех зрителей поля, как в JSON API"""
+    item = _serialize_comments([(comment, g.user, comment.likes_count)])[0]
+    item['parent_id'] = comment.parent_id
+    item['replies_count'] = comment.replies_count
+    if parent_replies is not None:
+        item['parent_replies_count'] = parent_replies
+    return item
+
+
+# Поток изменений страницы комментариев (Server-Sent Events)
+@bp.route('/api/comments/<page>/stream')
+def comments_stream(page):
+    config = current_app.config
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    # Генератор работает вне контекста приложения - все нужное берем заранее
+    events = broadcaster._get_current_object()
+    heartbeat, max_duration = config['SSE_HEARTBEAT'], config['SSE_MAX_DURATION']
+
+    # Каждый поток занимает рабочий поток сервера - ограничиваем их число (sse_subscriber_limit).
+    # Проверка и подписка атомарны: одновременные запросы не превысят предел.
+    subscription = events.subscribe(page, last_event_id, limit=config['SSE_MAX_SUBSCRIBERS'])
+    if subscription is None:
+        response = current_app.response_class('Слишком много подключений', status=503)
+        response.headers['Retry-After'] = '30'
+        return response
+
+    def generate():
+        started = time.monotonic()
+        try:
+            # Клиент переподключается через 3 секунды, передавая Last-Event-ID
+            yield 'retry: 3000\n\n'
+            while time.monotonic() - started < max_duration:
+                event = subscription.get(timeout=heartbeat)
+                if event is None:
+                    yield ': heartbeat\n\n'
+                elif event == 'reset':
+                    yield f'id: {events.last_id}\nevent: reset\ndata: {{}}\n\n'
+                else:
+                    yield format_event(event)
+        finally:
+            events.unsubscribe(subscription)
+
+    # Соединение с БД не нужно потоку - возвращаем его в пул до начала передачи
+    db.session.remove()
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Если клиент ушел до начала передачи, генератор не запустится - отписываемся при закрытии
+    response.call_on_close(lambda: events.unsubscribe(subscription))
+    return response
+
+
+# Статистика кэша списков комментариев
+@bp.route('/api/cache/stats')
+def cache_stats():
+    stats = comments_cache.stats()
+    stats['fragments'] = fragment_cache.stats()
+    return jsonify(stats)
+
+
+def _comment_summaries(page, comment_ids):
+    """Счетчики ответов, лайков и лайк текущего пользователя для набора комментариев.
+
+    Все значения читаются одним запросом: счетчики хранятся в самом комментарии.
+    """
+    if not comment_ids:
+        return {}
+
+    if g.get('user') is not None:
+        user_liked = exists().where(
+            Like.comment_id == Comment.id,
+            Like.user_id == g.user.id
+        ).correlate(Comment)
+    else:
+        user_liked = literal(False)
+
+    rows = db.session.query(Comment.id, Comment.replies_count, Comment.likes_count, user_liked).filter(
+        Comment.page == page,
+        Comment.id.in_(comment_ids)
+    )
+    return {
+        comment_id: {
+            'replies_count': replies,
+            'likes_count': likes,
+            'user_liked': bool(liked)
+        }
+        for comment_id, replies, likes, liked in rows
+    }
 
-    return jsonify(comments_list)
+
+# Сводка по комментариям страницы: счетчики для многих карточек за один запрос
+@bp.route('/api/comments/<page>/summary')
+@conditional(lambda page: f'page:{page}')
+def get_comments_summary(page):
+    try:
+        comment_ids = [int(i) for i in request.args.get('ids', '').split(',') if i]
+    except ValueError:
+        abort(400)
+
+    if len(comment_ids) > current_app.config['COMMENTS_MAX_PAGE_SIZE']:
+        abort(400)
+
+    summaries = _comment_summaries(page, comment_ids)
+    return jsonify({str(comment_id): summary for comment_id, summary in summaries.items()})
 
 
 # Лайк на комментарий
-@app.route('/api/comment/<int:comment_id>/like', methods=['POST'])
+@bp.route('/api/comment/<int:comment_id>/like', methods=['POST'])
 @login_required
+@rate_limited('like')
 def like_comment(comment_id):
-    comment = Comment.query.get_or_404(comment_id)
-    user_id = session['user_id']
-    # Запрещаем ставить лайки на ответы (комментарии с parent_id)
-    if comment.parent_id is not None:
-        return jsonify({
-            'success': False,
-            'error': 'Likes on replies are disabled'
-        }), 403
-    
-    # Проверяем, уже ли пользователь лайкнул этот комментарий
-    existing_like = Like.query.filter_by(comment_id=comment_id, user_id=user_id).first()
-    
-    if existing_like:
-        # Удаляем лайк (дизлайк)
-        db.session.delete(existing_like)
-        db.session.commit()
-        liked = False
-    else:
-        # Добавляем лайк
-        like = Like(comment_id=comment_id, user_id=user_id)
-        db.session.add(like)
-        db.session.commit()
-        liked = True
-    
-    # Возвращаем количество лайков
-    likes_count = Like.query.filter_by(comment_id=comment_id).count()
+    # Лайк и счетчик меняются в одной транзакции записи (на SQLite - BEGIN IMMEDIATE)
+    begin_write(db.session)
+    user_id = g.user.id
+    result = toggle_like(comment_id, user_id)
+
+    if result is None:
+        db.session.rollback()
+        comment = Comment.query.get_or_404(comment_id)
+        # Запрещаем ставить лайки на ответы (комментарии с parent_id)
+        if comment.parent_id is not None:
+            return jsonify({
+                'success': False,
+                'error': 'Likes on replies are disabled'
+            }), 403
+        abort(404)
+
+    liked, likes_count, page = result
+    _mark_changed(page, comment_id)
+    db.session.commit()
+    broadcaster.publish(page, 'like', {
+        'id': comment_id,
+        'likes_count': likes_count,
+        'user_id': user_id,
+        'liked': liked
+    })
     
     return jsonify({
         'success': True,
@@ -573,9 +1245,11 @@ def like_comment(comment_id):
 
 
 # Добавление ответа на комментарий
-@app.route('/add_reply/<int:parent_id>', methods=['POST'])
+@bp.route('/add_reply/<int:parent_id>', methods=['POST'])
 @login_required
+@rate_limited('reply')
 def add_reply(parent_id):
+    begin_write(db.session)
     parent_comment = Comment.query.get_or_404(parent_id)
     text = request.form.get('text', '').strip()
     page = request.form.get('page', 'comments')
@@ -586,20 +1260,34 @@ def add_reply(parent_id):
             'error': 'Ответ не может быть пустым'
         }), 400
     
+    if parent_comment.depth >= MAX_DEPTH:
+        return jsonify({
+            'success': False,
+            'error': 'Слишком глубокая ветка ответов'
+        }), 400
+    
     # Создаем ответ
     reply = Comment(
         text=text,
         page=page,
-        user_id=session['user_id'],
+        user_id=g.user.id,
         parent_id=parent_id
     )
     
     try:
         db.session.add(reply)
+        Comment.query.filter_by(id=parent_id).update(
+            {Comment.replies_count: Comment.replies_count + 1},
+            synchronize_session=False
+        )
+        db.session.flush()
+        parent_replies = db.session.query(Comment.replies_count).filter_by(id=parent_id).scalar()
+        _mark_changed(reply.page, reply.id, parent_id)
         db.session.commit()
+        broadcaster.publish(reply.page, 'reply', _comment_event_data(reply, parent_replies=parent_replies))
         
         # Возвращаем JSON с данными ответа
-        user = User.query.get(reply.user_id)
+        user = g.user
         return jsonify({
             'success': True,
             'reply': {
@@ -607,16 +1295,19 @@ def add_reply(parent_id):
                 'text': reply.text,
                 'created_at': reply.created_at.strftime('%d.%m.%Y %H:%M'),
                 'author': user.nickname if user else 'Аноним',
-                'avatar': user.avatar if user else 'default-avatar.png',
+                'avatar': avatar_url(reply.user_id, user.avatar if user else None),
                 'can_delete': True,
                 'likes_count': 0,
-                'user_liked': False
+                'user_liked': False,
+                'parent_id': parent_id,
+                'depth': reply.depth
             },
+            'parent_replies_count': parent_replies,
             'message': 'Ответ успешно добавлен!'
         }), 201
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error adding reply: {e}")
+        current_app.logger.error(f"Error adding reply: {e}")
         return jsonify({
             'success': False,
             'error': 'Ошибка при добавлении ответа'
@@ -624,48 +1315,118 @@ def add_reply(parent_id):
 
 
 # API для получения ответов на комментарий
-@app.route('/api/comment/<int:comment_id>/replies')
+@bp.route('/api/comment/<int:comment_id>/replies')
+@conditional(lambda comment_id: f'thread:{comment_id}')
 def get_comment_replies(comment_id):
-    comment = Comment.query.get_or_404(comment_id)
-    replies = Comment.query.filter_by(parent_id=comment_id).order_by(Comment.created_at.asc()).all()
-    
-    replies_list = []
-    for reply in replies:
-        user = User.query.get(reply.user_id)
-        likes_count = Like.query.filter_by(comment_id=reply.id).count()
-        user_liked = False
-        if 'user_id' in session:
-            user_liked = Like.query.filter_by(comment_id=reply.id, user_id=session['user_id']).first() is not None
-        
-        replies_list.append({
-            'id': reply.id,
-            'text': reply.text,
-            'created_at': reply.created_at.strftime('%d.%m.%Y %H:%M'),
-            'author': user.nickname if user else 'Аноним',
-            'avatar': user.avatar if user else 'default-avatar.png',
-            'can_delete': 'user_id' in session and reply.user_id == session['user_id'],
-            'likes_count': likes_count,
-            'user_liked': user_liked
-        })
-    
-    return jsonify(replies_list)
+    Comment.query.get_or_404(comment_id)
+    return _cached_listing(f'thread:{comment_id}', [Comment.parent_id == comment_id], descending=False)
+
+
+# Вся ветка комментария с вложенными ответами любой глубины одним запросом
+@bp.route('/api/comment/<int:comment_id>/thread')
+def get_comment_thread(comment_id):
+    root = Comment.query.get_or_404(comment_id)
+    max_nodes = current_app.config['THREAD_MAX_NODES']
+    limit = max(1, min(request.args.get('limit', max_nodes, type=int), max_nodes))
+
+    # Диапазон по индексу path, порядок path - обход дерева в глубину
+    query = _comment_rows(*Comment.subtree_range(root.path)).order_by(Comment.path).limit(limit + 1)
+    if current_app.config['STREAM_JSON']:
+        return _stream_thread(root, query, limit)
+
+    rows = query.all()
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+
+    items = _with_viewer_fields(_serialize_comments(rows))
+    nodes = {}
+    for item, (comment, _, _) in zip(items, rows):
+        item['parent_id'] = comment.parent_id
+        item['depth'] = comment.depth - root.depth
+        item['replies_count'] = comment.replies_count
+        item['replies'] = []
+        nodes[comment.id] = item
+        parent = nodes.get(comment.parent_id)
+        if parent is not None and comment.id != root.id:
+            parent['replies'].append(item)
+
+    return jsonify({'thread': nodes[root.id], 'count': len(rows), 'truncated': truncated})
+
+
+def _stream_thread(root, query, limit):
+    """Та же ветка, но строки читаются порциями и сразу кодируются в ответ.
+
+    Лайки зрителя выбираются заранее одним запросом по диапазону ветки, поэтому
+    на порцию строк дополнительных запросов нет.
+    """
+    liked = set()
+    if g.get('user') is not None:
+        liked = {comment_id for (comment_id,) in db.session.query(Like.comment_id).join(
+            Comment, Comment.id == Like.comment_id
+        ).filter(Like.user_id == g.user.id, *Comment.subtree_range(root.path))}
+
+    stats = {'count': 0, 'truncated': False}
+
+    def nodes():
+        for row in query.yield_per(current_app.config['STREAM_BATCH_SIZE']):
+            if stats['count'] == limit:
+                stats['truncated'] = True
+                break
+            comment = row[0]
+            item = _with_viewer_fields(_serialize_comments([row]), liked)[0]
+            item['parent_id'] = comment.parent_id
+            item['depth'] = comment.depth - root.depth
+            item['replies_count'] = comment.replies_count
+            stats['count'] += 1
+            yield item['depth'], item
+
+    def generate():
+        yield '{"thread":'
+        yield from json_tree(nodes())
+        yield f',"count":{stats["count"]},"truncated":{dumps(stats["truncated"])}}}'
+
+    return Response(stream_with_context(chunked(generate())), mimetype='application/json')
+
+
+# Полнотекстовый поиск по комментариям
+@bp.route('/api/search')
+def search():
+    terms = query_terms(request.args.get('q', ''))
+    if not terms:
+        return jsonify({'error': 'Пустой поисковый запрос'}), 400
+
+    cursor = request.args.get('cursor')
+    try:
+        cursor = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        abort(400)
+
+    matches, next_cursor = search_comments(
+        terms, page=request.args.get('page') or None, cursor=cursor, limit=_page_limit()
+    )
+    # Авторы и лайки найденных комментариев - тем же путем, что и в списках
+    ids = [comment_id for comment_id, _, _ in matches]
+    rows = {row[0].id: row for row in _comment_rows(Comment.id.in_(ids))} if ids else {}
+    found = [(rows[comment_id], score, snippet) for comment_id, score, snippet in matches if comment_id in rows]
+
+    items = _with_viewer_fields(_serialize_comments([row for row, _, _ in found]))
+    for item, (row, score, snippet) in zip(items, found):
+        comment = row[0]
+        item.update(page=comment.page, parent_id=comment.parent_id, snippet=snippet, score=score)
+    return _paginated_json(items, next_cursor)
 
 
 # Временная замена обработчиков ошибок
-# Контекст процессор для передачи функций в шаблоны
-@app.context_processor
+# Контекст процессор: текущий пользователь, загруженный в load_current_user
+@bp.app_context_processor
 def inject_user():
-    def get_user(user_id):
-        if user_id:
-            return User.query.get(user_id)
-        return None
-    return dict(get_user=get_user)
+    return dict(current_user=g.get('user'))
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def page_not_found(e):
     return "<h1>404 - Страница не найдена</h1><p><a href='/'>На главную</a></p>", 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_server_error(e):
     return "<h1>500 - Внутренняя ошибка сервера</h1><p>Попробуйте позже</p>", 500
\ No newline at end of file
@@ -0,0 +1,56 @@
+// Общие скрипты всех страниц (templates/base.html)
+
+// Скрытая логика активации режима админа
+let adminClickCount = 0;
+let adminClickTimer = null;
+const ADMIN_CLICK_THRESHOLD = 7;  // Количество кликов для активации
+const ADMIN_CLICK_TIMEOUT = 2000; // Таймаут между кликами (мс)
+
+// Глобальная функция для переключения режима админа
+function toggleAdminMode() {
+    adminClickCount++;
+
+    // Очищаем старый таймер
+    if (adminClickTimer) clearTimeout(adminClickTimer);
+
+    // Если достаточно кликов - активируем режим админа
+    if (adminClickCount >= ADMIN_CLICK_THRESHOLD) {
+        activateAdminMode();
+        adminClickCount = 0;
+    } else {
+        // Устанавливаем таймер для сброса счётчика
+        adminClickTimer = setTimeout(() => {
+            adminClickCount = 0;
+        }, ADMIN_CLICK_TIMEOUT);
+    }
+}
+
+function activateAdminMode() {
+    // Сохраняем флаг админа в sessionStorage
+    sessionStorage.setItem('isAdminMode', 'true');
+    console.log('🔓 Режим админа активирован!');
+    alert('Режим админа активирован!');
+    // Перезагружаем страницу, если на странице комментариев
+    if (window.location.pathname.includes('comments')) {
+        location.reload();
+    }
+}
+
+// Проверяем режим админа при загрузке страницы
+document.addEventListener('DOMContentLoaded', function () {
+    const isAdminMode = sessionStorage.getItem('isAdminMode') === 'true';
+    if (isAdminMode) {
+        document.body.classList.add('admin-mode-active');
+        console.log('✅ Режим админа активен');
+    }
+
+    // Прямой клик по аватару: выйти и перейти на страницу входа/регистрации
+    const avatar = document.querySelector('.profile-avatar') || document.querySelector('.profile-avatar-default');
+    if (avatar) {
+        avatar.addEventListener('click', function (e) {
+            e.preventDefault();
+            // Перейдём на /switch_account, маршрут очищает сессию и редиректит на /social_login
+            window.location.href = '/switch_account';
+        });
+    }
+});
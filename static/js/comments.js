@@ -0,0 +1,577 @@
+// Скрипты страницы комментариев (templates/comments.html)
+
+// Авторизован ли пользователь: флаг выставляет шаблон в data-атрибуте
+function isAuthenticated() {
+    const section = document.getElementById('comments-section');
+    return section !== null && section.dataset.authenticated === 'true';
+}
+
+// Функция для переключения лайка
+function toggleLike(commentId) {
+    if (!isAuthenticated()) {
+        alert('Пожалуйста, войдите для добавления лайка');
+        window.location.href = '/social_login';
+        return;
+    }
+
+    fetch(`/api/comment/${commentId}/like`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        credentials: 'same-origin'
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                const likeCountElement = document.querySelector(`.like-count[data-comment-id="${commentId}"]`);
+                if (likeCountElement) {
+                    likeCountElement.textContent = data.likes_count;
+
+                    // Изменяем иконку сердца у кнопки-родителя
+                    const likeBtn = likeCountElement.closest('.like-btn');
+                    if (likeBtn) {
+                        if (data.liked) {
+                            likeBtn.classList.add('liked');
+                            const icon = likeBtn.querySelector('i');
+                            if (icon) { icon.classList.remove('far'); icon.classList.add('fas'); }
+                        } else {
+                            likeBtn.classList.remove('liked');
+                            const icon = likeBtn.querySelector('i');
+                            if (icon) { icon.classList.remove('fas'); icon.classList.add('far'); }
+                        }
+                    }
+                }
+            } else if (data.error) {
+                // Например, 429: слишком частые лайки
+                alert(data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Ошибка при добавлении лайка:', error);
+            alert('Ошибка при добавлении лайка');
+        });
+}
+
+// Функция для переключения видимости ответов
+function toggleReplies(commentId) {
+    const repliesSection = document.getElementById(`replies-${commentId}`);
+    const repliesList = document.getElementById(`replies-list-${commentId}`);
+
+    if (repliesSection.style.display === 'none') {
+        repliesSection.style.display = 'block';
+        loadReplies(commentId);
+    } else {
+        repliesSection.style.display = 'none';
+    }
+}
+
+// Ответы API вместе с ETag: повторный запрос отправляет If-None-Match,
+// и при ответе 304 используются уже загруженные данные
+const apiCache = new Map();
+function fetchWithValidators(url) {
+    const cached = apiCache.get(url);
+    const headers = cached ? { 'If-None-Match': cached.etag } : {};
+
+    return fetch(url, { credentials: 'same-origin', headers, cache: 'no-store' })
+        .then(response => {
+            if (response.status === 304 && cached) {
+                return cached;
+            }
+            return response.json().then(data => {
+                const entry = { data, nextCursor: response.headers.get('X-Next-Cursor') };
+                const etag = response.headers.get('ETag');
+                if (etag) apiCache.set(url, { ...entry, etag });
+                return entry;
+            });
+        });
+}
+
+// Функция для загрузки ответов (постранично, по курсору)
+function loadReplies(commentId, cursor) {
+    const params = new URLSearchParams();
+    if (cursor) params.set('cursor', cursor);
+
+    fetchWithValidators(`/api/comment/${commentId}/replies?${params}`)
+        .then(({ data: replies, nextCursor }) => {
+            const repliesList = document.getElementById(`replies-list-${commentId}`);
+            if (!cursor) {
+                repliesList.innerHTML = '';
+            } else {
+                const moreBtn = repliesList.querySelector('.load-more-replies');
+                if (moreBtn) moreBtn.remove();
+            }
+
+            if (!cursor && replies.length === 0) {
+                repliesList.innerHTML = '<p class="no-replies">Пока нет ответов</p>';
+                return;
+            }
+
+            replies.forEach(reply => {
+                const replyEl = createReplyElement(reply);
+                repliesList.appendChild(replyEl);
+            });
+
+            // Кнопка для следующей страницы ответов
+            if (nextCursor) {
+                const moreBtn = document.createElement('button');
+                moreBtn.type = 'button';
+                moreBtn.className = 'toggle-replies-btn load-more-replies';
+                moreBtn.textContent = 'Показать ещё ответы';
+                moreBtn.addEventListener('click', () => loadReplies(commentId, nextCursor));
+                repliesList.appendChild(moreBtn);
+            }
+        })
+        .catch(error => {
+            console.error('Ошибка при загрузке ответов:', error);
+        });
+}
+
+// Экранирование пользовательского текста перед вставкой в innerHTML: и в текст,
+// и в значения атрибутов в кавычках (поэтому экранируются и кавычки)
+const HTML_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+
+function escapeHtml(value) {
+    return (value == null ? '' : String(value)).replace(/[&<>"']/g, ch => HTML_ESCAPES[ch]);
+}
+
+// id текущего пользователя (пустая строка для гостя)
+function viewerId() {
+    const section = document.getElementById('comments-section');
+    return section ? section.dataset.userId : '';
+}
+
+// Функция для создания элемента ответа
+function createReplyElement(reply) {
+    const div = document.createElement('div');
+    div.className = 'reply-item';
+    div.id = `comment-${reply.id}`;
+
+    // API отдает адрес локального прокси аватаров (/avatar/<id>)
+    const avatarUrl = reply.avatar;
+
+    let deleteBtn = '';
+    if (reply.can_delete) {
+        deleteBtn = `
+        <form action="/delete_comment/${reply.id}" method="POST" class="delete-form" style="display: inline;">
+            <button type="submit" class="action-btn delete-btn" onclick="return confirm('Удалить ответ?')">
+                <i class="fas fa-trash-alt"></i>
+            </button>
+        </form>
+    `;
+    }
+
+    div.innerHTML = `
+    <div class="reply-header">
+        <div class="reply-author-info">
+            <img src="${escapeHtml(avatarUrl)}" alt="${escapeHtml(reply.author)}" class="avatar reply-avatar" width="32" height="32" loading="lazy">
+            <div class="author-details">
+                <div class="author-name">${escapeHtml(reply.author)}</div>
+                <div class="comment-meta">
+                    <span class="comment-time">${escapeHtml(reply.created_at)}</span>
+                </div>
+            </div>
+        </div>
+        <div class="reply-actions">
+            ${deleteBtn}
+        </div>
+    </div>
+    <div class="reply-body">
+        <p>${escapeHtml(reply.text)}</p>
+    </div>
+    <!-- Лайки для ответов отключены (UI убран) -->
+`;
+
+    return div;
+}
+
+// Карточка комментария (та же разметка, что в templates/comment_cards.html)
+function createCommentElement(comment) {
+    const div = document.createElement('div');
+    div.className = 'comment-card fade-in';
+    div.id = `comment-${comment.id}`;
+
+    const own = viewerId() !== '' && String(comment.user_id) === viewerId();
+    const [date, time] = comment.created_at.split(' ');
+    const deleteForm = (extraClass, hidden, confirmText) => `
+            <form action="/delete_comment/${comment.id}" method="POST" class="delete-form ${extraClass}"${hidden}>
+                ${extraClass ? '<input type="hidden" name="admin_mode" value="true">' : ''}
+                <button type="submit" class="action-btn delete-btn" onclick="return confirm('${confirmText}')">
+                    <i class="fas fa-trash-alt"></i>
+                </button>
+            </form>`;
+    const adminHidden = sessionStorage.getItem('isAdminMode') === 'true' ? ' style="display: inline;"' : ' style="display: none;"';
+
+    div.innerHTML = `
+    <div class="comment-header">
+        <div class="comment-author-info">
+            <div class="avatar-wrapper">
+                <img src="${escapeHtml(comment.avatar)}" alt="${escapeHtml(comment.author)}"
+                    class="avatar" width="50" height="50" loading="lazy" decoding="async">
+            </div>
+            <div class="author-details">
+                <div class="author-name">
+                    ${escapeHtml(comment.author)}
+                    ${own ? '<span class="you-badge">Вы</span>' : ''}
+                </div>
+                <div class="comment-meta">
+                    <span class="comment-time">${escapeHtml(date)}</span>
+                    <span class="comment-time-separator">•</span>
+                    <span class="comment-time">${escapeHtml(time)}</span>
+                </div>
+            </div>
+        </div>
+        <div class="comment-actions">
+            ${own ? deleteForm('', '', 'Удалить комментарий?') : ''}
+            ${deleteForm('admin-delete-form', adminHidden, 'Удалить комментарий (режим админа)?')}
+        </div>
+    </div>
+    <div class="comment-body">
+        <p>${escapeHtml(comment.text)}</p>
+    </div>
+    <div class="comment-footer">
+        <button class="like-btn" onclick="toggleLike(${comment.id})">
+            <i class="far fa-heart"></i>
+            <span class="like-count" data-comment-id="${comment.id}">${comment.likes_count}</span>
+        </button>
+        <button class="toggle-replies-btn" onclick="toggleReplies(${comment.id})">
+            <i class="fas fa-comments"></i> <span class="replies-count"
+                data-comment-id="${comment.id}">${comment.replies_count}</span>
+        </button>
+    </div>
+    <div class="replies-section" id="replies-${comment.id}" style="display: none;">
+        <div class="replies-container" id="replies-list-${comment.id}"></div>
+        ${isAuthenticated() ? `
+        <div class="reply-form-container">
+            <form class="reply-form" onsubmit="submitReply(event, ${comment.id})">
+                <textarea name="text" placeholder="Напишите ответ..." rows="2" required></textarea>
+                <button type="submit" class="btn-primary btn-small">Ответить</button>
+            </form>
+        </div>` : ''}
+    </div>
+`;
+    return div;
+}
+
+// Вставляет новый комментарий в начало списка (если его там еще нет)
+function insertComment(comment) {
+    if (document.getElementById(`comment-${comment.id}`)) return;
+
+    const list = document.querySelector('.comments-list');
+    if (!list) return;
+    const emptyState = list.querySelector('.empty-state');
+    if (emptyState) emptyState.remove();
+    list.prepend(createCommentElement(comment));
+
+    const total = document.getElementById('comments-total');
+    if (total) total.textContent = parseInt(total.textContent) + 1;
+}
+
+function setLikeState(commentId, likesCount, liked) {
+    const likeCount = document.querySelector(`.like-count[data-comment-id="${commentId}"]`);
+    if (!likeCount) return;
+    likeCount.textContent = likesCount;
+    if (liked === undefined) return;
+
+    const likeBtn = likeCount.closest('.like-btn');
+    likeBtn.classList.toggle('liked', liked);
+    const icon = likeBtn.querySelector('i');
+    if (icon) {
+        icon.classList.toggle('fas', liked);
+        icon.classList.toggle('far', !liked);
+    }
+}
+
+function setRepliesCount(commentId, count) {
+    const repliesCount = document.querySelector(`.replies-count[data-comment-id="${commentId}"]`);
+    if (repliesCount && count !== null && count !== undefined) repliesCount.textContent = count;
+}
+
+// Изменения от других вкладок и пользователей (см. /api/comments/<page>/stream)
+const streamHandlers = {
+    comment(data) {
+        insertComment(data);
+    },
+    reply(data) {
+        setRepliesCount(data.parent_id, data.parent_replies_count);
+        // Ответ добавляем, только если ветка уже загружена
+        const repliesList = document.getElementById(`replies-list-${data.parent_id}`);
+        if (!repliesList || repliesList.childElementCount === 0) return;
+        if (document.getElementById(`comment-${data.id}`)) return;
+
+        const noReplies = repliesList.querySelector('.no-replies');
+        if (noReplies) noReplies.remove();
+        const reply = { ...data, can_delete: viewerId() !== '' && String(data.user_id) === viewerId() };
+        const moreBtn = repliesList.querySelector('.load-more-replies');
+        // Пока есть "Показать ещё", новый ответ придет со следующей страницей
+        if (!moreBtn) repliesList.appendChild(createReplyElement(reply));
+    },
+    like(data) {
+        const own = viewerId() !== '' && String(data.user_id) === viewerId();
+        setLikeState(data.id, data.likes_count, own ? data.liked : undefined);
+    },
+    delete(data) {
+        const element = document.getElementById(`comment-${data.id}`);
+        if (element) element.remove();
+        if (data.parent_id) {
+            setRepliesCount(data.parent_id, data.replies_count);
+        } else {
+            const total = document.getElementById('comments-total');
+            if (total) total.textContent = Math.max(0, parseInt(total.textContent) - 1);
+        }
+    },
+    reset() {
+        // Часть событий потеряна - перечитываем счетчики одним запросом
+        refreshSummary();
+    }
+};
+
+function connectCommentStream() {
+    const section = document.getElementById('comments-section');
+    if (!section || !('EventSource' in window)) return;
+
+    // EventSource сам переподключается и передает Last-Event-ID
+    const source = new EventSource(`/api/comments/${encodeURIComponent(section.dataset.page)}/stream`);
+    Object.entries(streamHandlers).forEach(([type, handler]) => {
+        source.addEventListener(type, event => handler(JSON.parse(event.data)));
+    });
+}
+
+// Отправка комментария без перезагрузки страницы
+function submitComment(event) {
+    event.preventDefault();
+    const form = event.target;
+
+    fetch(form.action, {
+        method: 'POST',
+        body: new FormData(form),
+        credentials: 'same-origin',
+        headers: { 'Accept': 'application/json' }
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                insertComment(data.comment);
+                clearForm();
+            } else {
+                alert('Ошибка: ' + (data.error || 'Не удалось добавить комментарий'));
+            }
+        })
+        .catch(error => {
+            console.error('Ошибка при добавлении комментария:', error);
+            alert('Ошибка при добавлении комментария');
+        });
+}
+
+// Проверяем режим админа при загрузке страницы комментариев
+document.addEventListener('DOMContentLoaded', function () {
+    const isAdminMode = sessionStorage.getItem('isAdminMode') === 'true';
+    if (isAdminMode) {
+        // Показываем скрытые кнопки удаления админа
+        const adminDeleteForms = document.querySelectorAll('.admin-delete-form');
+        adminDeleteForms.forEach(form => {
+            form.style.display = 'inline';
+        });
+        console.log('✅ Админ-режим: кнопки удаления активны для всех комментариев');
+    }
+
+    // Бесконечная прокрутка: подгружаем следующую страницу, когда маркер виден
+    const sentinel = document.getElementById('comments-sentinel');
+    if (sentinel && 'IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadMoreComments(observer);
+            }
+        }, { rootMargin: '400px' });
+        observer.observe(sentinel);
+    }
+
+    const commentForm = document.getElementById('commentForm');
+    if (commentForm) commentForm.addEventListener('submit', submitComment);
+
+    connectCommentStream();
+});
+
+// Обновляет счетчики всех карточек одним запросом к сводке страницы
+function refreshSummary() {
+    const ids = Array.from(document.querySelectorAll('.comment-card'))
+        .map(card => card.id.replace('comment-', ''))
+        .filter(Boolean);
+    if (ids.length === 0) return;
+
+    // Сводка принимает ограниченное число id, поэтому запрашиваем частями
+    for (let i = 0; i < ids.length; i += 100) {
+        const chunk = ids.slice(i, i + 100);
+        fetchWithValidators(`/api/comments/comments/summary?ids=${chunk.join(',')}`)
+            .then(({ data: summaries }) => {
+                Object.entries(summaries).forEach(([commentId, summary]) => {
+                    const likeCount = document.querySelector(`.like-count[data-comment-id="${commentId}"]`);
+                    if (likeCount) {
+                        likeCount.textContent = summary.likes_count;
+                        const likeBtn = likeCount.closest('.like-btn');
+                        likeBtn.classList.toggle('liked', summary.user_liked);
+                        const icon = likeBtn.querySelector('i');
+                        if (icon) {
+                            icon.classList.toggle('fas', summary.user_liked);
+                            icon.classList.toggle('far', !summary.user_liked);
+                        }
+                    }
+                    const repliesCount = document.querySelector(`.replies-count[data-comment-id="${commentId}"]`);
+                    if (repliesCount) repliesCount.textContent = summary.replies_count;
+                });
+            })
+            .catch(error => console.error('Ошибка при обновлении счетчиков:', error));
+    }
+}
+
+// При возврате на страницу из кэша браузера счетчики могли устареть
+window.addEventListener('pageshow', function (event) {
+    if (event.persisted) refreshSummary();
+});
+
+// Подгрузка следующей страницы комментариев
+let commentsLoading = false;
+function loadMoreComments(observer) {
+    const sentinel = document.getElementById('comments-sentinel');
+    const cursor = sentinel.dataset.nextCursor;
+    if (!cursor || commentsLoading) {
+        if (!cursor) observer.disconnect();
+        return;
+    }
+
+    commentsLoading = true;
+    const indicator = document.getElementById('comments-loading');
+    indicator.classList.add('active');
+
+    fetch(`/comments/more?cursor=${encodeURIComponent(cursor)}`, { credentials: 'same-origin' })
+        .then(response => {
+            sentinel.dataset.nextCursor = response.headers.get('X-Next-Cursor') || '';
+            return response.text();
+        })
+        .then(html => {
+            const template = document.createElement('template');
+            template.innerHTML = html;
+            const cards = Array.from(template.content.querySelectorAll('.comment-card'));
+            document.querySelector('.comments-list').append(...cards);
+
+            if (sessionStorage.getItem('isAdminMode') === 'true') {
+                cards.forEach(card => {
+                    card.querySelectorAll('.admin-delete-form').forEach(form => form.style.display = 'inline');
+                });
+            }
+        })
+        .catch(error => console.error('Ошибка при загрузке комментариев:', error))
+        .finally(() => {
+            commentsLoading = false;
+            indicator.classList.remove('active');
+            if (!sentinel.dataset.nextCursor) observer.disconnect();
+        });
+}
+
+// Очистить форму комментария
+function clearForm() {
+    const form = document.getElementById('commentForm');
+    if (form) {
+        form.reset();
+    }
+
+    // Сброс превью ответа
+    const replyPreview = document.getElementById('replyPreview');
+    if (replyPreview) {
+        replyPreview.style.display = 'none';
+        const replyTo = replyPreview.querySelector('.reply-to');
+        if (replyTo) replyTo.textContent = '';
+    }
+
+    // Сброс счётчика символов
+    const charCount = document.getElementById('charCount');
+    if (charCount) charCount.textContent = '0/1000';
+
+    // Вернуть фокус в поле ввода
+    const textarea = document.getElementById('commentTextarea');
+    if (textarea) {
+        textarea.style.height = '';
+        textarea.focus();
+    }
+}
+
+// Отмена режима ответа (тот же эффект, что и кнопка закрытия превью)
+function cancelReply() {
+    const replyPreview = document.getElementById('replyPreview');
+    if (replyPreview) {
+        replyPreview.style.display = 'none';
+        const replyTo = replyPreview.querySelector('.reply-to');
+        if (replyTo) replyTo.textContent = '';
+    }
+    const parentInput = document.querySelector('input[name="parent_id"]');
+    if (parentInput) parentInput.value = '';
+}
+
+// Отправка ответа через AJAX
+function submitReply(event, parentId) {
+    event.preventDefault();
+
+    const form = event.target;
+    const textarea = form.querySelector('textarea');
+    const text = textarea.value.trim();
+
+    if (!text) {
+        alert('Ответ не может быть пустым');
+        return;
+    }
+
+    const formData = new FormData();
+    formData.append('text', text);
+    formData.append('page', 'comments');
+
+    fetch(`/add_reply/${parentId}`, {
+        method: 'POST',
+        body: formData,
+        credentials: 'same-origin'
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                // Очищаем поле
+                textarea.value = '';
+                textarea.style.height = '';
+
+                // Добавляем новый ответ в список
+                // Ответ мог уже прийти через поток событий
+                const replyList = document.getElementById(`replies-list-${parentId}`);
+                if (replyList && !document.getElementById(`comment-${data.reply.id}`)) {
+                    const replyEl = createReplyElement(data.reply);
+
+                    // Если был текст "Пока нет ответов", удаляем его
+                    const noReplies = replyList.querySelector('.no-replies');
+                    if (noReplies) noReplies.remove();
+
+                    replyList.appendChild(replyEl);
+                }
+
+                // Обновляем счётчик ответов
+                setRepliesCount(parentId, data.parent_replies_count);
+
+                console.log('✅ Ответ добавлен успешно');
+            } else {
+                alert('Ошибка: ' + (data.error || 'Не удалось добавить ответ'));
+            }
+        })
+        .catch(error => {
+            console.error('Ошибка при добавлении ответа:', error);
+            alert('Ошибка при добавлении ответа');
+        });
+}
+
+// Автоизменение высоты textarea
+function autoResize(el) {
+    if (!el) return;
+    el.style.height = 'auto';
+    el.style.height = (el.scrollHeight) + 'px';
+    const charCount = document.getElementById('charCount');
+    if (charCount) {
+        const max = 1000;
+        const len = el.value.length;
+        charCount.textContent = `${len}/${max}`;
+    }
+}
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка переключения лайка на одном "горячем" комментарии.
+
+Несколько потоков одновременно шлют POST /api/comment/<id>/like, причем на каждого
+пользователя приходится по несколько потоков (имитация двойного клика). После прогона
+проверяется, что ни один запрос не упал и счетчик likes_count точно равен числу строк
+в таблице лайков. Дополнительно выводится число SQL-запросов на одно переключение.
+
+По умолчанию используется временная база SQLite; для Postgres передайте --database-url.
+
+Запуск: python stress_likes.py [--users 8] [--threads-per-user 2] [--ops 100]
+                               [--database-url postgresql://...]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_app(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    # Проверяется сама запись: лимиты частоты (src/ratelimit.py) здесь мешают
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    os.environ.setdefault('JINJA_BYTECODE_CACHE_DIR', '')
+    sys.path.insert(0, PROJECT_ROOT)
+    from src.web import create_app
+    return create_app()
+
+
+def setup(app, users):
+    """Пользователи и один комментарий, который все лайкают"""
+    from src.web import db
+    from src.dp import Comment, User, init_db
+
+    init_db(app)
+    with app.app_context():
+        stamp = int(time.time() * 1000)
+        people = [User(nickname=f'hot{i}', email=f'hot{stamp}-{i}@example.com') for i in range(users)]
+        db.session.add_all(people)
+        db.session.flush()
+        comment = Comment(text='Горячий комментарий', user_id=people[0].id)
+        db.session.add(comment)
+        db.session.commit()
+        return [u.id for u in people], comment.id
+
+
+def statements_per_toggle(app, user_id, comment_id):
+    """Число SQL-запросов одного переключения (без COMMIT)"""
+    from sqlalchemy import event
+    from src.web import db
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    # Прогрев: снимок пользователя попадает в кэш и не учитывается в замере
+    client.post(f'/api/comment/{comment_id}/like')
+    client.post(f'/api/comment/{comment_id}/like')
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        client.post(f'/api/comment/{comment_id}/like')
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    # Возвращаем лайк в исходное состояние
+    client.post(f'/api/comment/{comment_id}/like')
+    return len(statements)
+
+
+def hammer(app, user_ids, comment_id, threads_per_user, ops):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(len(user_ids) * threads_per_user)
+
+    def clicker(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+        start.wait()
+        for _ in range(ops):
+            started = time.perf_counter()
+            try:
+                status = client.post(f'/api/comment/{comment_id}/like').status_code
+            except Exception as e:  # ошибка БД внутри обработчика
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=clicker, args=(user_id,))
+               for user_id in user_ids for _ in range(threads_per_user)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def check(app, comment_id):
+    from sqlalchemy import func
+    from src.web import db
+    from src.dp import Comment, Like
+
+    with app.app_context():
+        counted = db.session.query(Comment.likes_count).filter_by(id=comment_id).scalar()
+        actual = db.session.query(func.count(Like.id)).filter_by(comment_id=comment_id).scalar()
+        return counted, actual
+
+
+def main(args):
+    app = load_app(args.database_url)
+    user_ids, comment_id = setup(app, args.users)
+    statements = statements_per_toggle(app, user_ids[0], comment_id)
+
+    latencies, errors, duration = hammer(app, user_ids, comment_id, args.threads_per_user, args.ops)
+    latencies.sort()
+    counted, actual = check(app, comment_id)
+    result = {
+        'ok': len(latencies),
+        'errors': len(errors),
+        'error_kinds': sorted(set(map(str, errors))),
+        'ops_per_sec': round(len(latencies) / duration, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+        'statements_per_toggle': statements,
+        'likes_count': counted,
+        'likes_rows': actual,
+    }
+    print(f"[INFO] {json.dumps(result)}")
+
+    if errors or counted != actual:
+        print(f"[ERROR] Ошибок: {len(errors)}, счетчик {counted}, строк лайков {actual}")
+        return 1
+    print("[INFO] Счетчик лайков сошелся, ошибок нет")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Конкурентное переключение лайка одного комментария')
+    parser.add_argument('--users', type=int, default=8, help='Пользователей')
+    parser.add_argument('--threads-per-user', type=int, default=2, help='Потоков на пользователя (двойной клик)')
+    parser.add_argument('--ops', type=int, default=100, help='Запросов на поток')
+    parser.add_argument('--database-url', help='База для проверки (по умолчанию временная SQLite)')
+    args = parser.parse_args()
+
+    if args.database_url:
+        sys.exit(main(args))
+    with tempfile.TemporaryDirectory() as tmp:
+        args.database_url = f"sqlite:///{os.path.join(tmp, 'stress.db')}"
+        sys.exit(main(args))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка записи в SQLite: несколько потоков одновременно ставят и снимают
+лайки через POST /api/comment/<id>/like.
+
+Каждый профиль запускается в отдельном процессе на временной базе:
+  tuned   - настройки из src/db_config.py (WAL, busy_timeout, BEGIN IMMEDIATE для записи)
+  default - параметры драйвера по умолчанию (DB_ENGINE_TUNING=0)
+
+Выводит пропускную способность, задержки и число ошибок ("database is locked"),
+а также проверяет, что счетчики лайков сошлись с таблицей лайков.
+
+Запуск: python stress_sqlite.py [--threads 8] [--ops 200] [--comments 5] [--profile both]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_app():
+    sys.path.insert(0, PROJECT_ROOT)
+    from src.web import create_app
+    return create_app()
+
+
+def run_setup(args):
+    """Схема и данные: по пользователю на каждый поток каждого процесса"""
+    from src.web import db
+    from src.dp import Comment, User, init_db
+
+    app = load_app()
+    init_db(app)
+    with app.app_context():
+        users = [User(nickname=f'stress{i}', email=f'stress{i}@example.com')
+                 for i in range(args.threads * args.processes)]
+        db.session.add_all(users)
+        db.session.flush()
+        comments = [Comment(text=f'Комментарий {i}', user_id=users[0].id) for i in range(args.comments)]
+        db.session.add_all(comments)
+        db.session.commit()
+        return {'user_ids': [u.id for u in users], 'comment_ids': [c.id for c in comments]}
+
+
+def run_worker(args):
+    """Один процесс с несколькими пишущими потоками; старт по общему времени args.start_at"""
+    app = load_app()
+    user_ids = [int(i) for i in args.user_ids.split(',')]
+    comment_ids = [int(i) for i in args.comment_ids.split(',')]
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def writer(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+        rng = random.Random(user_id)
+        time.sleep(max(0, args.start_at - time.time()))
+        for _ in range(args.ops):
+            started = time.perf_counter()
+            try:
+                status = client.post(f'/api/comment/{rng.choice(comment_ids)}/like').status_code
+            except Exception as e:  # ошибка БД внутри обработчика
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=writer, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'latencies': latencies, 'errors': len(errors), 'finished_at': time.time()}
+
+
+def check_counters():
+    from sqlalchemy import func
+    from src.web import db
+    from src.dp import Comment, Like
+
+    with load_app().app_context():
+        counted = db.session.query(func.coalesce(func.sum(Comment.likes_count), 0)).scalar()
+        actual = db.session.query(func.count(Like.id)).scalar()
+        return {'consistent': counted == actual}
+
+
+def run_step(step, env, extra=()):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--step', step, *extra],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'stress.db')}"
+        env['DB_ENGINE_TUNING'] = '1' if profile == 'tuned' else '0'
+        env['JINJA_BYTECODE_CACHE_DIR'] = ''
+        common = ['--threads', str(args.threads), '--ops', str(args.ops),
+                  '--comments', str(args.comments), '--processes', str(args.processes)]
+        data = run_step('setup', env, common)
+
+        # Процессы стартуют одновременно, когда все успели импортировать приложение
+        start_at = time.time() + 5
+        per_process = len(data['user_ids']) // args.processes
+        workers = [
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--step', 'worker', *common,
+                 '--start-at', str(start_at),
+                 '--user-ids', ','.join(map(str, data['user_ids'][i * per_process:(i + 1) * per_process])),
+                 '--comment-ids', ','.join(map(str, data['comment_ids']))],
+                env=env, stdout=subprocess.PIPE, text=True
+            )
+            for i in range(args.processes)
+        ]
+        results = [json.loads(w.communicate()[0].strip().splitlines()[-1]) for w in workers]
+
+        latencies = sorted(l for r in results for l in r['latencies'])
+        duration = max(r['finished_at'] for r in results) - start_at
+        return {
+            'ok': len(latencies),
+            'errors': sum(r['errors'] for r in results),
+            'ops_per_sec': round(len(latencies) / duration, 1),
+            'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+            'counters_consistent': run_step('check', env)['consistent'],
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Конкурентная запись лайков в SQLite')
+    parser.add_argument('--threads', type=int, default=8, help='Количество пишущих потоков')
+    parser.add_argument('--ops', type=int, default=200, help='Запросов на поток')
+    parser.add_argument('--comments', type=int, default=5, help='Комментариев (меньше - выше конкуренция)')
+    parser.add_argument('--processes', type=int, default=1, help='Процессов, в каждом --threads потоков')
+    parser.add_argument('--profile', choices=['both', 'tuned', 'default'], default='both')
+    # Служебные параметры для дочерних процессов
+    parser.add_argument('--step', choices=['setup', 'worker', 'check'], help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--user-ids', help=argparse.SUPPRESS)
+    parser.add_argument('--comment-ids', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.step:
+        steps = {'setup': run_setup, 'worker': run_worker, 'check': lambda _: check_counters()}
+        print(json.dumps(steps[args.step](args)))
+        sys.exit(0)
+
+    profiles = ['default', 'tuned'] if args.profile == 'both' else [args.profile]
+    print(f"[INFO] Процессов: {args.processes}, потоков в процессе: {args.threads}, "
+          f"запросов на поток: {args.ops}, комментариев: {args.comments}")
+    for profile in profiles:
+        print(f"[INFO] {profile}: {json.dumps(run_profile(profile, args))}")
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Задержка чтения во время потока записей: проверка лимитов частоты (src/ratelimit.py).
+
+Сервер (многопоточный werkzeug) запускается в отдельном процессе на временной
+SQLite-базе с синтетическими данными. Читатели без авторизации запрашивают список
+комментариев и ответы, сначала одни (базовая линия), затем вместе с писателями,
+которые с заданной общей частотой шлют лайки и ответы от нескольких пользователей
+с одного IP. Чтение во время потока замеряется после разгона (--warmup), когда
+запас лимитов уже исчерпан и поток упирается в них.
+Прогон повторяется с выключенными и включенными лимитами.
+
+Проверка проходит, если с лимитами медиана чтения во время потока записей выросла
+не больше чем на --threshold относительно базовой линии (или не больше чем на
+--min-delta-ms), p95 с лимитами ниже, чем без них, а отклоненные записи получили
+429 с Retry-After. Хвост (p95) с лимитами тоже растет: отклоненные запросы дешевы,
+но делят процессор с чтением (лимит частоты не защищает от объема запросов как такового).
+
+Запуск: python stress_writes.py [--duration 5] [--readers 4] [--writers 8] [--write-rate 50]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def serve(args):
+    """Дочерний процесс: база, сервер; печатает порт, cookie писателей и id комментариев"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(args.tmp, 'stress.db')}"
+    os.environ.setdefault('JINJA_BYTECODE_CACHE_DIR', '')
+    sys.path.insert(0, PROJECT_ROOT)
+    from flask_migrate import upgrade
+    from werkzeug.serving import make_server
+    from src.web import create_app, db
+    from src.bulk import import_records, synthetic_records
+    from src.dp import Comment
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
+        import_records(synthetic_records(50, 300, seed=42))
+        top = [i for (i,) in db.session.query(Comment.id).filter(Comment.parent_id.is_(None))
+               .order_by(Comment.id.desc()).limit(20)]
+
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config.get('SESSION_COOKIE_NAME', 'session')
+    cookies = [f'{cookie_name}={serializer.dumps({"user_id": user_id})}' for user_id in range(1, args.users + 1)]
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    print(json.dumps({'port': server.server_port, 'cookies': cookies, 'top': top}), flush=True)
+    server.serve_forever()
+
+
+def request(port, method, url, headers=None, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        connection.request(method, url, body=body, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.getheader('Retry-After')
+    finally:
+        connection.close()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))] if values else None
+
+
+def read_phase(port, top, readers, duration):
+    """Задержки чтения за duration секунд"""
+    latencies, lock, stop = [], threading.Lock(), threading.Event()
+    urls = ['/api/comments/comments'] + [f'/api/comment/{i}/replies' for i in top[:5]]
+
+    def reader():
+        local = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            request(port, 'GET', random.choice(urls))
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    ms = lambda value: round(value * 1000, 2)
+    return {
+        'reads': len(latencies),
+        'reads_per_sec': round(len(latencies) / duration, 1),
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+    }
+
+
+def flood(args):
+    """Дочерний процесс: писатели с общей частотой --write-rate шлют лайки и ответы
+    вперемешку --duration секунд; печатает число ответов по кодам"""
+    info = json.loads(sys.stdin.readline())
+    port, cookies, top = info['port'], info['cookies'], info['top']
+    statuses, lock = {}, threading.Lock()
+    interval = args.writers / args.write_rate
+    finish = time.perf_counter() + args.duration
+
+    def writer(cookie):
+        local, deadline = {}, time.perf_counter()
+        while deadline < finish:
+            deadline += interval
+            pause = deadline - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+            comment_id = random.choice(top)
+            if random.random() < 0.5:
+                status, retry_after = request(port, 'POST', f'/api/comment/{comment_id}/like',
+                                              {'Cookie': cookie})
+            else:
+                status, retry_after = request(
+                    port, 'POST', f'/add_reply/{comment_id}',
+                    {'Cookie': cookie, 'Content-Type': 'application/x-www-form-urlencoded'},
+                    urlencode({'text': 'Ответ из нагрузки', 'page': 'comments'})
+                )
+            key = '429_without_retry_after' if status == 429 and not retry_after else str(status)
+            local[key] = local.get(key, 0) + 1
+        with lock:
+            for key, value in local.items():
+                statuses[key] = statuses.get(key, 0) + value
+
+    threads = [threading.Thread(target=writer, args=(cookies[i % len(cookies)],)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps(statuses), flush=True)
+
+
+def spawn(*arguments, env=None):
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), *arguments], env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+
+def run_once(args, limits_enabled):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, RATE_LIMIT_ENABLED='1' if limits_enabled else '0')
+        server = spawn('--serve', '--tmp', tmp, '--users', str(args.users), env=env)
+        try:
+            line = server.stdout.readline()
+            info = json.loads(line)
+            port, top = info['port'], info['top']
+            # Прогрев: кэши, шаблоны, соединения
+            read_phase(port, top, args.readers, 1)
+            baseline = read_phase(port, top, args.readers, args.duration)
+
+            # Писатели в своем процессе, чтобы не делить GIL с читателями; чтение
+            # замеряется после --warmup секунд потока, когда запас лимитов исчерпан
+            writers = spawn('--flood', '--duration', str(args.warmup + args.duration),
+                            '--writers', str(args.writers), '--write-rate', str(args.write_rate))
+            writers.stdin.write(line)
+            writers.stdin.flush()
+            time.sleep(args.warmup)
+            flooded = read_phase(port, top, args.readers, args.duration)
+            statuses = json.loads(writers.communicate()[0])
+        finally:
+            server.terminate()
+            server.wait()
+    return {'baseline': baseline, 'flood': flooded, 'writes': statuses}
+
+
+def main(args):
+    results = {}
+    for enabled in (False, True):
+        name = 'limits_on' if enabled else 'limits_off'
+        print(f"[INFO] Прогон {name}...", file=sys.stderr)
+        results[name] = run_once(args, enabled)
+
+    print(f"\n  {'прогон':<12}{'фаза':<10}{'чтений/с':>10}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}  записи")
+    for name, result in results.items():
+        for phase in ('baseline', 'flood'):
+            m = result[phase]
+            writes = json.dumps(result['writes'], sort_keys=True) if phase == 'flood' else ''
+            print(f"  {name:<12}{phase:<10}{m['reads_per_sec']:>10}{m['p50_ms']:>9}{m['p95_ms']:>9}{m['p99_ms']:>9}  {writes}")
+    print(f"[INFO] {json.dumps(results)}")
+
+    limited, unlimited = results['limits_on'], results['limits_off']
+    before, after = limited['baseline']['p50_ms'], limited['flood']['p50_ms']
+    failures = []
+    if after > before * (1 + args.threshold) and after - before > args.min_delta_ms:
+        failures.append(f"медиана чтения с лимитами выросла: {before} -> {after} мс")
+    if limited['flood']['p95_ms'] >= unlimited['flood']['p95_ms']:
+        failures.append(f"p95 чтения с лимитами не ниже, чем без них: "
+                        f"{limited['flood']['p95_ms']} и {unlimited['flood']['p95_ms']} мс")
+    if not limited['writes'].get('429'):
+        failures.append("ни одна запись не получила 429")
+    if limited['writes'].get('429_without_retry_after'):
+        failures.append("429 без Retry-After")
+    for failure in failures:
+        print(f"[ERROR] {failure}")
+    if failures:
+        return 1
+    print(f"[INFO] С лимитами медиана чтения во время потока записей: {before} -> {after} мс "
+          f"(без лимитов {unlimited['baseline']['p50_ms']} -> {unlimited['flood']['p50_ms']} мс)")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Задержка чтения во время потока записей')
+    parser.add_argument('--duration', type=float, default=5, help='Секунд на фазу')
+    parser.add_argument('--readers', type=int, default=4, help='Потоков чтения')
+    parser.add_argument('--writers', type=int, default=8, help='Потоков записи')
+    parser.add_argument('--users', type=int, default=4, help='Пользователей-писателей')
+    parser.add_argument('--write-rate', type=float, default=50, help='Записей в секунду от всех писателей')
+    parser.add_argument('--warmup', type=float, default=6, help='Секунд потока записей до замера чтения')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Допустимый рост медианы чтения с лимитами (доля)')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help='Рост медианы меньше этого не считается')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--flood', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--tmp', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+    elif args.flood:
+        flood(args)
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,174 @@
+"""
+Общие фикстуры тестов: приложение на временной SQLite-базе со схемой последней миграции.
+
+Запуск: python -m pytest
+"""
+import os
+import sys
+import threading
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Добавляем корневую директорию в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_migrate import upgrade
+from sqlalchemy import event
+
+from src.web import create_app, db
+from src.dp import User
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Фабрика приложений: create_app(config) на отдельной базе в tmp_path, схема - upgrade().
+
+    Сервисы (лимиты частоты, OAuth, аватары) настраиваются из окружения: переменные
+    передаются именованными аргументами и действуют до конца теста.
+    """
+    apps = []
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', '0')
+    monkeypatch.setenv('AVATAR_CACHE_DIR', str(tmp_path / 'avatars'))
+
+    def make(config=None, **env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, str(value))
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / f'site{len(apps)}.db'}",
+            'JINJA_BYTECODE_CACHE_DIR': '',
+            **(config or {})
+        })
+        with app.app_context():
+            upgrade()
+        apps.append(app)
+        return app
+
+    yield make
+
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user():
+    """make_user(app, **поля) - пользователь в базе приложения; возвращает id"""
+    def make_user(app, **fields):
+        with app.app_context():
+            user = User(**fields)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make_user
+
+
+@pytest.fixture
+def login():
+    """login(client, user_id) - сессия тестового клиента от имени пользователя"""
+    def login(client, user_id):
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+    return login
+
+
+class StatementCounter:
+    """Число SQL-запросов к движку приложения внутри блока with"""
+
+    def __init__(self, app):
+        with app.app_context():
+            self.engine = db.engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@pytest.fixture
+def count_statements():
+    return StatementCounter
+
+
+StubRequest = namedtuple('StubRequest', ['method', 'path', 'headers', 'body', 'client_address'])
+
+
+class StubServer:
+    """HTTP-заглушка внешнего сервиса (провайдер OAuth, хостинг аватаров) в отдельном потоке.
+
+    Маршрут (метод, путь) -> функция(StubRequest), возвращающая (статус, заголовки, тело).
+    Соединения keep-alive (HTTP/1.1); все запросы сохраняются в requests.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                path = self.path.split('?', 1)[0]
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                request = StubRequest(self.command, path, dict(self.headers), body, self.client_address)
+                stub.requests.append(request)
+                route = stub.routes.get((self.command, path))
+                status, headers, payload = route(request) if route else (404, {}, b'')
+                if isinstance(payload, str):
+                    payload = payload.encode()
+                try:
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент не дождался ответа (таймаут чтения)
+                    self.close_connection = True
+
+            do_GET = do_POST = _handle
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+
+    def route(self, method, path, handler):
+        self.routes[(method, path)] = handler
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server.server_port}{path}'
+
+    def hits(self, method, path):
+        return [request for request in self.requests if (request.method, request.path) == (method, path)]
+
+
+@pytest.fixture
+def stub_server():
+    stub = StubServer()
+    stub.thread.start()
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
@@ -0,0 +1,102 @@
+"""
+Прокси аватаров (/avatar/<user_id>) и дисковый кэш AvatarCache против локальной
+HTTP-заглушки вместо Яндекса/Google.
+"""
+import io
+import os
+import threading
+import time
+
+from PIL import Image
+
+from src.avatars import AvatarCache
+
+
+def png(color=(200, 40, 40), size=(120, 80)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def serve_image(stub_server, path, delay=0.0):
+    """Картинка по пути path; delay - задержка ответа в секундах"""
+    data = png()
+
+    def handler(request):
+        time.sleep(delay)
+        return 200, {'Content-Type': 'image/png'}, data
+
+    stub_server.route('GET', path, handler)
+    return stub_server.url(path)
+
+
+def test_concurrent_requests_fetch_upstream_once(app, make_user, stub_server):
+    user_id = make_user(app, avatar=serve_image(stub_server, '/avatar.png', delay=0.3))
+    statuses = []
+
+    def fetch():
+        statuses.append(app.test_client().get(f'/avatar/{user_id}').status_code)
+
+    threads = [threading.Thread(target=fetch) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * 5
+
+    # Следующие запросы отдаются с диска
+    assert app.test_client().get(f'/avatar/{user_id}').status_code == 200
+    assert len(stub_server.hits('GET', '/avatar.png')) == 1
+
+
+def test_etag_and_not_modified(app, make_user, stub_server):
+    user_id = make_user(app, avatar=serve_image(stub_server, '/avatar.png'))
+    client = app.test_client()
+
+    response = client.get(f'/avatar/{user_id}')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    etag = response.headers['ETag']
+
+    response = client.get(f'/avatar/{user_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert len(stub_server.hits('GET', '/avatar.png')) == 1
+
+
+def test_timeout_falls_back_to_default_avatar(make_app, make_user, stub_server):
+    app = make_app(AVATAR_FETCH_TIMEOUT=0.2)
+    user_id = make_user(app, avatar=serve_image(stub_server, '/slow.png', delay=1))
+    client = app.test_client()
+
+    started = time.monotonic()
+    response = client.get(f'/avatar/{user_id}')
+    assert time.monotonic() - started < 1
+    assert response.status_code == 200
+    with open(app.extensions['site'].avatar_cache.default(), 'rb') as f:
+        assert response.data == f.read()
+
+    # После сбоя источник какое-то время не запрашивается снова
+    assert client.get(f'/avatar/{user_id}').status_code == 200
+    assert len(stub_server.hits('GET', '/slow.png')) == 1
+
+
+def test_eviction_removes_least_recently_used(tmp_path, stub_server):
+    cache = AvatarCache(str(tmp_path / 'avatars'))
+    first, second, third = (serve_image(stub_server, f'/{name}.png') for name in ('first', 'second', 'third'))
+
+    first_path = cache.get(first)
+    # Одинаковые картинки - одинаковый размер файлов: в кэш помещаются два из трех
+    cache.max_bytes = os.path.getsize(first_path) * 5 // 2
+    # Время обращения - mtime файла; пауза больше его разрешения
+    time.sleep(0.05)
+    second_path = cache.get(second)
+    time.sleep(0.05)
+    assert cache.get(first) == first_path  # обращение делает first самым свежим
+    time.sleep(0.05)
+    third_path = cache.get(third)
+
+    assert os.path.exists(first_path)
+    assert not os.path.exists(second_path)
+    assert os.path.exists(third_path)
+    assert len(stub_server.hits('GET', '/first.png')) == 1
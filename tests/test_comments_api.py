@@ -0,0 +1,61 @@
+"""
+JSON API списков комментариев: число SQL-запросов не зависит от числа комментариев
+(авторы, счетчики и лайки зрителя выбираются пакетно, без N+1).
+"""
+import pytest
+
+from src.web import db
+from src.dp import Comment, Like, User
+
+N = 5
+
+
+def seed(app, n):
+    """n основных комментариев и n ответов на первый комментарий, у каждого свой автор;
+    зритель (первый пользователь) лайкнул каждый. Возвращает (id зрителя, id корня ветки)."""
+    with app.app_context():
+        users = [User(nickname=f'Автор {i}', email=f'author{i}@example.com') for i in range(n + 1)]
+        db.session.add_all(users)
+        db.session.flush()
+        viewer = users[0]
+
+        root = Comment(text='Корень ветки', page='comments', user_id=viewer.id, replies_count=n)
+        db.session.add(root)
+        db.session.flush()
+        comments = [Comment(text=f'Комментарий {i}', page='comments', user_id=users[i + 1].id, likes_count=1)
+                    for i in range(n - 1)]
+        replies = [Comment(text=f'Ответ {i}', page='comments', user_id=users[i + 1].id, parent_id=root.id,
+                           likes_count=1) for i in range(n)]
+        db.session.add_all(comments + replies)
+        db.session.flush()
+        db.session.add_all(Like(comment_id=comment.id, user_id=viewer.id) for comment in comments + replies)
+        db.session.commit()
+        return viewer.id, root.id
+
+
+def listing_statements(make_app, login, count_statements, n, url, rows):
+    """Число запросов для первого (не из кэша) запроса списка из rows * n комментариев"""
+    app = make_app()
+    viewer_id, root_id = seed(app, n)
+    client = app.test_client()
+    login(client, viewer_id)
+
+    with count_statements(app) as counter:
+        response = client.get(url.format(root=root_id))
+    assert response.status_code == 200
+    items = response.get_json()
+    assert len(items) == rows * n
+    assert all(item['user_liked'] for item in items if item['id'] != root_id)
+    return counter.count
+
+
+@pytest.mark.parametrize('url, rows, statements', [
+    # BEGIN, зритель, версия области, строки с авторами, лайки зрителя.
+    # Список страницы - все ее комментарии, включая ответы
+    ('/api/comments/comments?limit=100', 2, 5),
+    # То же и проверка, что родитель существует
+    ('/api/comment/{root}/replies?limit=100', 1, 6),
+], ids=['page', 'replies'])
+def test_statement_count_does_not_grow_with_comments(make_app, login, count_statements, url, rows, statements):
+    assert listing_statements(make_app, login, count_statements, N, url, rows) == statements
+    assert listing_statements(make_app, login, count_statements, 10 * N, url, rows) == statements
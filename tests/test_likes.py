@@ -0,0 +1,57 @@
+"""
+Лайки (POST /api/comment/<id>/like) при включенных внешних ключах SQLite: лайк
+несуществующего комментария и ответа не доходит до вставки в "like" и не дает 500.
+"""
+import pytest
+from sqlalchemy import func, select
+
+from src.web import db
+from src.dp import Comment, Like
+
+
+@pytest.fixture
+def liker(make_app, make_user, login):
+    """Клиент от имени пользователя; основной комментарий и ответ на него"""
+    app = make_app(SQLITE_FOREIGN_KEYS=1)
+    user_id = make_user(app, nickname='Читатель')
+    with app.app_context():
+        root = Comment(text='Корень', page='comments', user_id=user_id, replies_count=1)
+        db.session.add(root)
+        db.session.flush()
+        reply = Comment(text='Ответ', page='comments', user_id=user_id, parent_id=root.id)
+        db.session.add(reply)
+        db.session.commit()
+        ids = {'root': root.id, 'reply': reply.id}
+    client = app.test_client()
+    login(client, user_id)
+    return app, client, ids
+
+
+def like_count(app):
+    with app.app_context():
+        return db.session.scalar(select(func.count(Like.id)))
+
+
+def test_like_missing_comment_is_404(liker):
+    app, client, ids = liker
+    assert client.post('/api/comment/999/like').status_code == 404
+    assert like_count(app) == 0
+
+
+def test_like_reply_is_403(liker):
+    app, client, ids = liker
+    response = client.post(f"/api/comment/{ids['reply']}/like")
+    assert response.status_code == 403
+    assert response.get_json()['success'] is False
+    assert like_count(app) == 0
+
+
+def test_toggle_like(liker):
+    app, client, ids = liker
+    url = f"/api/comment/{ids['root']}/like"
+
+    data = client.post(url).get_json()
+    assert (data['liked'], data['likes_count']) == (True, 1)
+    data = client.post(url).get_json()
+    assert (data['liked'], data['likes_count']) == (False, 0)
+    assert like_count(app) == 0
@@ -0,0 +1,105 @@
+"""
+Удаление веток при включенных внешних ключах SQLite (PRAGMA foreign_keys=ON, по умолчанию):
+delete_subtrees, каскад ON DELETE CASCADE для удаления в обход него и миграции,
+которые пересоздают таблицы и не должны удалять лайки каскадом.
+"""
+import pytest
+from flask_migrate import upgrade
+from sqlalchemy import func, select
+
+from src.web import create_app, db
+from src.dp import ChangeMarker, Comment, Like, adjust_page_totals
+from src.moderation import delete_subtrees
+
+
+@pytest.fixture
+def fk_app(make_app):
+    app = make_app(SQLITE_FOREIGN_KEYS=1)
+    with app.app_context():
+        assert db.session.execute(db.text('PRAGMA foreign_keys')).scalar() == 1
+        db.session.rollback()
+    return app
+
+
+@pytest.fixture
+def tree(fk_app, make_user):
+    """Два основных комментария; у первого ветка глубины 3; лайки на всех уровнях"""
+    user_id = make_user(fk_app, nickname='Автор')
+    with fk_app.app_context():
+        root = Comment(text='Корень', page='comments', user_id=user_id, replies_count=2)
+        other = Comment(text='Другой', page='comments', user_id=user_id)
+        db.session.add_all([root, other])
+        db.session.flush()
+        reply = Comment(text='Ответ', page='comments', user_id=user_id, parent_id=root.id, replies_count=1)
+        sibling = Comment(text='Соседний ответ', page='comments', user_id=user_id, parent_id=root.id)
+        db.session.add_all([reply, sibling])
+        db.session.flush()
+        nested = Comment(text='Ответ на ответ', page='comments', user_id=user_id, parent_id=reply.id)
+        db.session.add(nested)
+        db.session.flush()
+        db.session.add_all(Like(comment_id=c.id, user_id=user_id) for c in (root, other, reply, nested))
+        adjust_page_totals({'comments': 2})
+        db.session.commit()
+        return {'root': root.id, 'other': other.id, 'reply': reply.id, 'sibling': sibling.id, 'nested': nested.id}
+
+
+def remaining(app):
+    with app.app_context():
+        comments = set(db.session.scalars(select(Comment.id)))
+        likes = set(db.session.scalars(select(Like.comment_id)))
+        return comments, likes
+
+
+def test_delete_subtrees_with_foreign_keys(fk_app, tree):
+    with fk_app.app_context():
+        deleted, replies_counts = delete_subtrees([tree['reply']])
+        db.session.commit()
+        assert deleted == 2
+        assert replies_counts == {tree['root']: 1}
+
+    comments, likes = remaining(fk_app)
+    assert comments == {tree['root'], tree['other'], tree['sibling']}
+    assert likes == {tree['root'], tree['other']}
+
+    with fk_app.app_context():
+        deleted, _ = delete_subtrees([tree['root']])
+        db.session.commit()
+        assert deleted == 2
+        assert db.session.get(ChangeMarker, 'page:comments').total == 1
+        assert db.session.execute(db.text('PRAGMA foreign_key_check')).all() == []
+
+    assert remaining(fk_app) == ({tree['other']}, {tree['other']})
+
+
+def test_plain_delete_cascades_to_replies_and_likes(fk_app, tree):
+    with fk_app.app_context():
+        db.session.execute(db.delete(Comment).where(Comment.id == tree['root']))
+        db.session.commit()
+
+    assert remaining(fk_app) == ({tree['other']}, {tree['other']})
+
+
+def test_migrations_keep_likes_with_foreign_keys(tmp_path, monkeypatch):
+    """Миграции после 0004 пересоздают comment (batch): DROP TABLE не должен удалить лайки"""
+    monkeypatch.setenv('SQLITE_FOREIGN_KEYS', '1')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'old.db'}",
+        'JINJA_BYTECODE_CACHE_DIR': ''
+    })
+    with app.app_context():
+        upgrade(revision='0004_change_marker')
+        db.session.execute(db.text("INSERT INTO user (id, nickname, avatar) VALUES (1, 'Автор', 'a.png')"))
+        db.session.execute(db.text(
+            "INSERT INTO comment (id, text, page, user_id, parent_id, likes_count, replies_count) "
+            "VALUES (1, 'Корень', 'comments', 1, NULL, 1, 1), (2, 'Ответ', 'comments', 1, 1, 0, 0)"
+        ))
+        db.session.execute(db.text('INSERT INTO "like" (id, comment_id, user_id) VALUES (1, 1, 1)'))
+        db.session.commit()
+
+        upgrade()
+        assert db.session.scalar(select(func.count(Comment.id))) == 2
+        assert db.session.scalar(select(func.count(Like.id))) == 1
+        # Соединение вернулось в пул с внешними ключами
+        assert db.session.execute(db.text('PRAGMA foreign_keys')).scalar() == 1
+        db.session.remove()
+        db.engine.dispose()
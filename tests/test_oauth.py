@@ -0,0 +1,191 @@
+"""
+Запросы к OAuth-провайдерам против локальной HTTP-заглушки: пул keep-alive соединений,
+таймаут чтения, повторы (POST с кодом авторизации не повторяется), предохранитель
+и оба callback (Яндекс, Google) целиком - с *_OAUTH_TOKEN_URL / *_USER_INFO_URL на заглушке.
+"""
+import json
+import threading
+import time
+from urllib.parse import parse_qs
+
+import pytest
+import requests
+from flask import url_for
+
+from src.dp import User
+from src.oauth_client import CircuitOpenError, OAuthClient
+
+
+def respond(status=200, payload=None, delay=0.0):
+    """Обработчик заглушки: JSON-ответ со статусом status после задержки delay"""
+    def handler(request):
+        time.sleep(delay)
+        return status, {'Content-Type': 'application/json'}, json.dumps(payload or {})
+    return handler
+
+
+def test_requests_reuse_connection(stub_server):
+    stub_server.route('GET', '/info', respond(payload={'id': 1}))
+    client = OAuthClient('test')
+
+    for _ in range(3):
+        assert client.get(stub_server.url('/info')).json() == {'id': 1}
+
+    assert len({request.client_address for request in stub_server.requests}) == 1
+
+
+def test_read_timeout(stub_server):
+    stub_server.route('GET', '/slow', respond(delay=1))
+    client = OAuthClient('test', read_timeout=0.2, retries=0)
+
+    started = time.monotonic()
+    with pytest.raises(requests.RequestException):
+        client.get(stub_server.url('/slow'))
+    assert time.monotonic() - started < 1
+    assert client.breaker.failures == 1
+
+
+def test_post_is_not_retried_on_read_error(stub_server):
+    stub_server.route('POST', '/token', respond(delay=1))
+    stub_server.route('GET', '/slow', respond(delay=1))
+    client = OAuthClient('test', read_timeout=0.2, retries=2, backoff=0)
+
+    # Код авторизации одноразовый: повтор POST после того, как запрос ушел, недопустим
+    with pytest.raises(requests.ReadTimeout):
+        client.post(stub_server.url('/token'), data={'code': 'abc'})
+    assert len(stub_server.hits('POST', '/token')) == 1
+
+    # GET повторяется
+    with pytest.raises(requests.RequestException):
+        client.get(stub_server.url('/slow'))
+    assert len(stub_server.hits('GET', '/slow')) == 3
+
+
+def test_breaker_opens_and_probes_once_when_half_open(stub_server):
+    stub_server.route('GET', '/info', respond(503))
+    client = OAuthClient('test', retries=0, failure_threshold=2, reset_timeout=0.3)
+    url = stub_server.url('/info')
+
+    assert client.get(url).status_code == 503
+    assert client.get(url).status_code == 503
+    assert client.breaker.state == 'open'
+    # Разомкнутый предохранитель: запрос до провайдера не доходит
+    with pytest.raises(CircuitOpenError):
+        client.get(url)
+    assert len(stub_server.hits('GET', '/info')) == 2
+
+    time.sleep(0.3)
+    assert client.breaker.state == 'half-open'
+    # Пока идет пробный запрос, остальные сразу получают отказ
+    stub_server.route('GET', '/info', respond(payload={'id': 1}, delay=0.3))
+    probe = threading.Thread(target=client.get, args=(url,))
+    probe.start()
+    time.sleep(0.1)
+    with pytest.raises(CircuitOpenError):
+        client.get(url)
+    probe.join()
+
+    assert client.breaker.state == 'closed'
+    assert client.get(url).status_code == 200
+    assert len(stub_server.hits('GET', '/info')) == 4
+
+
+def test_failed_probe_opens_breaker_again(stub_server):
+    stub_server.route('GET', '/info', respond(503))
+    client = OAuthClient('test', retries=0, failure_threshold=1, reset_timeout=0.2)
+    url = stub_server.url('/info')
+
+    client.get(url)
+    time.sleep(0.2)
+    assert client.get(url).status_code == 503  # пробный запрос
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.get(url)
+
+
+@pytest.fixture
+def oauth_app(make_app, stub_server):
+    """Приложение, у которого оба провайдера - заглушка"""
+    return make_app({
+        'YANDEX_CLIENT_ID': 'yandex-id',
+        'YANDEX_CLIENT_SECRET': 'yandex-secret',
+        'YANDEX_OAUTH_TOKEN_URL': stub_server.url('/yandex/token'),
+        'YANDEX_USER_INFO_URL': stub_server.url('/yandex/info'),
+        'GOOGLE_CLIENT_ID': 'google-id',
+        'GOOGLE_CLIENT_SECRET': 'google-secret',
+        'GOOGLE_OAUTH_TOKEN_URL': stub_server.url('/google/token'),
+        'GOOGLE_USER_INFO_URL': stub_server.url('/google/info'),
+    })
+
+
+def path_for(app, endpoint):
+    with app.test_request_context():
+        return url_for(endpoint)
+
+
+def test_yandex_callback(oauth_app, stub_server):
+    stub_server.route('POST', '/yandex/token', respond(payload={'access_token': 'yandex-token'}))
+    stub_server.route('GET', '/yandex/info', respond(payload={
+        'id': '42', 'display_name': 'Яндекс Пользователь', 'default_email': 'user@yandex.ru'
+    }))
+    client = oauth_app.test_client()
+    with client.session_transaction() as session:
+        session['after_auth_redirect'] = '/comments'
+
+    response = client.get('/auth/yandex/callback?code=abc&state=security_token')
+    assert response.status_code == 302
+    assert response.location == '/comments'
+
+    token_request, = stub_server.hits('POST', '/yandex/token')
+    assert parse_qs(token_request.body.decode()) == {
+        'grant_type': ['authorization_code'], 'code': ['abc'],
+        'client_id': ['yandex-id'], 'client_secret': ['yandex-secret'],
+    }
+    info_request, = stub_server.hits('GET', '/yandex/info')
+    assert info_request.headers['Authorization'] == 'OAuth yandex-token'
+
+    with oauth_app.app_context():
+        user = User.query.filter_by(yandex_id='42').one()
+        assert (user.nickname, user.email) == ('Яндекс Пользователь', 'user@yandex.ru')
+    with client.session_transaction() as session:
+        assert session['user_id'] == user.id
+
+
+def test_google_callback(oauth_app, stub_server):
+    stub_server.route('POST', '/google/token', respond(payload={'access_token': 'google-token'}))
+    stub_server.route('GET', '/google/info', respond(payload={
+        'sub': 'g-7', 'name': 'Google Пользователь', 'email': 'user@gmail.com',
+        'picture': 'https://lh3.googleusercontent.com/a/photo'
+    }))
+    client = oauth_app.test_client()
+
+    response = client.get('/auth/google/callback?code=xyz')
+    assert response.status_code == 302
+    assert response.location == path_for(oauth_app, 'main.index')
+
+    token_request, = stub_server.hits('POST', '/google/token')
+    form = parse_qs(token_request.body.decode())
+    assert form['code'] == ['xyz']
+    assert form['redirect_uri'] == [oauth_app.config['GOOGLE_REDIRECT_URI']]
+    info_request, = stub_server.hits('GET', '/google/info')
+    assert info_request.headers['Authorization'] == 'Bearer google-token'
+
+    with oauth_app.app_context():
+        user = User.query.filter_by(google_id='g-7').one()
+        assert (user.nickname, user.avatar) == ('Google Пользователь', 'https://lh3.googleusercontent.com/a/photo')
+    with client.session_transaction() as session:
+        assert session['user_id'] == user.id
+
+
+def test_callback_provider_error_does_not_log_in(oauth_app, stub_server):
+    stub_server.route('POST', '/yandex/token', respond(500))
+    client = oauth_app.test_client()
+
+    response = client.get('/auth/yandex/callback?code=abc')
+    assert response.status_code == 302
+    assert response.location == path_for(oauth_app, 'main.social_login')
+    # POST с кодом не повторяется и при ответе 5xx
+    assert len(stub_server.hits('POST', '/yandex/token')) == 1
+    assert not stub_server.hits('GET', '/yandex/info')
+    with client.session_transaction() as session:
+        assert 'user_id' not in session
@@ -0,0 +1,69 @@
+"""
+Планы запросов списков комментариев (SQLite, схема после upgrade()): строки выбираются
+по индексам ix_comment_* в нужном порядке - без полного просмотра comment и без
+сортировки во временном B-дереве. Проверяются запросы, которые реально выполняют маршруты.
+"""
+import pytest
+from sqlalchemy import event
+
+from src.web import db
+from src.dp import Comment
+
+PAGE_SIZE = 5
+
+
+@pytest.fixture
+def seeded(app, make_user):
+    """Основные комментарии и ответы на первый - больше одной страницы каждого списка"""
+    user_id = make_user(app, nickname='Автор')
+    with app.app_context():
+        root = Comment(text='Корень', page='comments', user_id=user_id)
+        db.session.add(root)
+        db.session.flush()
+        db.session.add_all(
+            [Comment(text=f'Комментарий {i}', page='comments', user_id=user_id) for i in range(3 * PAGE_SIZE)]
+            + [Comment(text=f'Ответ {i}', page='comments', user_id=user_id, parent_id=root.id)
+               for i in range(3 * PAGE_SIZE)]
+        )
+        db.session.commit()
+        return root.id
+
+
+def listing_queries(app, url):
+    """SQL списка (SELECT ... FROM comment ... ORDER BY) с параметрами: первая страница
+    и следующая по курсору из X-Next-Cursor"""
+    client = app.test_client()
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM comment' in statement and 'ORDER BY' in statement:
+            captured.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        response = client.get(f'{url}?limit={PAGE_SIZE}')
+        assert response.status_code == 200
+        cursor = response.headers['X-Next-Cursor']
+        assert client.get(f'{url}?limit={PAGE_SIZE}&cursor={cursor}').status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert len(captured) == 2
+    return engine, captured
+
+
+@pytest.mark.parametrize('url', [
+    '/comments/more',                  # основные комментарии страницы (карточки)
+    '/api/comments/comments',          # JSON-список страницы
+    '/api/comment/{root}/replies',     # ответы на комментарий
+], ids=['top-level', 'page', 'replies'])
+def test_listing_queries_use_comment_indexes(app, seeded, url):
+    engine, queries = listing_queries(app, url.format(root=seeded))
+    with engine.connect() as connection:
+        for statement, parameters in queries:
+            plan = [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+            assert any('USING INDEX ix_comment_' in line or 'USING COVERING INDEX ix_comment_' in line
+                       for line in plan), plan
+            assert not any(line.startswith('SCAN comment') for line in plan), plan
+            assert not any('USE TEMP B-TREE' in line for line in plan), plan